@@ -0,0 +1,20 @@
+import os, sys
+
+# Shared modules (bitboard.py, asgi_server.py, ...) live in the repository root.
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+from bitboard import parse_size
+from asgi_server import create_asgi_app, serve
+
+# The asyncio variant of 4by4/app.py (see asgi_server.py), with the
+# templates and static files in this directory.
+BOARD_WIDTH, BOARD_HEIGHT = parse_size(os.environ.get("PAWN_WARS_SIZE", "4"))
+# Training jobs run in spawned processes (see jobs.py), which import this
+# module again as __mp_main__; only the real app builds a server.
+if __name__ != '__mp_main__':
+    app = create_asgi_app(BOARD_WIDTH, BOARD_HEIGHT,
+                          template_folder=os.path.join(HERE, "templates"),
+                          static_folder=os.path.join(HERE, "static"))
+
+if __name__ == '__main__':
+    serve(app, host='0.0.0.0', port=5001)
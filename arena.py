@@ -0,0 +1,348 @@
+"""
+Arena: play Q-tables against each other with learning disabled.
+
+Every pair of players plays --games games, alternating colours, and the
+report gives each pair's win rate with a Wilson confidence interval, split
+by colour, the mean moves (plies) per game and the games played per second.
+Each player's score over all its pairings closes the report.
+
+A player is a Q-table file, loaded as the apps load it: the snapshot
+(JSON, or memory-mapped for .bin) plus any journal segments the app has not
+folded into it yet (journal.py), through store.read_table. The journal is
+replayed in memory; no file is written. Two names are built-in reference
+players:
+
+  random    a uniformly random legal move
+  perfect   the exact solver's move (solver.py; boards up to
+            solver.MAX_SQUARES squares)
+
+The board size comes from the tables: a .bin file records it, and a JSON
+table's keys imply it (bitboard.infer_engine). Every table must agree, and
+with --size every table must match it; --size is only needed when no
+player is a non-empty table.
+
+A table picks its moves from the canonical state's Q values, read-only:
+a move the table has no value for counts as INITIAL_Q, as it would in the
+apps. --policy sample draws in proportion to max(q, 0) like choose_action,
+through the same alias tables (sampling.py); --policy greedy plays a
+highest-valued move, breaking ties at random. Greedy players and the
+perfect player vary their games only through ties, so a greedy-only pairing
+repeats a few games and its interval describes those, not a random sample.
+
+Games are split into chunks of --chunk and played in a process pool. Each
+worker loads the players once (the tables are not pickled) and keeps its
+own per-state sampler cache. A chunk's random seed is derived from --seed,
+the pair and the chunk's first game, so results do not depend on --workers.
+
+    python arena.py q_table.json trained.json --games 20000
+    python arena.py 4by4/q_table.json td.json random perfect --policy greedy
+    python arena.py a.bin b.bin c.json --workers 8 --seed 1 --json arena.json
+    python arena.py random perfect --size 4
+"""
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import random
+import statistics
+import time
+
+import qbin
+import sampling
+import solver
+from bitboard import get_engine, infer_engine, parse_size
+from qstore import INITIAL_Q
+from store import read_table
+from symmetry import Mirror
+
+BUILTIN_PLAYERS = ("random", "perfect")
+
+
+# ----------------------------------------------------------------------
+# Players
+# ----------------------------------------------------------------------
+class TablePolicy:
+    """A Q-table's moves, sampled or greedy, never adding to the table."""
+
+    def __init__(self, q_table, engine, greedy=False):
+        self.q_table = q_table
+        self.engine = engine
+        self.mirror = Mirror(engine)
+        self.greedy = greedy
+        # (player, white, black) of a canonical state -> AliasSampler, or the
+        # best moves when greedy; None when the player has no moves.
+        self.cache = {}
+
+    def state_policy(self, white, black, player):
+        engine = self.engine
+        moves = engine.moves(white, black, player)
+        if not moves:
+            return None
+        actions = [engine.action_str(*move) for move in moves]
+        state_q = self.q_table[player].get(engine.state_key(white, black, player), {})
+        values = [state_q.get(action_str, INITIAL_Q) for action_str in actions]
+        if self.greedy:
+            best = max(values)
+            return [move for move, q in zip(moves, values) if q == best]
+        return sampling.AliasSampler(actions, values, moves)
+
+    def move(self, white, black, player, rng):
+        white, black, flipped = self.mirror.canonical(white, black)
+        key = (player, white, black)
+        try:
+            policy = self.cache[key]
+        except KeyError:
+            policy = self.cache[key] = self.state_policy(white, black, player)
+        if policy is None:
+            return None
+        if self.greedy:
+            move = policy[0] if len(policy) == 1 else rng.choice(policy)
+        else:
+            move = policy.moves[policy.sample(rng.random)]
+        return self.mirror.mirror_move(move) if flipped else move
+
+
+class RandomPolicy:
+    def __init__(self, engine):
+        self.engine = engine
+
+    def move(self, white, black, player, rng):
+        moves = self.engine.moves(white, black, player)
+        return rng.choice(moves) if moves else None
+
+
+class PerfectPolicy:
+    def __init__(self, engine):
+        self.solution = solver.solve(engine)
+
+    def move(self, white, black, player, rng):
+        return self.solution.best_move(white, black, player)
+
+
+def load_player(name, engine, greedy=False):
+    """The player behind a command-line name: a built-in or a Q-table file."""
+    if name == "random":
+        return RandomPolicy(engine)
+    if name == "perfect":
+        return PerfectPolicy(engine)
+    return TablePolicy(read_table(name, engine), engine, greedy)
+
+
+def table_size(path):
+    """(width, height) of a Q-table file: from a .bin header, else from the JSON keys; None if empty."""
+    if path.endswith(".bin"):
+        return qbin.table_size(path)
+    with open(path) as f:
+        q_table = json.load(f)
+    if not any(q_table.get(player) for player in ("W", "B")):
+        return None
+    try:
+        engine = infer_engine(q_table)
+    except (AttributeError, IndexError, KeyError, TypeError, ValueError):
+        raise ValueError(f"{path} is not a Q-table: its state keys do not parse") from None
+    return engine.width, engine.height
+
+
+# ----------------------------------------------------------------------
+# Worker processes
+# ----------------------------------------------------------------------
+_engine = None
+_players = None
+
+
+def _init_worker(width, height, names, greedy):
+    global _engine, _players
+    _engine = get_engine(width, height)
+    _players = [load_player(name, _engine, greedy) for name in names]
+
+
+def play_game(engine, white_player, black_player, rng):
+    """Play one game; returns (winner, plies)."""
+    white, black = engine.initial_position()
+    player = "W"
+    plies = 0
+    while True:
+        mover = white_player if player == "W" else black_player
+        move = mover.move(white, black, player, rng)
+        next_player = "B" if player == "W" else "W"
+        if move is None:
+            return next_player, plies
+        white, black = engine.apply_move(white, black, player, *move)
+        plies += 1
+        over, winner = engine.game_over(white, black, next_player)
+        if over:
+            return winner, plies
+        player = next_player
+
+
+def _play_chunk(task):
+    """
+    Worker: games start..start+count of pair (a, b). Player a is White in
+    even-numbered games. Returns the pair and [a's wins, games] as White,
+    the same as Black, and the total plies.
+    """
+    a, b, start, count, seed = task
+    rng = random.Random(f"{seed}:{a}:{b}:{start}")
+    as_white = [0, 0]
+    as_black = [0, 0]
+    plies = 0
+    for game in range(start, start + count):
+        if game % 2 == 0:
+            winner, moves = play_game(_engine, _players[a], _players[b], rng)
+            as_white[0] += winner == "W"
+            as_white[1] += 1
+        else:
+            winner, moves = play_game(_engine, _players[b], _players[a], rng)
+            as_black[0] += winner == "B"
+            as_black[1] += 1
+        plies += moves
+    return (a, b), as_white, as_black, plies
+
+
+# ----------------------------------------------------------------------
+# Report
+# ----------------------------------------------------------------------
+def wilson_interval(wins, games, confidence=0.95):
+    """Wilson score interval for a win rate of wins out of games."""
+    if games == 0:
+        return 0.0, 1.0
+    z = statistics.NormalDist().inv_cdf(0.5 + confidence / 2)
+    p = wins / games
+    denominator = 1 + z * z / games
+    centre = (p + z * z / (2 * games)) / denominator
+    margin = z * (p * (1 - p) / games + z * z / (4 * games * games)) ** 0.5 / denominator
+    return max(0.0, centre - margin), min(1.0, centre + margin)
+
+
+def rate(wins, games, confidence):
+    low, high = wilson_interval(wins, games, confidence)
+    return {"wins": wins, "games": games, "rate": wins / games if games else None, "low": low, "high": high}
+
+
+def run(names, width, height, games, workers, greedy=False, chunk=1000, seed=0):
+    """Play every pair of names games times; returns per-pair totals and the elapsed seconds."""
+    tasks = []
+    for a, b in itertools.combinations(range(len(names)), 2):
+        for start in range(0, games, chunk):
+            tasks.append((a, b, start, min(chunk, games - start), seed))
+    totals = {pair: {"white": [0, 0], "black": [0, 0], "plies": 0}
+              for pair in itertools.combinations(range(len(names)), 2)}
+    start_time = time.perf_counter()
+    with multiprocessing.Pool(workers, _init_worker, (width, height, names, greedy)) as pool:
+        for pair, as_white, as_black, plies in pool.imap_unordered(_play_chunk, tasks):
+            total = totals[pair]
+            for side, result in (("white", as_white), ("black", as_black)):
+                total[side][0] += result[0]
+                total[side][1] += result[1]
+            total["plies"] += plies
+    return totals, time.perf_counter() - start_time
+
+
+def report(names, totals, seconds, confidence):
+    """The JSON report: pairings from the first player's view, then each player's overall score."""
+    pairings = []
+    scores = {name: [0, 0] for name in names}
+    for (a, b), total in totals.items():
+        wins = total["white"][0] + total["black"][0]
+        games = total["white"][1] + total["black"][1]
+        scores[names[a]][0] += wins
+        scores[names[a]][1] += games
+        scores[names[b]][0] += games - wins
+        scores[names[b]][1] += games
+        pairings.append({"a": names[a], "b": names[b], **rate(wins, games, confidence),
+                         "a_as_white": rate(*total["white"], confidence),
+                         "a_as_black": rate(*total["black"], confidence),
+                         "moves_per_game": total["plies"] / games})
+    total_games = sum(p["games"] for p in pairings)
+    return {"confidence": confidence, "pairings": pairings,
+            "players": {name: rate(*score, confidence) for name, score in scores.items()},
+            "games": total_games, "seconds": seconds,
+            "games_per_second": total_games / seconds if seconds else None,
+            "moves_per_second": sum(p["moves_per_game"] * p["games"] for p in pairings) / seconds if seconds else None}
+
+
+def print_report(result):
+    level = f"{result['confidence']:.0%} CI"
+    width = max(len(name) for name in result["players"])
+    print(f"{'A':<{width}}  {'B':<{width}} {'games':>7}  {'A wins':>6} {level:>15}  "
+          f"{'A as W':>6} {'A as B':>6} {'moves':>6}")
+    for p in result["pairings"]:
+        print(f"{p['a']:<{width}}  {p['b']:<{width}} {p['games']:>7}  {p['rate']:>6.3f} "
+              f"[{p['low']:.3f}, {p['high']:.3f}]  {p['a_as_white']['rate']:>6.3f} "
+              f"{p['a_as_black']['rate']:>6.3f} {p['moves_per_game']:>6.2f}")
+    print()
+    print(f"{'player':<{width}} {'games':>7}  {'score':>6} {level:>15}")
+    for name, score in sorted(result["players"].items(), key=lambda item: -item[1]["rate"]):
+        print(f"{name:<{width}} {score['games']:>7}  {score['rate']:>6.3f} [{score['low']:.3f}, {score['high']:.3f}]")
+    print()
+    print(f"{result['games']} games in {result['seconds']:.2f} s: {result['games_per_second']:.0f} games/s, "
+          f"{result['moves_per_second']:.0f} moves/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("players", nargs="+",
+                        help='Q-table files (.json or .bin), or the built-in players "random" and "perfect"')
+    parser.add_argument("--size", type=str, default=None,
+                        help='board size, "N" or "WxH" (default: the size of the tables)')
+    parser.add_argument("--games", type=int, default=10000, help="games per pair of players")
+    parser.add_argument("--policy", choices=("sample", "greedy"), default="sample",
+                        help="sample: in proportion to max(q, 0), as the apps play (default); "
+                             "greedy: a highest-valued move")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="worker processes")
+    parser.add_argument("--chunk", type=int, default=1000, help="games per task sent to a worker")
+    parser.add_argument("--seed", type=int, default=None, help="random seed (default: random, printed)")
+    parser.add_argument("--confidence", type=float, default=0.95, help="confidence level of the intervals")
+    parser.add_argument("--json", default=None, help="write the report to this file")
+    args = parser.parse_args()
+    if len(args.players) < 2:
+        parser.error("need at least two players")
+    if len(set(args.players)) < len(args.players):
+        parser.error("players must be distinct")
+    for name in args.players:
+        if name not in BUILTIN_PLAYERS and not os.path.exists(name):
+            parser.error(f"no such Q-table: {name}")
+    if args.games < 1 or args.chunk < 1 or args.workers < 1:
+        parser.error("--games, --chunk and --workers must be positive")
+    if not 0 < args.confidence < 1:
+        parser.error("--confidence must be between 0 and 1")
+    seed = args.seed if args.seed is not None else random.getrandbits(32)
+    sizes = {}
+    for name in args.players:
+        if name not in BUILTIN_PLAYERS:
+            try:
+                size = table_size(name)
+            except (OSError, ValueError) as exc:
+                parser.error(str(exc))
+            if size is not None:
+                sizes[name] = size
+    if args.size is not None:
+        width, height = parse_size(args.size)
+        for name, size in sizes.items():
+            if size != (width, height):
+                parser.error(f"{name} holds a {size[0]}x{size[1]} table, not {width}x{height}")
+    elif len(set(sizes.values())) > 1:
+        parser.error("the tables are for different boards: "
+                     + ", ".join(f"{name} {w}x{h}" for name, (w, h) in sizes.items()))
+    elif sizes:
+        width, height = next(iter(sizes.values()))
+    else:
+        parser.error("no player is a non-empty table: give the board with --size")
+    if "perfect" in args.players and width * height > solver.MAX_SQUARES:
+        parser.error(f"perfect needs a board of at most {solver.MAX_SQUARES} squares")
+
+    print(f"{width}x{height}, {args.games} games per pair, {args.policy} policy, "
+          f"{args.workers} workers, seed {seed}")
+    totals, seconds = run(args.players, width, height, args.games, args.workers,
+                          greedy=args.policy == "greedy", chunk=args.chunk, seed=seed)
+    result = report(args.players, totals, seconds, args.confidence)
+    result.update({"size": f"{width}x{height}", "policy": args.policy, "seed": seed, "workers": args.workers})
+    print_report(result)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
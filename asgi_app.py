@@ -0,0 +1,15 @@
+import os
+from bitboard import parse_size
+from asgi_server import create_asgi_app, serve
+
+# The asyncio variant of app.py (see asgi_server.py): the same routes and
+# JSON shapes, served from one event loop. Run it with
+# `uvicorn asgi_app:app` or `python asgi_app.py`.
+BOARD_WIDTH, BOARD_HEIGHT = parse_size(os.environ.get("PAWN_WARS_SIZE", "3"))
+# Training jobs run in spawned processes (see jobs.py), which import this
+# module again as __mp_main__; only the real app builds a server.
+if __name__ != '__mp_main__':
+    app = create_asgi_app(BOARD_WIDTH, BOARD_HEIGHT)
+
+if __name__ == '__main__':
+    serve(app, port=5000)
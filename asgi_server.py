@@ -0,0 +1,473 @@
+"""
+Pawn Wars as an asyncio (ASGI) app, for many concurrent play sessions.
+
+The Flask app (server.py) serves each request on its own thread. This app
+serves the same routes with the same JSON shapes from one event loop, so an
+idle session costs a socket and a coroutine instead of a thread. The route
+logic is GameServer's (server.py); only the HTTP layer differs:
+
+  - Moves are computed on a small thread pool (ASGI_THREADS). A move reads
+    the store, and every store can block: the JSON store's stripe locks
+    are held while its journal is written and compacted, and the shared
+    and SQLite stores read from disk.
+  - Finished games are written to the store, and so to its journal, from a
+    single background thread (GameServer.update_executor); snapshots are
+    written by the write-behind saver's thread, as in the Flask app.
+    Updates stay in game order.
+  - /simulate plays its games on the thread pool and streams them in
+    batches; static files, /metrics (which counts the store's states) and
+    /policy run there too.
+
+Run it with any ASGI server (asgi_app.py and 4by4/asgi_app.py build the
+apps), or with the small HTTP/1.1 server in serve() when none is installed:
+
+    uvicorn asgi_app:app --port 5000
+    python asgi_app.py
+"""
+import asyncio
+import json
+import mimetypes
+import os
+import signal
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import jinja2
+
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE
+from server import Q_RELOAD_SIGNAL, TIMED_ROUTES, GameServer
+
+# Threads for moves and other store reads, /simulate and static files.
+ASGI_THREADS = int(os.environ.get("ASGI_THREADS", "4"))
+# Largest request body accepted (413 above it). A full /policy batch of
+# POLICY_MAX_STATES 4x4 keys is about 0.5 MB.
+MAX_BODY_BYTES = int(os.environ.get("ASGI_MAX_BODY_BYTES", str(1024 * 1024)))
+# /simulate sends its events in chunks of this many.
+SIMULATE_CHUNK_EVENTS = 64
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class AsgiApp:
+    def __init__(self, server, template_folder, static_folder, threads=ASGI_THREADS):
+        self.server = server
+        self.static_folder = static_folder
+        self.templates = jinja2.Environment(loader=jinja2.FileSystemLoader(template_folder), autoescape=True)
+        self.templates.globals["url_for"] = lambda endpoint, filename: f"/static/{filename}"
+        self.pages = {}  # rendered templates by name
+        self.executor = ThreadPoolExecutor(threads, thread_name_prefix="asgi")
+        server.update_executor = ThreadPoolExecutor(1, thread_name_prefix="q-updates")
+        self.routes = {
+            ("POST", "/start"): self.game_route(server.start_game),
+            ("POST", "/continue"): self.game_route(server.continue_game),
+            ("POST", "/play_drag/start"): self.game_route(server.play_drag_start),
+            ("POST", "/play_drag/move"): self.game_route(server.play_drag_move),
+            ("GET", "/"): self.page("index.html"),
+            ("GET", "/play"): self.page("play.html"),
+            ("GET", "/metrics"): self.metrics,
+            ("POST", "/policy"): self.policy,
+            ("POST", "/admin/reload"): self.admin(self.admin_reload),
+            ("GET", "/admin/reload"): self.reload_status,
+            ("POST", "/jobs/train"): self.admin(self.start_training_job),
+            ("GET", "/jobs"): self.list_training_jobs,
+            ("POST", "/simulate"): self.admin(self.simulate),
+        }
+
+    async def run(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+
+    # ------------------------------------------------------------------
+    # ASGI entry point
+    # ------------------------------------------------------------------
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self.lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            return
+        method, path = scope["method"], scope["path"]
+        start = time.perf_counter()
+        started = False
+
+        async def tracked_send(message):
+            nonlocal started
+            started = True
+            await send(message)
+
+        try:
+            handler, args = self.resolve(method, path)
+            await handler(scope, receive, tracked_send, *args)
+        except Exception as exc:
+            if started:
+                raise
+            if isinstance(exc, HTTPError):
+                await send_json(send, {"error": str(exc)}, exc.status)
+            else:
+                await send_json(send, {"error": f"{type(exc).__name__}: {exc}"}, 500)
+        if path in TIMED_ROUTES:
+            self.server.metrics.requests.observe(path, time.perf_counter() - start)
+
+    def resolve(self, method, path):
+        """(handler, extra args) for a request, or HTTPError 404/405."""
+        handler = self.routes.get((method, path))
+        if handler is not None:
+            return handler, ()
+        if path.startswith("/jobs/"):
+            job_id, _, action = path[len("/jobs/"):].partition("/")
+            if job_id and action == "" and method == "GET":
+                return self.training_job, (job_id, False)
+            if job_id and action == "cancel" and method == "POST":
+                return self.admin(self.training_job), (job_id, True)
+        if path.startswith("/static/") and method == "GET":
+            return self.static, (path[len("/static/"):],)
+        if any(route_path == path for _, route_path in self.routes):
+            raise HTTPError(405, "Method Not Allowed")
+        raise HTTPError(404, "Not Found")
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                reload_signal = getattr(signal, Q_RELOAD_SIGNAL, None)
+                # As in create_app: leave the signal to whoever already handles it.
+                if reload_signal is not None and signal.getsignal(reload_signal) is signal.SIG_DFL:
+                    try:
+                        asyncio.get_running_loop().add_signal_handler(reload_signal, self.server.start_reload)
+                    except (NotImplementedError, RuntimeError, ValueError):
+                        pass  # not the main thread, or no signals on this platform
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await self.run(self.server.close)
+                self.executor.shutdown(wait=False)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    # ------------------------------------------------------------------
+    # Routes
+    # ------------------------------------------------------------------
+    def game_route(self, handler):
+        """A route that runs a GameServer handler on its JSON body and returns its result."""
+        async def route(scope, receive, send):
+            data = await read_json(receive)
+            if not isinstance(data, dict):
+                raise HTTPError(400, "Request body must be a JSON object")
+            response = await self.run(handler, data)
+            await send_json(send, response)
+        return route
+
+    def admin(self, route):
+        """A route that only runs if server.authorize_admin accepts the request."""
+        async def checked(scope, receive, send, *args):
+            authorization = dict(scope.get("headers") or []).get(b"authorization")
+            client = scope.get("client")
+            refusal = self.server.authorize_admin(authorization.decode("latin-1") if authorization else None,
+                                                  client[0] if client else None)
+            if refusal is not None:
+                await send_json(send, *refusal)
+                return
+            await route(scope, receive, send, *args)
+        return checked
+
+    def page(self, name):
+        async def route(scope, receive, send):
+            body = self.pages.get(name)
+            if body is None:
+                body = self.pages[name] = await self.run(lambda: self.templates.get_template(name).render().encode())
+            await send_response(send, 200, body, "text/html; charset=utf-8")
+        return route
+
+    async def static(self, scope, receive, send, filename):
+        root = os.path.realpath(self.static_folder)
+        path = os.path.realpath(os.path.join(root, filename))
+        if os.path.commonpath([root, path]) != root or not os.path.isfile(path):
+            raise HTTPError(404, "Not Found")
+        body = await self.run(read_file, path)
+        content_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        await send_response(send, 200, body, content_type)
+
+    async def metrics(self, scope, receive, send):
+        body = await self.run(self.server.metrics.render, self.server)
+        await send_response(send, 200, body.encode(), METRICS_CONTENT_TYPE)
+
+    async def policy(self, scope, receive, send):
+        """A batch of thousands of states takes milliseconds, so it runs on the thread pool."""
+        response, status = await self.run(self.server.policy, await read_json(receive, silent=True))
+        await send_json(send, response, status)
+
+    async def admin_reload(self, scope, receive, send):
+        response, status = self.server.admin_reload(await read_json(receive, silent=True))
+        await send_json(send, response, status)
+
+    async def reload_status(self, scope, receive, send):
+        await send_json(send, self.server.reload_status)
+
+    async def start_training_job(self, scope, receive, send):
+        # Starting the child process pickles a snapshot of the table, so off the loop.
+        response, status = await self.run(self.server.start_training_job, await read_json(receive, silent=True))
+        await send_json(send, response, status)
+
+    async def list_training_jobs(self, scope, receive, send):
+        await send_json(send, {"jobs": [job.to_json() for job in list(self.server.jobs.jobs.values())]})
+
+    async def training_job(self, scope, receive, send, job_id, cancel):
+        response, status = self.server.training_job(job_id, cancel)
+        await send_json(send, response, status)
+
+    async def simulate(self, scope, receive, send):
+        """Like the Flask /simulate, with the games played on the thread pool."""
+        options = await read_json(receive, silent=True)
+        try:
+            num_games, moves, stream_format = self.server.simulate_options(options)
+        except ValueError as exc:
+            raise HTTPError(400, str(exc)) from None
+        content_type = "text/event-stream" if stream_format == "sse" else "application/x-ndjson"
+        await send({"type": "http.response.start", "status": 200,
+                    "headers": [(b"content-type", content_type.encode()), (b"cache-control", b"no-cache")]})
+        events = self.server.simulate_stream(num_games, moves, stream_format)
+        disconnected = asyncio.ensure_future(wait_disconnect(receive))
+        try:
+            while not disconnected.done():
+                chunk = await self.run(take, events, SIMULATE_CHUNK_EVENTS)
+                if not chunk:
+                    break
+                await send({"type": "http.response.body", "body": "".join(chunk).encode(), "more_body": True})
+        finally:
+            disconnected.cancel()
+            events.close()
+        await send({"type": "http.response.body", "body": b""})
+
+
+def create_asgi_app(width, height, template_folder="templates", static_folder="static"):
+    """Build the ASGI app for a width x height board. Folders are relative to this file."""
+    return AsgiApp(GameServer(width, height), os.path.join(HERE, template_folder),
+                   os.path.join(HERE, static_folder))
+
+
+# ----------------------------------------------------------------------
+# Helpers
+# ----------------------------------------------------------------------
+async def read_body(receive):
+    """The request body; HTTPError 413 once it exceeds MAX_BODY_BYTES."""
+    chunks = []
+    size = 0
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            raise HTTPError(400, "Client disconnected")
+        chunk = message.get("body", b"")
+        size += len(chunk)
+        if size > MAX_BODY_BYTES:
+            raise HTTPError(413, f"Request body over {MAX_BODY_BYTES} bytes")
+        chunks.append(chunk)
+        if not message.get("more_body"):
+            return b"".join(chunks)
+
+
+async def read_json(receive, silent=False):
+    """The request's JSON body; with silent, {} unless it is a JSON object (as get_json(silent=True) or {})."""
+    body = await read_body(receive)
+    try:
+        data = json.loads(body)
+    except ValueError:
+        if silent:
+            return {}
+        raise HTTPError(400, "Request body must be JSON") from None
+    return data if isinstance(data, dict) or not silent else {}
+
+
+async def wait_disconnect(receive):
+    while (await receive())["type"] != "http.disconnect":
+        pass
+
+
+async def send_response(send, status, body, content_type):
+    await send({"type": "http.response.start", "status": status,
+                "headers": [(b"content-type", content_type.encode()),
+                            (b"content-length", str(len(body)).encode())]})
+    await send({"type": "http.response.body", "body": body})
+
+
+async def send_json(send, payload, status=200):
+    await send_response(send, status, json.dumps(payload).encode(), "application/json")
+
+
+def read_file(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def take(iterator, count):
+    chunk = []
+    for item in iterator:
+        chunk.append(item)
+        if len(chunk) == count:
+            break
+    return chunk
+
+
+# ----------------------------------------------------------------------
+# A minimal HTTP/1.1 server for the app (keep-alive, Content-Length request
+# bodies), for when no ASGI server such as uvicorn is installed. Chunked
+# request bodies are refused with 411; a Content-Length that is not a
+# single non-negative integer gets 400, and one over MAX_BODY_BYTES 413.
+# ----------------------------------------------------------------------
+REASONS = {200: "OK", 202: "Accepted", 400: "Bad Request", 401: "Unauthorized", 403: "Forbidden",
+           404: "Not Found", 405: "Method Not Allowed", 409: "Conflict", 411: "Length Required",
+           413: "Content Too Large", 500: "Internal Server Error"}
+MAX_HEADER_BYTES = 64 * 1024
+
+
+def content_length(headers):
+    """The request's body length from its Content-Length headers (0 if none); HTTPError 400/411/413."""
+    if any(name == b"transfer-encoding" for name, _ in headers):
+        raise HTTPError(411, "Chunked request bodies are not supported; send Content-Length")
+    values = {value for name, value in headers if name == b"content-length"}
+    if not values:
+        return 0
+    value = values.pop()
+    if values or not value.isdigit():
+        raise HTTPError(400, "Invalid Content-Length")
+    length = int(value)
+    if length > MAX_BODY_BYTES:
+        raise HTTPError(413, f"Request body over {MAX_BODY_BYTES} bytes")
+    return length
+
+
+async def reject(writer, error):
+    """Answer a request that cannot be read with error's status, and close the connection."""
+    body = json.dumps({"error": str(error)}).encode()
+    writer.write(f"HTTP/1.1 {error.status} {REASONS[error.status]}\r\nContent-Type: application/json\r\n"
+                 f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode("latin-1") + body)
+    await writer.drain()
+
+
+async def handle_connection(app, reader, writer):
+    try:
+        while True:
+            try:
+                head = await reader.readuntil(b"\r\n\r\n")
+            except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                return
+            request_line, *header_lines = head.decode("latin-1").split("\r\n")[:-2]
+            try:
+                method, target, version = request_line.split(" ")
+            except ValueError:
+                return
+            headers = []
+            for line in header_lines:
+                name, _, value = line.partition(":")
+                headers.append((name.strip().lower().encode("latin-1"), value.strip().encode("latin-1")))
+            header_map = dict(headers)
+            connection = header_map.get(b"connection", b"").lower()
+            keep_alive = connection != b"close" if version == "HTTP/1.1" else connection == b"keep-alive"
+            try:
+                length = content_length(headers)
+            except HTTPError as error:
+                await reject(writer, error)
+                return
+            try:
+                body = await reader.readexactly(length)
+            except asyncio.IncompleteReadError:
+                return
+            path, _, query = target.partition("?")
+            scope = {"type": "http", "asgi": {"version": "3.0"}, "http_version": version[5:],
+                     "method": method, "scheme": "http", "path": path, "raw_path": path.encode("latin-1"),
+                     "query_string": query.encode("latin-1"), "root_path": "", "headers": headers,
+                     "client": writer.get_extra_info("peername"), "server": writer.get_extra_info("sockname")}
+            if not await run_request(app, scope, body, reader, writer, keep_alive):
+                return
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+
+async def run_request(app, scope, body, reader, writer, keep_alive):
+    """Run one request through app; returns whether the connection stays open."""
+    state = {"chunked": False, "request_sent": False}
+    response_done = asyncio.Event()
+
+    async def receive():
+        if not state["request_sent"]:
+            state["request_sent"] = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        await response_done.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            status = message["status"]
+            lines = [f"HTTP/1.1 {status} {REASONS.get(status, 'Unknown')}"]
+            names = set()
+            for name, value in message.get("headers", []):
+                names.add(name.lower())
+                lines.append(f"{name.decode('latin-1')}: {value.decode('latin-1')}")
+            if b"content-length" not in names:
+                state["chunked"] = True
+                lines.append("Transfer-Encoding: chunked")
+            lines.append("Connection: keep-alive" if keep_alive else "Connection: close")
+            writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+        elif message["type"] == "http.response.body":
+            data = message.get("body", b"")
+            if state["chunked"]:
+                if data:
+                    writer.write(b"%x\r\n%b\r\n" % (len(data), data))
+                if not message.get("more_body"):
+                    writer.write(b"0\r\n\r\n")
+            else:
+                writer.write(data)
+            await writer.drain()
+            if not message.get("more_body"):
+                response_done.set()
+
+    await app(scope, receive, send)
+    response_done.set()
+    return keep_alive
+
+
+async def serve_forever(app, host, port):
+    """Serve until SIGINT or SIGTERM, then run the app's lifespan shutdown (which saves the table)."""
+    loop = asyncio.get_running_loop()
+    lifespan_messages = asyncio.Queue()
+    started = asyncio.Event()
+    stop = asyncio.Event()
+
+    async def lifespan_send(message):
+        if message["type"] == "lifespan.startup.complete":
+            started.set()
+
+    await lifespan_messages.put({"type": "lifespan.startup"})
+    lifespan = asyncio.ensure_future(app({"type": "lifespan"}, lifespan_messages.get, lifespan_send))
+    await started.wait()
+    try:
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(signum, stop.set)
+            except (NotImplementedError, RuntimeError):
+                pass
+        server = await asyncio.start_server(lambda reader, writer: handle_connection(app, reader, writer),
+                                            host, port, limit=MAX_HEADER_BYTES, backlog=1024)
+        print(f"Serving on http://{host}:{port}", flush=True)
+        async with server:
+            await stop.wait()
+    finally:
+        await lifespan_messages.put({"type": "lifespan.shutdown"})
+        await lifespan
+
+
+def serve(app, host="127.0.0.1", port=5000):
+    """Serve app with uvicorn if it is installed, else with the server above."""
+    try:
+        import uvicorn
+    except ImportError:
+        try:
+            asyncio.run(serve_forever(app, host, port))
+        except KeyboardInterrupt:
+            pass
+    else:
+        uvicorn.run(app, host=host, port=port, log_level="warning")
@@ -0,0 +1,160 @@
+"""
+Games to convergence: the +1/-1 update rule vs. return-based updates.
+
+Each rule trains fast_train.py's self-play from an empty table. Every
+--eval-every games, the table plays --eval-games games against a uniformly
+random opponent, half as White and half as Black, with learning off. It
+picks its moves as the apps do: in proportion to max(q, 0), uniformly if
+no move has positive Q (sampling.probabilities). The first evaluation at
+or above --target counts as convergence. Runs are repeated over --seeds
+seeds, and the report gives the median number of training games to reach
+the target and the mean win rate at each run's last evaluation.
+
+    python benchmarks/bench_convergence.py
+    python benchmarks/bench_convergence.py --size 3 --target 0.8 --eval-every 100
+    python benchmarks/bench_convergence.py --rules count,td --max-games 100000 --json convergence.json
+
+Rules (td_train.py for the return-based ones):
+
+  count      update_q_values: +1 for every move of the winner, -1 for the loser
+  raw        count, sampling training moves with raw Q weights (--weights raw)
+  mc         Monte-Carlo returns (lam = 1)
+  td         TD(lambda), fast_train.py's --update td defaults
+  td0        one-step TD (lam = 0)
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import fast_train
+import sampling
+import solver
+import td_train
+from qstore import INITIAL_Q
+
+# (alpha, gamma, lam) of the return-based rules; None is update_q_values.
+RULES = {
+    "count": None,
+    "raw": None,
+    "mc": (0.3, 1.0, 1.0),
+    "td": (0.3, 0.9, 0.8),
+    "td0": (0.3, 0.9, 0.0),
+}
+
+
+def policy_move(q_table, white, black, player, rng):
+    """The table's move as the apps sample it, reading the table only."""
+    engine, mirror = fast_train.ENGINE, fast_train.MIRROR
+    white, black, flipped = mirror.canonical(white, black)
+    moves = engine.moves(white, black, player)
+    if not moves:
+        return None
+    state_q = q_table[player].get(engine.state_key(white, black, player), {})
+    q_values = [state_q.get(engine.action_str(*move), INITIAL_Q) for move in moves]
+    move = rng.choices(moves, weights=sampling.probabilities(q_values))[0]
+    return mirror.mirror_move(move) if flipped else move
+
+
+def win_rate(q_table, num_games, seed):
+    """Fraction of num_games the table wins against uniformly random moves, alternating colours."""
+    engine = fast_train.ENGINE
+    rng = random.Random(seed)
+    wins = 0
+    for game in range(num_games):
+        side = "W" if game % 2 == 0 else "B"
+        white, black = engine.initial_position()
+        player = "W"
+        while True:
+            if player == side:
+                move = policy_move(q_table, white, black, player, rng)
+            else:
+                moves = engine.moves(white, black, player)
+                move = rng.choice(moves) if moves else None
+            next_player = "B" if player == "W" else "W"
+            if move is None:
+                winner = next_player
+                break
+            white, black = engine.apply_move(white, black, player, *move)
+            over, winner = engine.game_over(white, black, next_player)
+            if over:
+                break
+            player = next_player
+        wins += winner == side
+    return wins / num_games
+
+
+def train_until(rule, seed, args):
+    """Train one rule from an empty table; returns (games to reach the target or None, last win rate, stats)."""
+    fast_train.q_table = {"W": {}, "B": {}}
+    if RULES[rule] is None:
+        update = fast_train.update_q_values
+    else:
+        update = td_train.ReturnUpdate(fast_train.q_table, *RULES[rule])
+    fast_train.action_probabilities = fast_train.raw_probabilities if rule == "raw" else sampling.probabilities
+    random.seed(seed)
+    reached = None
+    rate = 0.0
+    games = 0
+    train_seconds = 0.0
+    while games < args.max_games:
+        start = time.perf_counter()
+        for _ in range(args.eval_every):
+            fast_train.simulate_game(update)
+        train_seconds += time.perf_counter() - start
+        games += args.eval_every
+        rate = win_rate(fast_train.q_table, args.eval_games, seed + 1)
+        if reached is None and rate >= args.target:
+            reached = games
+            if not args.full:
+                break
+    error = solver.policy_error(solver.solve(fast_train.ENGINE), fast_train.q_table, sampling.probabilities)
+    return reached, rate, {"games": games, "us_per_game": round(train_seconds / games * 1e6, 1),
+                           "sampled_policy_error": round(error["sampled"], 4)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=4, help="board size (default: %(default)s)")
+    parser.add_argument("--rules", default=",".join(RULES), help="comma-separated rules (default: %(default)s)")
+    parser.add_argument("--target", type=float, default=0.85, help="win rate against random play to reach")
+    parser.add_argument("--eval-every", type=int, default=1000, help="training games between evaluations")
+    parser.add_argument("--eval-games", type=int, default=1000, help="games per evaluation")
+    parser.add_argument("--max-games", type=int, default=40000, help="training games before giving up")
+    parser.add_argument("--seeds", type=int, default=3, help="runs per rule")
+    parser.add_argument("--full", action="store_true", help="train to --max-games even after reaching the target")
+    parser.add_argument("--json", default=None, help="write results to this file")
+    args = parser.parse_args()
+    fast_train.configure(args.size, args.size)
+
+    print(f"{args.size}x{args.size}, target win rate {args.target:.0%} against random play, "
+          f"{args.eval_games} games per evaluation")
+    print(f"{'rule':<6} {'median games':>12} {'reached':>8} {'last win':>10} {'policy err':>10} {'us/game':>8}")
+    report = {"size": args.size, "target": args.target, "rules": {}}
+    for rule in args.rules.split(","):
+        runs = [train_until(rule, seed, args) for seed in range(args.seeds)]
+        reached = [games for games, _, _ in runs]
+        # Runs that never reached the target count as more than --max-games.
+        median = statistics.median(games if games is not None else float("inf") for games in reached)
+        report["rules"][rule] = {"params": RULES[rule], "median_games": None if median == float("inf") else median,
+                                 "runs": [{"games_to_target": games, "last_win_rate": rate, **stats}
+                                          for games, rate, stats in runs]}
+        median_text = f"{median:.0f}" if median != float("inf") else f">{args.max_games}"
+        final = statistics.mean(rate for _, rate, _ in runs)
+        error = statistics.mean(stats["sampled_policy_error"] for _, _, stats in runs)
+        speed = statistics.mean(stats["us_per_game"] for _, _, stats in runs)
+        print(f"{rule:<6} {median_text:>12} {sum(g is not None for g in reached):>5}/{args.seeds:<2} "
+              f"{final:>10.3f} {error:>10.3f} {speed:>8.0f}", flush=True)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
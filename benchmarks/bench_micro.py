@@ -0,0 +1,231 @@
+"""
+Microbenchmarks for the engine and policy hot paths on 3x3 and 4x4.
+
+Measured per board size, with the shipped Q-table for that size:
+  app.get_possible_moves, app.board_to_state_key, app.check_game_over,
+  app.choose_action, app.update_q_values   GameServer methods (server.py)
+  app.zobrist_move                          incremental state hash update (zobrist.py)
+  train.choose_action, train.update_q_values, train.simulate_game
+                                            fast_train.py on bitboards
+
+Inputs are positions and game histories from seeded random play, so every
+run times the same work. Each benchmark is warmed up first, then timed
+over --repeat rounds; the result is the best and the median time per call.
+Tables are copied into a temporary directory and never written back.
+
+    python benchmarks/bench_micro.py                        # print results
+    python benchmarks/bench_micro.py --json results.json    # machine-readable
+    python benchmarks/bench_micro.py --compare              # vs. the stored baseline
+    python benchmarks/bench_micro.py --save-baseline        # refresh the baseline
+
+--compare exits with status 1 if any benchmark's best time is more than
+--tolerance (default 25%) slower than benchmarks/baseline.json.
+"""
+import argparse
+import copy
+import gc
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+BASELINE = os.path.join(ROOT, "benchmarks", "baseline.json")
+TABLES = {3: os.path.join(ROOT, "q_table.json"), 4: os.path.join(ROOT, "4by4", "q_table.json")}
+SEED = 12345
+
+
+def time_calls(func, args_list, warmup, repeat):
+    """
+    Run func(*args) over args_list; returns (best, median) seconds per call.
+    The garbage collector is paused while timing, as timeit does.
+    """
+    for args in args_list[:warmup]:
+        func(*args)
+    rounds = []
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for args in args_list:
+                func(*args)
+            rounds.append((time.perf_counter() - start) / len(args_list))
+    finally:
+        gc.enable()
+    return min(rounds), statistics.median(rounds)
+
+
+def random_games(engine, num_games, rng):
+    """Positions (white, black, player) of seeded uniformly random games."""
+    positions = []
+    for _ in range(num_games):
+        white, black = engine.initial_position()
+        player = "W"
+        while True:
+            moves = engine.moves(white, black, player)
+            if not moves:
+                break
+            positions.append((white, black, player))
+            white, black = engine.apply_move(white, black, player, *rng.choice(moves))
+            player = "B" if player == "W" else "W"
+            if engine.game_over(white, black, player)[0]:
+                break
+    return positions
+
+
+def bench_app(size, positions, histories, warmup, repeat):
+    """GameServer methods, in a temporary directory holding a copy of the table."""
+    from server import GameServer
+    results = {}
+    workdir = tempfile.mkdtemp(prefix="bench_micro_")
+    cwd = os.getcwd()
+    try:
+        shutil.copy(TABLES[size], os.path.join(workdir, "q_table.json"))
+        os.chdir(workdir)
+        server = GameServer(size, size)
+        engine = server.engine
+        boards = [(engine.to_board(white, black), player) for white, black, player in positions]
+        results["app.get_possible_moves"] = time_calls(server.get_possible_moves, boards, warmup, repeat)
+        results["app.board_to_state_key"] = time_calls(server.board_to_state_key, boards, warmup, repeat)
+        results["app.check_game_over"] = time_calls(server.check_game_over, boards, warmup, repeat)
+        results["app.choose_action"] = time_calls(
+            lambda board, player: server.choose_action(player, board, []), boards, warmup, repeat)
+        # The app records states by their Zobrist key (see zobrist.py).
+        app_histories = [([(player, server.locate(player, *engine.position_from_key(state_key)[:2])[3], action_str)
+                           for player, state_key, action_str in history], winner)
+                         for history, winner in histories]
+        results["app.update_q_values"] = time_calls(server.update_q_values, app_histories, warmup, repeat)
+        hashes = server.zobrist.position(*engine.initial_position())
+        moves = [(hashes, player, src, dst, dst in board)
+                 for board, player in boards for src, dst in server.get_possible_moves(board, player)[:1]]
+        results["app.zobrist_move"] = time_calls(server.zobrist.move, moves, warmup, repeat)
+        server.close()
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+
+def self_play_histories(trainer, num_games):
+    """(game_history, winner) pairs of seeded self-play games."""
+    random.seed(SEED)
+    histories = []
+    for _ in range(num_games):
+        winner, game_history = trainer.play_game()
+        histories.append((game_history, winner))
+    return histories
+
+
+def bench_train(size, positions, histories, q_table, warmup, repeat, num_games):
+    import fast_train
+    results = {}
+    fast_train.configure(size, size)
+    fast_train.q_table = copy.deepcopy(q_table)
+    args = [(player, (white, black), []) for white, black, player in positions]
+    results["train.choose_action"] = time_calls(fast_train.choose_action, args, warmup, repeat)
+    results["train.update_q_values"] = time_calls(fast_train.update_q_values, histories, warmup, repeat)
+    random.seed(SEED)
+    results["train.simulate_game"] = time_calls(fast_train.simulate_game, [()] * num_games, warmup, repeat)
+    return results
+
+
+def spin(seconds):
+    """Keep the CPU busy for a moment so the first benchmark doesn't run at a lower clock."""
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        sum(range(1000))
+
+
+def run(args):
+    from bitboard import get_engine
+    import fast_train
+    from symmetry import fold
+    results = {}
+    spin(1.0)
+    for size in (3, 4):
+        rng = random.Random(SEED)
+        engine = get_engine(size, size)
+        positions = random_games(engine, args.games, rng)[:args.positions]
+        with open(TABLES[size]) as f:
+            q_table = fold(json.load(f), engine)
+        # (state_key, action_str) histories from the trainer; bench_app converts them to
+        # the Zobrist keys the apps record.
+        fast_train.configure(size, size)
+        fast_train.q_table = copy.deepcopy(q_table)
+        histories = self_play_histories(fast_train, args.games)
+        for name, timing in bench_app(size, positions, histories, args.warmup, args.repeat).items():
+            results[f"{size}x{size}/{name}"] = timing
+        for name, timing in bench_train(size, positions, histories, q_table, args.warmup, args.repeat,
+                                        args.games).items():
+            results[f"{size}x{size}/{name}"] = timing
+    return {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "seed": SEED,
+        "results": {name: {"best_ns": round(best * 1e9, 1), "median_ns": round(median * 1e9, 1)}
+                    for name, (best, median) in results.items()},
+    }
+
+
+def compare(report, baseline, tolerance):
+    """Print the change against baseline; return the names that regressed."""
+    regressions = []
+    print(f"{'benchmark':<32} {'baseline':>11} {'now':>11} {'change':>8}")
+    for name, result in report["results"].items():
+        old = baseline["results"].get(name)
+        if old is None:
+            print(f"{name:<32} {'-':>11} {result['best_ns']:>9.0f}ns {'new':>8}")
+            continue
+        change = result["best_ns"] / old["best_ns"] - 1
+        flag = "  REGRESSION" if change > tolerance else ""
+        print(f"{name:<32} {old['best_ns']:>9.0f}ns {result['best_ns']:>9.0f}ns {change:>+7.0%}{flag}")
+        if change > tolerance:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--positions", type=int, default=2000, help="positions per micro-benchmark")
+    parser.add_argument("--games", type=int, default=500, help="games for update/simulate benchmarks")
+    parser.add_argument("--warmup", type=int, default=200, help="warm-up calls before timing")
+    parser.add_argument("--repeat", type=int, default=9, help="timed rounds per benchmark")
+    parser.add_argument("--json", default=None, help="write results to this file")
+    parser.add_argument("--compare", action="store_true", help="compare against the stored baseline")
+    parser.add_argument("--baseline", default=BASELINE, help="baseline file (default: %(default)s)")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed slowdown before --compare fails (default: %(default)s)")
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the baseline")
+    args = parser.parse_args()
+
+    report = run(args)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+    if args.compare:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} benchmark(s) slower than the baseline by more than {args.tolerance:.0%}")
+            return 1
+        return 0
+    print(f"{'benchmark':<32} {'best':>11} {'median':>11}")
+    for name, result in report["results"].items():
+        print(f"{name:<32} {result['best_ns']:>9.0f}ns {result['median_ns']:>9.0f}ns")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,134 @@
+"""
+Startup and lookup-latency benchmark: JSON q_table vs. memory-mapped q_table.bin.
+
+For each table (the shipped 3x3 and 4x4 tables plus synthetic 5x5 tables of
+growing size) every measurement runs in a fresh subprocess and reports:
+  - startup: time to make the table usable (json.load vs. qbin.open_table),
+  - rss: growth of the process's resident set while loading,
+  - lookup: mean time of `state_key in table[player]` + `table[player][state_key]`
+    over random existing keys.
+
+    python benchmarks/bench_qbin.py
+    python benchmarks/bench_qbin.py --synthetic 100000,1000000
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bitboard import BitboardEngine
+import qbin
+
+
+def synthetic_table(engine, num_states, seed=0):
+    """Random self-play positions until num_states states are collected, with random Q values."""
+    rng = random.Random(seed)
+    q_table = {"W": {}, "B": {}}
+    total = 0
+    while total < num_states:
+        white, black = engine.initial_position()
+        player = "W"
+        while True:
+            moves = engine.moves(white, black, player)
+            if not moves:
+                break
+            state_key = engine.state_key(white, black, player)
+            if state_key not in q_table[player]:
+                q_table[player][state_key] = {engine.action_str(*m): rng.randint(-3000, 3000) for m in moves}
+                total += 1
+            white, black = engine.apply_move(white, black, player, *rng.choice(moves))
+            player = "B" if player == "W" else "W"
+            if engine.game_over(white, black, player)[0]:
+                break
+    return q_table
+
+
+def rss_kb():
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    return 0
+
+
+def child(kind, path, size, lookups):
+    """Runs in a subprocess: load the table, then time random lookups."""
+    rss_before = rss_kb()
+    start = time.perf_counter()
+    if kind == "json":
+        with open(path) as f:
+            table = json.load(f)
+    else:
+        table = qbin.open_table(path, BitboardEngine(size, size))
+    startup = time.perf_counter() - start
+    rss = rss_kb() - rss_before
+
+    with open(path + ".keys") as f:
+        keys = json.load(f)
+    rng = random.Random(1)
+    sample = [rng.choice(keys) for _ in range(lookups)]
+    start = time.perf_counter()
+    for player, state_key in sample:
+        if state_key in table[player]:
+            table[player][state_key]
+    lookup = (time.perf_counter() - start) / lookups
+    print(json.dumps({"startup_s": startup, "rss_kb": rss, "lookup_us": lookup * 1e6}))
+
+
+def run_child(kind, path, size, lookups):
+    out = subprocess.run([sys.executable, __file__, "--child", kind, path, str(size), str(lookups)],
+                         capture_output=True, text=True, check=True).stdout
+    return json.loads(out)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--synthetic", default="100000,500000",
+                        help="comma-separated synthetic 5x5 table sizes (number of states)")
+    parser.add_argument("--lookups", type=int, default=20000)
+    parser.add_argument("--child", nargs=4, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        kind, path, size, lookups = args.child
+        child(kind, path, int(size), int(lookups))
+        return
+
+    tables = [("3x3", 3, os.path.join(ROOT, "q_table.json"), None),
+              ("4x4", 4, os.path.join(ROOT, "4by4", "q_table.json"), None)]
+    for count in [int(c) for c in args.synthetic.split(",") if c]:
+        tables.append((f"5x5 synthetic {count}", 5, None, count))
+
+    print(f"{'table':<24} {'states':>8} {'format':>6} {'file KB':>9} {'startup ms':>11} "
+          f"{'rss KB':>9} {'lookup us':>10}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for label, size, path, count in tables:
+            engine = BitboardEngine(size, size)
+            if path is None:
+                q_table = synthetic_table(engine, count)
+            else:
+                with open(path) as f:
+                    q_table = json.load(f)
+            json_path = os.path.join(tmp, "table.json")
+            bin_path = os.path.join(tmp, "table.bin")
+            with open(json_path, "w") as f:
+                json.dump(q_table, f)
+            qbin.write(bin_path, q_table, engine)
+            keys = [[p, k] for p in ("W", "B") for k in q_table[p]]
+            for p in (json_path, bin_path):
+                with open(p + ".keys", "w") as f:
+                    json.dump(keys, f)
+            for kind, p in (("json", json_path), ("bin", bin_path)):
+                r = run_child(kind, p, size, args.lookups)
+                print(f"{label:<24} {len(keys):>8} {kind:>6} {os.path.getsize(p) // 1024:>9} "
+                      f"{r['startup_s'] * 1000:>11.2f} {r['rss_kb']:>9} {r['lookup_us']:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Board-size scaling benchmark for the shared engine and trainer.
+
+For each board size (3x3 to 6x6 by default) it reports:
+  - tables: time to build the engine's per-square move tables,
+  - moves, state_key, game_over, canonical: mean time per call over
+    positions sampled from random games,
+  - games/s: self-play throughput of fast_train.simulate_game on an empty
+    Q-table, and of the NumPy lockstep trainer when numpy is installed
+    (boards up to 30 squares).
+
+    python benchmarks/bench_scaling.py
+    python benchmarks/bench_scaling.py --sizes 3,4,5x4,5 --games 2000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bitboard import BitboardEngine, parse_size
+from symmetry import Mirror
+import fast_train
+
+
+def sample_positions(engine, count, seed=0):
+    """(white, black, player) positions visited by uniformly random games."""
+    rng = random.Random(seed)
+    positions = []
+    while len(positions) < count:
+        white, black = engine.initial_position()
+        player = "W"
+        while True:
+            moves = engine.moves(white, black, player)
+            if not moves:
+                break
+            positions.append((white, black, player))
+            white, black = engine.apply_move(white, black, player, *rng.choice(moves))
+            player = "B" if player == "W" else "W"
+            if engine.game_over(white, black, player)[0]:
+                break
+    return positions[:count]
+
+
+def per_call_us(func, positions, repeat=5):
+    """Best-of-repeat mean microseconds per call of func(white, black, player)."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for white, black, player in positions:
+            func(white, black, player)
+        best = min(best, time.perf_counter() - start)
+    return best / len(positions) * 1e6
+
+
+def games_per_second(width, height, num_games, seed=0):
+    fast_train.configure(width, height)
+    fast_train.q_table = {"W": {}, "B": {}}
+    random.seed(seed)
+    fast_train.simulate_game()  # warm-up
+    start = time.perf_counter()
+    for _ in range(num_games):
+        fast_train.simulate_game()
+    return num_games / (time.perf_counter() - start)
+
+
+def lockstep_games_per_second(engine, num_games, seed=0):
+    try:
+        import vector_train
+    except ImportError:
+        return None
+    if 2 * engine.num_squares + 1 > 62:
+        return None
+    start = time.perf_counter()
+    vector_train.train(engine, {"W": {}, "B": {}}, num_games, batch_size=1024, seed=seed)
+    return num_games / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="3,4,5,6", help='comma-separated sizes, "N" or "WxH"')
+    parser.add_argument("--positions", type=int, default=20000, help="positions per micro-measurement")
+    parser.add_argument("--games", type=int, default=5000, help="self-play games per size")
+    args = parser.parse_args()
+
+    print(f"{'board':>6} {'tables':>9} {'moves':>8} {'state_key':>10} {'game_over':>10} "
+          f"{'canonical':>10} {'games/s':>9} {'lockstep/s':>11}")
+    for size in args.sizes.split(","):
+        width, height = parse_size(size)
+        start = time.perf_counter()
+        engine = BitboardEngine(width, height)
+        tables_ms = (time.perf_counter() - start) * 1e3
+        mirror = Mirror(engine)
+        positions = sample_positions(engine, args.positions)
+        moves_us = per_call_us(engine.moves, positions)
+        key_us = per_call_us(engine.state_key, positions)
+        over_us = per_call_us(engine.game_over, positions)
+        canonical_us = per_call_us(lambda w, b, p: mirror.canonical(w, b), positions)
+        rate = games_per_second(width, height, args.games)
+        lockstep = lockstep_games_per_second(engine, args.games * 10)
+        lockstep_text = f"{lockstep:>11.0f}" if lockstep is not None else f"{'-':>11}"
+        print(f"{width}x{height:<4} {tables_ms:>7.2f}ms {moves_us:>6.2f}us {key_us:>8.2f}us "
+              f"{over_us:>8.2f}us {canonical_us:>8.2f}us {rate:>9.0f} {lockstep_text}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+"""
+Concurrent play-session capacity of the Flask app vs. the asyncio app.
+
+Each server runs in its own process, in a temporary directory holding a
+copy of the shipped table, and is driven over real sockets by simulated
+players: every session plays play-mode games (/play_drag/start, then
+/play_drag/move with a random legal move) and waits a random think time
+(exponential, mean --think seconds) between requests, like a person at
+the board. For each number of concurrent sessions the benchmark reports
+the requests served per second, the latency percentiles and the failed
+requests. A server's capacity is the most sessions it kept under --slo
+milliseconds at the 99th percentile with no failures.
+
+  flask     create_app(...).run(threaded=True): the server app.py starts,
+            without the debug reloader (a thread per request, HTTP/1.0)
+  asyncio   asgi_server.serve(create_asgi_app(...)): uvicorn if it is
+            installed, else the built-in HTTP/1.1 keep-alive server
+
+    python benchmarks/bench_sessions.py
+    python benchmarks/bench_sessions.py --size 4 --sessions 100,400,1600 --think 1
+    python benchmarks/bench_sessions.py --servers asyncio --json sessions.json
+
+The players run on one event loop in this process, so on a machine with
+few cores they compete with the server for CPU; compare the two servers
+with each other rather than with absolute numbers from elsewhere.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bitboard import get_engine
+
+TABLES = {3: os.path.join(ROOT, "q_table.json"), 4: os.path.join(ROOT, "4by4", "q_table.json")}
+SERVERS = {
+    "flask": "from server import create_app\n"
+             "create_app({size}, {size}).run(port={port}, threaded=True)\n",
+    "asyncio": "from asgi_server import create_asgi_app, serve\n"
+               "serve(create_asgi_app({size}, {size}), port={port})\n",
+}
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(kind, size, workdir):
+    """Start a server process in workdir; returns (process, port) once it accepts connections."""
+    port = free_port()
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    process = subprocess.Popen([sys.executable, "-c", SERVERS[kind].format(size=size, port=port)],
+                               cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return process, port
+        except OSError:
+            if process.poll() is not None:
+                raise RuntimeError(f"{kind} server exited with code {process.returncode}")
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError(f"{kind} server did not start")
+
+
+class Connection:
+    """A keep-alive HTTP/1.1 client connection that reconnects when the server closes it."""
+
+    def __init__(self, port):
+        self.port = port
+        self.reader = self.writer = None
+
+    async def post(self, path, payload):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection("127.0.0.1", self.port)
+        body = json.dumps(payload).encode()
+        self.writer.write(f"POST {path} HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\n"
+                          f"Content-Length: {len(body)}\r\nConnection: keep-alive\r\n\r\n".encode() + body)
+        head = (await self.reader.readuntil(b"\r\n\r\n")).decode("latin-1").lower()
+        status_line, *lines = head.split("\r\n")
+        headers = dict(line.split(": ", 1) for line in lines if ": " in line)
+        if "content-length" in headers:
+            data = await self.reader.readexactly(int(headers["content-length"]))
+        else:
+            data = await self.reader.read()
+        if status_line.startswith("http/1.0") or headers.get("connection") == "close":
+            self.close()
+        status = int(status_line.split()[1])
+        if status != 200:
+            raise RuntimeError(f"{path} returned {status}")
+        return json.loads(data)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+
+async def session(port, engine, rng, think, timeout, deadline, latencies, failures):
+    """One player: play-mode games until deadline, recording (finish time, latency) per request."""
+    connection = Connection(port)
+    loop = asyncio.get_running_loop()
+
+    async def request(path, payload):
+        start = loop.time()
+        response = await asyncio.wait_for(connection.post(path, payload), timeout)
+        latencies.append((loop.time(), loop.time() - start))
+        if "error" in response:
+            raise RuntimeError(f"{path}: {response['error']}")
+        return response
+
+    while loop.time() < deadline:
+        try:
+            side = rng.choice("WB")
+            response = await request("/play_drag/start", {"player_side": side, "opponent": "q"})
+            game_id = response["gameID"]
+            while response.get("message") != "Game Over" and loop.time() < deadline:
+                await asyncio.sleep(rng.expovariate(1 / think))
+                white, black = engine.from_board(response["board"])
+                src, dst = rng.choice(engine.move_names(engine.moves(white, black, side)))
+                response = await request("/play_drag/move", {"gameID": game_id, "from": src, "to": dst})
+            await asyncio.sleep(rng.expovariate(1 / think))
+        except Exception as exc:
+            failures.append((loop.time(), type(exc).__name__))
+            connection.close()
+            await asyncio.sleep(think)
+    connection.close()
+
+
+async def run_level(port, engine, sessions, args, seed):
+    """Run sessions players for ramp + duration seconds; measure the last duration seconds."""
+    loop = asyncio.get_running_loop()
+    ramp = min(2.0, args.think * 2)
+    start = loop.time()
+    measure_from = start + ramp
+    deadline = measure_from + args.duration
+    latencies, failures = [], []
+    tasks = []
+    for i in range(sessions):
+        rng = random.Random(seed * 100003 + i)
+        tasks.append(asyncio.ensure_future(session(port, engine, rng, args.think, args.timeout, deadline,
+                                                   latencies, failures)))
+        await asyncio.sleep(ramp / sessions)
+    await asyncio.gather(*tasks)
+    measured = sorted(latency for finished, latency in latencies if finished >= measure_from)
+    failed = sum(1 for finished, _ in failures if finished >= measure_from)
+
+    def percentile(p):
+        return round(measured[min(len(measured) - 1, int(p * len(measured)))] * 1000, 2) if measured else None
+
+    return {"sessions": sessions, "offered_per_second": round(sessions / args.think, 1),
+            "requests_per_second": round(len(measured) / args.duration, 1),
+            "p50_ms": percentile(0.50), "p99_ms": percentile(0.99),
+            "mean_ms": round(statistics.mean(measured) * 1000, 2) if measured else None,
+            "failed": failed}
+
+
+def bench_server(kind, args, engine):
+    workdir = tempfile.mkdtemp(prefix=f"bench_sessions_{kind}_")
+    shutil.copy(TABLES[args.size], os.path.join(workdir, "q_table.json"))
+    process, port = start_server(kind, args.size, workdir)
+    results = []
+    try:
+        for level, sessions in enumerate(args.sessions):
+            result = asyncio.run(run_level(port, engine, sessions, args, level))
+            results.append(result)
+            print(f"{kind:<8} {sessions:>8} {result['offered_per_second']:>9.0f} {result['requests_per_second']:>9.0f}"
+                  f" {result['p50_ms'] or 0:>8.1f} {result['p99_ms'] or 0:>8.1f} {result['failed']:>7}", flush=True)
+    finally:
+        process.terminate()
+        process.wait(10)
+        shutil.rmtree(workdir, ignore_errors=True)
+    capacity = max((r["sessions"] for r in results
+                    if r["failed"] == 0 and r["p99_ms"] is not None and r["p99_ms"] <= args.slo), default=0)
+    return {"levels": results, "capacity": capacity}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=3, choices=sorted(TABLES))
+    parser.add_argument("--servers", default="flask,asyncio", help="comma-separated: flask, asyncio")
+    parser.add_argument("--sessions", default="50,100,200,400,800",
+                        help="comma-separated numbers of concurrent sessions (default: %(default)s)")
+    parser.add_argument("--think", type=float, default=0.25, help="mean seconds between a session's requests")
+    parser.add_argument("--duration", type=float, default=8.0, help="measured seconds per level")
+    parser.add_argument("--timeout", type=float, default=5.0, help="seconds before a request counts as failed")
+    parser.add_argument("--slo", type=float, default=100.0, help="p99 latency bound for capacity, in ms")
+    parser.add_argument("--json", default=None, help="write results to this file")
+    args = parser.parse_args()
+    args.sessions = [int(n) for n in args.sessions.split(",")]
+
+    engine = get_engine(args.size, args.size)
+    print(f"{'server':<8} {'sessions':>8} {'offered/s':>9} {'served/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'failed':>7}")
+    report = {"size": args.size, "think": args.think, "duration": args.duration, "slo_ms": args.slo, "servers": {}}
+    for kind in args.servers.split(","):
+        report["servers"][kind] = bench_server(kind, args, engine)
+    print()
+    for kind, result in report["servers"].items():
+        print(f"{kind}: {result['capacity']} concurrent sessions with p99 <= {args.slo:g} ms and no failures")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
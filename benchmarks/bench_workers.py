@@ -0,0 +1,85 @@
+"""
+Multiprocess training throughput per worker count (fast_train.py --workers).
+
+For each worker count, a fresh copy of the starting table (empty by
+default) is trained for --games games with parallel_train.train, and the
+benchmark reports games/s, the speed-up over the first worker count and
+the mean moves per game. Moves per game also show that the workers play
+the requested board: under --start-method spawn they import fast_train
+afresh, and only the pool initializer gives them the board size.
+
+    python benchmarks/bench_workers.py
+    python benchmarks/bench_workers.py --size 4 --workers 1,2,4,8 --games 200000
+    python benchmarks/bench_workers.py --start-method spawn --json workers.json
+
+Speed-up is bounded by the machine's cores (printed with the results) and
+by the merge: the coordinator pickles the table out to every worker and
+adds the deltas back each round, so small --merge-every values or large
+tables cost more.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import fast_train
+import parallel_train
+from bitboard import parse_size
+from symmetry import fold
+
+
+def run(workers, args, start_table):
+    """Train a copy of start_table with workers processes; returns games/s and moves per game."""
+    fast_train.q_table = {player: {key: dict(actions) for key, actions in states.items()}
+                          for player, states in start_table.items()}
+    random.seed(args.seed)
+    start = time.perf_counter()
+    _, total_moves = parallel_train.train(fast_train, args.games, workers, args.merge_every,
+                                          start_method=args.start_method)
+    elapsed = time.perf_counter() - start
+    return args.games / elapsed, total_moves / args.games
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", default="3", help='board size, "N" or "WxH" (default: %(default)s)')
+    parser.add_argument("--workers", default="1,2,4", help="comma-separated worker counts (default: %(default)s)")
+    parser.add_argument("--games", type=int, default=100000, help="training games per worker count")
+    parser.add_argument("--merge-every", type=int, default=5000, help="games per worker between merges")
+    parser.add_argument("--start-method", default=None, choices=multiprocessing.get_all_start_methods(),
+                        help="multiprocessing start method (default: the platform's)")
+    parser.add_argument("--table", default=None, help="start from this Q-table (default: empty)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", default=None, help="write results to this file")
+    args = parser.parse_args()
+    fast_train.configure(*parse_size(args.size))
+    start_table = {"W": {}, "B": {}}
+    if args.table:
+        with open(args.table) as f:
+            start_table = fold(json.load(f), fast_train.ENGINE)
+
+    start_method = args.start_method or multiprocessing.get_start_method()
+    print(f"{args.size} board, {args.games} games, merge every {args.merge_every}, "
+          f"{start_method} workers, {os.cpu_count()} CPUs")
+    print(f"{'workers':>7} {'games/s':>10} {'speed-up':>9} {'moves/game':>11}")
+    results = []
+    for workers in (int(n) for n in args.workers.split(",")):
+        rate, moves = run(workers, args, start_table)
+        speedup = rate / results[0]["games_per_second"] if results else 1.0
+        results.append({"workers": workers, "games_per_second": round(rate, 1),
+                        "speedup": round(speedup, 2), "moves_per_game": round(moves, 2)})
+        print(f"{workers:>7} {rate:>10.0f} {speedup:>8.2f}x {moves:>11.2f}", flush=True)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"size": args.size, "games": args.games, "merge_every": args.merge_every,
+                       "start_method": start_method, "cpus": os.cpu_count(), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+"""
+Concurrency stress run for the apps' shared Q-table.
+
+Runs --processes app processes (like WSGI workers) in one temporary
+directory holding a copy of the shipped table. Each plays many sessions at
+once from --threads threads through the Flask test client: AI-vs-AI games
+via /start and /continue, and play-mode games via /play_drag/start and
+/play_drag/move with random human moves. The thread switch interval is
+shortened and the store is flushed (the JSON store compacts its journal)
+every few milliseconds, so inserts, updates and snapshots interleave as
+much as possible.
+
+Afterwards it checks that
+  - no request failed,
+  - a fresh server loading the table from disk has every Q value equal to
+    its starting value plus the +1/-1 updates the stores applied, summed
+    over all processes (no lost, doubled or clobbered updates),
+  - every applied update's entry is still in the table.
+
+    python benchmarks/stress_concurrency.py
+    python benchmarks/stress_concurrency.py --size 4 --threads 32 --games 100
+    python benchmarks/stress_concurrency.py --bin      # memory-mapped table
+    python benchmarks/stress_concurrency.py --store shared --processes 4
+    python benchmarks/stress_concurrency.py --store sqlite --processes 4
+
+Several processes need --store shared or sqlite; with the default JSON store each
+process learns on its own copy and the check reports the lost updates.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import qbin
+import server as server_module
+from bitboard import get_engine
+from server import GameServer, create_app
+from store import load_table
+from symmetry import fold
+
+TABLES = {3: os.path.join(ROOT, "q_table.json"), 4: os.path.join(ROOT, "4by4", "q_table.json")}
+
+
+def play_training_game(client, game_id):
+    response = client.post("/start", json={"gameID": game_id}).get_json()
+    while "message" not in response:
+        if "error" in response:
+            raise AssertionError(f"/continue failed: {response}")
+        response = client.post("/continue", json={"gameID": game_id}).get_json()
+
+
+def play_human_game(client, rng):
+    side = rng.choice("WB")
+    response = client.post("/play_drag/start", json={"player_side": side, "opponent": "q"}).get_json()
+    game_id = response["gameID"]
+    board = response["board"]
+    server = client.application.pawn_wars
+    while response.get("message") != "Game Over":
+        src, dst = rng.choice(server.get_possible_moves(board, side))
+        response = client.post("/play_drag/move", json={"gameID": game_id, "from": src, "to": dst}).get_json()
+        if "error" in response:
+            raise AssertionError(f"/play_drag/move failed: {response}")
+        board = response["board"]
+
+
+def worker(app, seed, num_games, errors):
+    client = app.test_client()
+    rng = random.Random(seed)
+    try:
+        for i in range(num_games):
+            if rng.random() < 0.5:
+                play_training_game(client, f"{seed}-{i}")
+            else:
+                play_human_game(client, rng)
+    except Exception as exc:
+        errors.append(f"thread {seed}: {exc!r}")
+
+
+def configure(args):
+    server_module.Q_STORE = args.store
+    server_module.Q_JOURNAL_COMPACT_BYTES = 4096
+    server_module.Q_TABLE_FLUSH_INTERVAL = 0.01
+
+
+def serve(args, process_id):
+    """One app process. Returns (applied updates summed per entry, errors)."""
+    configure(args)
+    app = create_app(args.size, args.size)
+    server = app.pawn_wars
+
+    # Tally every update the store applies.
+    applied = Counter()
+    tally_lock = threading.Lock()
+    add = server.store.add
+
+    def counting_add(updates):
+        done = add(updates)
+        with tally_lock:
+            for player, state_key, action_str, delta in done:
+                applied[player, state_key, action_str] += delta
+        return done
+
+    server.store.add = counting_add
+
+    sys.setswitchinterval(1e-5)
+    errors = []
+    threads = [threading.Thread(target=worker, args=(app, process_id * 1000 + t, args.games, errors))
+               for t in range(args.threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    sys.setswitchinterval(0.005)
+    server.close()
+    return applied, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=3, choices=sorted(TABLES))
+    parser.add_argument("--store", default="json", choices=["json", "shared", "sqlite"])
+    parser.add_argument("--processes", type=int, default=1)
+    parser.add_argument("--threads", type=int, default=16, help="threads per process")
+    parser.add_argument("--games", type=int, default=200, help="games per thread")
+    parser.add_argument("--bin", action="store_true", help="start from q_table.bin")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="stress_")
+    cwd = os.getcwd()
+    try:
+        os.chdir(workdir)
+        engine = get_engine(args.size, args.size)
+        with open(TABLES[args.size]) as f:
+            start_table = fold(json.load(f), engine)
+        if args.bin:
+            qbin.write("q_table.bin", start_table, engine)
+        else:
+            shutil.copy(TABLES[args.size], "q_table.json")
+
+        start = time.perf_counter()
+        if args.processes == 1:
+            results = [serve(args, 0)]
+        else:
+            with multiprocessing.get_context("fork").Pool(args.processes) as pool:
+                results = pool.starmap(serve, [(args, p) for p in range(args.processes)])
+        elapsed = time.perf_counter() - start
+        applied = Counter()
+        failures = []
+        for process_applied, errors in results:
+            applied.update(process_applied)
+            failures += errors
+        games = args.processes * args.threads * args.games
+        print(f"{games} games from {args.processes} process(es) x {args.threads} threads in {elapsed:.1f}s "
+              f"({games / elapsed:.0f} games/s), {sum(map(abs, applied.values()))} net updates")
+
+        configure(args)
+        reloaded = GameServer(args.size, args.size)
+        final = {player: {state_key: dict(state_q) for state_key, state_q in states.items()}
+                 for player, states in reloaded.store.snapshot().items()}
+        reloaded.close()
+        stored = {(player, state_key, action_str)
+                  for player, states in final.items() for state_key, state_q in states.items()
+                  for action_str in state_q}
+        for player, states in final.items():
+            for state_key, state_q in states.items():
+                for action_str, value in state_q.items():
+                    expected = (start_table[player].get(state_key, {}).get(action_str, 20)
+                                + applied[player, state_key, action_str])
+                    if value != expected:
+                        failures.append(f"{player} {state_key} {action_str}: {value} != {expected}")
+        if set(applied) - stored:
+            failures.append("applied updates for entries missing from the table")
+        if args.store == "shared":
+            # close() wrote the shared table back to the snapshot.
+            snapshot = load_table("q_table.bin" if args.bin else "q_table.json", engine)
+            if {player: {state_key: dict(state_q) for state_key, state_q in states.items()}
+                    for player, states in snapshot.items()} != final:
+                failures.append("snapshot written on close differs from the shared table")
+
+        for failure in failures[:20]:
+            print("FAIL", failure)
+        if len(failures) > 20:
+            print(f"... {len(failures) - 20} more")
+        print("FAILED" if failures else "OK")
+        return 1 if failures else 0
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
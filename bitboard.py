@@ -0,0 +1,225 @@
+"""
+Integer bitboard engine for Pawn Wars.
+
+A position is a pair of ints (white, black) where bit i is set when a pawn
+of that colour stands on square i. Squares are numbered rank by rank from
+White's side: a1 = 0, b1 = 1, ..., so on a 3x3 board c3 = 8.
+
+The engine follows exactly the same rules as the original dict-based
+get_possible_moves / check_game_over (tests/test_bitboard.py checks every
+reachable position against them):
+  - a pawn moves one square forward if that square is empty,
+  - a pawn captures one square diagonally forward,
+  - a pawn reaching the far rank wins, and a player with no moves loses.
+"""
+
+from functools import lru_cache
+
+FILES = "abcdefghijklmnopqrstuvwxyz"
+
+
+class BitboardEngine:
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.num_squares = width * height
+        self.full_mask = (1 << self.num_squares) - 1
+        self.square_names = [FILES[i % width] + str(i // width + 1)
+                             for i in range(self.num_squares)]
+        self.square_index = {name: i for i, name in enumerate(self.square_names)}
+
+        # Precomputed forward-push target and diagonal-capture mask per square.
+        self.push_masks = {"W": [0] * self.num_squares, "B": [0] * self.num_squares}
+        self.capture_masks = {"W": [0] * self.num_squares, "B": [0] * self.num_squares}
+        for sq in range(self.num_squares):
+            file_index, rank_index = sq % width, sq // width
+            for player, step in (("W", 1), ("B", -1)):
+                target_rank = rank_index + step
+                if not 0 <= target_rank < height:
+                    continue
+                self.push_masks[player][sq] = 1 << (target_rank * width + file_index)
+                for diff in (-1, 1):
+                    target_file = file_index + diff
+                    if 0 <= target_file < width:
+                        self.capture_masks[player][sq] |= 1 << (target_rank * width + target_file)
+
+        # Goal ranks: White wins on the last rank, Black on rank 1.
+        rank_mask = (1 << width) - 1
+        self.goal_masks = {"W": rank_mask << (width * (height - 1)), "B": rank_mask}
+
+        # Shift-based masks for the bitwise "has any move" test.
+        not_first_file = 0
+        not_last_file = 0
+        for sq in range(self.num_squares):
+            if sq % width != 0:
+                not_first_file |= 1 << sq
+            if sq % width != width - 1:
+                not_last_file |= 1 << sq
+        self.not_first_file = not_first_file
+        self.not_last_file = not_last_file
+
+        # Per-square "a1:W" fragments in the cell-name order used by
+        # board_to_state_key (lexicographic, so a10 sorts before a2).
+        self.key_order = sorted(range(self.num_squares), key=lambda i: self.square_names[i])
+        self.key_fragments = {
+            "W": [self.square_names[i] + ":W" for i in range(self.num_squares)],
+            "B": [self.square_names[i] + ":B" for i in range(self.num_squares)],
+        }
+        self.action_names = [[self.square_names[src] + self.square_names[dst]
+                              for dst in range(self.num_squares)]
+                             for src in range(self.num_squares)]
+
+    # ------------------------------------------------------------------
+    # Conversion to and from the dict board used by the Flask apps.
+    # ------------------------------------------------------------------
+    def initial_position(self):
+        """Return (white, black) with White on rank 1 and Black on the last rank."""
+        return self.goal_masks["B"], self.goal_masks["W"]
+
+    def from_board(self, board):
+        """Convert a {"a1": "W", ...} board into a (white, black) pair."""
+        white = black = 0
+        index = self.square_index
+        for pos, piece in board.items():
+            if piece == "W":
+                white |= 1 << index[pos]
+            else:
+                black |= 1 << index[pos]
+        return white, black
+
+    def to_board(self, white, black):
+        """Convert a (white, black) pair back into a {"a1": "W", ...} board."""
+        board = {}
+        for sq in range(self.num_squares):
+            bit = 1 << sq
+            if white & bit:
+                board[self.square_names[sq]] = "W"
+            elif black & bit:
+                board[self.square_names[sq]] = "B"
+        return board
+
+    # ------------------------------------------------------------------
+    # Move generation and terminal detection.
+    # ------------------------------------------------------------------
+    def moves(self, white, black, player):
+        """Return the legal moves for player as a list of (src, dst) square indices."""
+        if player == "W":
+            own, opponent = white, black
+        else:
+            own, opponent = black, white
+        empty = ~(white | black)
+        push_masks = self.push_masks[player]
+        capture_masks = self.capture_masks[player]
+        moves = []
+        while own:
+            bit = own & -own
+            own ^= bit
+            src = bit.bit_length() - 1
+            push = push_masks[src] & empty
+            if push:
+                moves.append((src, push.bit_length() - 1))
+            captures = capture_masks[src] & opponent
+            while captures:
+                target = captures & -captures
+                captures ^= target
+                moves.append((src, target.bit_length() - 1))
+        return moves
+
+    def has_moves(self, white, black, player):
+        """Bitwise test for whether player has at least one legal move."""
+        width = self.width
+        empty = ~(white | black) & self.full_mask
+        if player == "W":
+            return bool(((white << width) & empty)
+                        or (((white & self.not_first_file) << (width - 1)) & black)
+                        or (((white & self.not_last_file) << (width + 1)) & black))
+        return bool(((black >> width) & empty)
+                    or (((black & self.not_first_file) >> (width + 1)) & white)
+                    or (((black & self.not_last_file) >> (width - 1)) & white))
+
+    def apply_move(self, white, black, player, src, dst):
+        """Return the (white, black) pair after player moves src -> dst, capturing if needed."""
+        src_bit, dst_bit = 1 << src, 1 << dst
+        if player == "W":
+            return (white ^ src_bit) | dst_bit, black & ~dst_bit
+        return white & ~dst_bit, (black ^ src_bit) | dst_bit
+
+    def game_over(self, white, black, next_player):
+        """
+        Same contract as check_game_over: returns (True, winner) when a pawn
+        has reached the far rank or next_player has no moves, else (False, None).
+        """
+        if white & self.goal_masks["W"]:
+            return True, "W"
+        if black & self.goal_masks["B"]:
+            return True, "B"
+        if not self.has_moves(white, black, next_player):
+            return True, "B" if next_player == "W" else "W"
+        return False, None
+
+    # ------------------------------------------------------------------
+    # Q-table keys.
+    # ------------------------------------------------------------------
+    def state_key(self, white, black, player):
+        """Return the same "W|a1:W,a3:B,..." key as board_to_state_key."""
+        white_fragments = self.key_fragments["W"]
+        black_fragments = self.key_fragments["B"]
+        parts = []
+        for sq in self.key_order:
+            bit = 1 << sq
+            if white & bit:
+                parts.append(white_fragments[sq])
+            elif black & bit:
+                parts.append(black_fragments[sq])
+        return player + "|" + ",".join(parts)
+
+    def position_from_key(self, state_key):
+        """Parse a "W|a1:W,a3:B,..." key back into (white, black, player)."""
+        player, cells = state_key.split("|", 1)
+        white = black = 0
+        index = self.square_index
+        for cell in cells.split(",") if cells else []:
+            pos, piece = cell.split(":")
+            if piece == "W":
+                white |= 1 << index[pos]
+            else:
+                black |= 1 << index[pos]
+        return white, black, player
+
+    def parse_action(self, action_str):
+        """Split an action string such as "a1a2" or "a9a10" into (src, dst) square indices."""
+        split = 2 if action_str[1:2].isdigit() and action_str[2:3].isalpha() else 3
+        return self.square_index[action_str[:split]], self.square_index[action_str[split:]]
+
+    def action_str(self, src, dst):
+        return self.action_names[src][dst]
+
+    def move_names(self, moves):
+        """Convert index moves into the (src_name, dst_name) tuples the apps use."""
+        names = self.square_names
+        return [(names[src], names[dst]) for src, dst in moves]
+
+
+@lru_cache(maxsize=None)
+def get_engine(width, height):
+    """Shared engine per board size, so the move tables are built once per process."""
+    return BitboardEngine(width, height)
+
+
+def parse_size(text):
+    """Parse a board size given as "4" or "5x4" into (width, height)."""
+    width, _, height = text.lower().partition("x")
+    return int(width), int(height or width)
+
+
+def infer_engine(q_table):
+    """Guess the board size from the largest file letter and rank in the keys."""
+    width = height = 0
+    for states in q_table.values():
+        for state_key in states:
+            cells = state_key.split("|", 1)[1]
+            for cell in cells.split(",") if cells else []:
+                pos = cell.split(":")[0]
+                width = max(width, ord(pos[0]) - ord("a") + 1)
+                height = max(height, int(pos[1:]))
+    return get_engine(width, height)
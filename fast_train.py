@@ -1,11 +1,15 @@
-import uuid, random, json, os, time
+import argparse, uuid, random, json, os, sys, time
+import sampling
+import td_train
+from bitboard import get_engine, parse_size
+from symmetry import Mirror, fold
 
 Q_TABLE_FILE = "q_table.json"
 
 def load_q_table():
     if os.path.exists(Q_TABLE_FILE):
         with open(Q_TABLE_FILE, "r") as f:
-            return json.load(f)
+            return fold(json.load(f), ENGINE)
     else:
         return {"W": {}, "B": {}}
 
@@ -13,115 +17,67 @@ def save_q_table(q_table):
     with open(Q_TABLE_FILE, "w") as f:
         json.dump(q_table, f)
 
-# Load (or initialize) the global Q-table.
-q_table = load_q_table()
-
-def initial_board():
-    board = {}
-    # White pawns at rank 1; Black pawns at rank 3.
-    for pos in ['a1', 'b1', 'c1']:
-        board[pos] = 'W'
-    for pos in ['a3', 'b3', 'c3']:
-        board[pos] = 'B'
-    return board
-
-def get_possible_moves(board, player):
-    moves = []
-    files = ['a', 'b', 'c']
-    for pos, p in board.items():
-        if player == 'W' and p == 'W':
-            file, rank = pos[0], int(pos[1])
-            # Forward move:
-            forward = rank + 1
-            if forward <= 3:
-                new_pos = file + str(forward)
-                if new_pos not in board:
-                    moves.append((pos, new_pos))
-            # Diagonal captures:
-            file_index = files.index(file)
-            for diff in [-1, 1]:
-                new_file_index = file_index + diff
-                if 0 <= new_file_index < len(files):
-                    new_file = files[new_file_index]
-                    diag_pos = new_file + str(rank + 1)
-                    if diag_pos in board and board[diag_pos] == 'B':
-                        moves.append((pos, diag_pos))
-        elif player == 'B' and p == 'B':
-            file, rank = pos[0], int(pos[1])
-            forward = rank - 1
-            if forward >= 1:
-                new_pos = file + str(forward)
-                if new_pos not in board:
-                    moves.append((pos, new_pos))
-            file_index = files.index(file)
-            for diff in [-1, 1]:
-                new_file_index = file_index + diff
-                if 0 <= new_file_index < len(files):
-                    new_file = files[new_file_index]
-                    diag_pos = new_file + str(rank - 1)
-                    if diag_pos in board and board[diag_pos] == 'W':
-                        moves.append((pos, diag_pos))
-    return moves
-
-def board_to_state_key(board, player):
-    """Return a canonical string representation of the board along with the player."""
-    items = sorted(board.items())  # sort by cell name
-    state_repr = ",".join([f"{pos}:{piece}" for pos, piece in items])
-    return player + "|" + state_repr
-
-def choose_action(player, board, game_history):
+# The global Q-table: main() loads q_table.json into it. Importing the
+# module reads no file, so jobs and benchmarks install their own table.
+q_table = {"W": {}, "B": {}}
+
+# Move generation and terminal detection run on integer bitboards.
+ENGINE = get_engine(3, 3)
+# States are stored in mirror-canonical form (see symmetry.py).
+MIRROR = Mirror(ENGINE)
+
+def raw_probabilities(q_values):
+    """Q / sum(Q), or uniform if the sum is not positive (see solver.selection_probabilities)."""
+    total = sum(q_values)
+    return [q / total for q in q_values] if total > 0 else [1/len(q_values)] * len(q_values)
+
+# Sampling weights for choose_action: the apps' max(q, 0) weights
+# (sampling.probabilities). --weights raw switches to raw_probabilities, the
+# old rule that passes negative Q values to random.choices as they are.
+action_probabilities = sampling.probabilities
+
+def configure(width, height):
+    """Switch the trainer to a width x height board (3x3 by default)."""
+    global ENGINE, MIRROR
+    ENGINE = get_engine(width, height)
+    MIRROR = Mirror(ENGINE)
+
+def choose_action(player, position, game_history):
     """
     Choose an action for the player based on the Q values for the current state.
-    Record the state-action pair in game_history.
+    position is a (white, black) bitboard pair from ENGINE.
+    The state is looked up in its canonical orientation and the chosen
+    move is mapped back to the real board.
+    Record the (canonical) state-action pair in game_history.
     """
-    possible_moves = get_possible_moves(board, player)
+    white, black, flipped = MIRROR.canonical(*position)
+    possible_moves = ENGINE.moves(white, black, player)
     if not possible_moves:
         return None
-    state_key = board_to_state_key(board, player)
+    state_key = ENGINE.state_key(white, black, player)
+    state_q = q_table[player].get(state_key)
     # Initialize if state not seen before.
-    if state_key not in q_table[player]:
-        q_table[player][state_key] = {}
-        for move in possible_moves:
-            action_str = move[0] + move[1]
-            q_table[player][state_key][action_str] = 20
+    if state_q is None:
+        state_q = q_table[player][state_key] = {}
     # Also add any new moves.
+    move_by_action = {}
     for move in possible_moves:
-        action_str = move[0] + move[1]
-        if action_str not in q_table[player][state_key]:
-            q_table[player][state_key][action_str] = 20
+        action_str = ENGINE.action_str(*move)
+        move_by_action[action_str] = move
+        if action_str not in state_q:
+            state_q[action_str] = 20
 
-    actions = list(q_table[player][state_key].keys())
-    q_values = [q_table[player][state_key][a] for a in actions]
-    total = sum(q_values)
-    probabilities = [q / total for q in q_values] if total > 0 else [1/len(q_values)] * len(q_values)
+    actions = list(state_q.keys())
+    q_values = [state_q[a] for a in actions]
+    probabilities = action_probabilities(q_values)
     chosen_action_str = random.choices(actions, weights=probabilities, k=1)[0]
-    chosen_move = None
-    for move in possible_moves:
-        if move[0] + move[1] == chosen_action_str:
-            chosen_move = move
-            break
+    chosen_move = move_by_action.get(chosen_action_str)
     # Record the state-action.
     game_history.append((player, state_key, chosen_action_str))
+    if flipped and chosen_move is not None:
+        return MIRROR.mirror_move(chosen_move)
     return chosen_move
 
-def check_game_over(board, next_player):
-    """
-    Game is over if:
-      - A pawn reaches the opponent's rank (for white: rank 3, for black: rank 1)
-      - The next player has no moves.
-    Returns (True, winner) or (False, None).
-    """
-    for pos, p in board.items():
-        rank = int(pos[1])
-        if p == 'W' and rank == 3:
-            return True, "W"
-        if p == 'B' and rank == 1:
-            return True, "B"
-    if not get_possible_moves(board, next_player):
-        winner = "B" if next_player == "W" else "W"
-        return True, winner
-    return False, None
-
 def update_q_values(game_history, winner):
     """Update Q values for every recorded state-action pair."""
     for (player, state_key, action_str) in game_history:
@@ -133,47 +89,158 @@ def update_q_values(game_history, winner):
     # Persist the Q table.
     # save_q_table(q_table)
 
-def simulate_game():
-    """Simulate a single game and update Q values at the end. Return the winner and number of moves."""
-    board = initial_board()
+def play_game():
+    """Play a single game with the current Q values. Return the winner and the game history."""
+    white, black = ENGINE.initial_position()
     game_history = []
     current_player = "W"  # White always starts.
     while True:
-        move = choose_action(current_player, board, game_history)
+        move = choose_action(current_player, (white, black), game_history)
         if move is None:
             # No moves available: current player loses.
             winner = "B" if current_player == "W" else "W"
             break
-        src, dst = move
         # Execute move: remove captured piece if any.
-        if dst in board:
-            del board[dst]
-        board[dst] = current_player
-        del board[src]
+        white, black = ENGINE.apply_move(white, black, current_player, *move)
         # Check if game is over.
         next_player = "B" if current_player == "W" else "W"
-        over, winner = check_game_over(board, next_player)
+        over, winner = ENGINE.game_over(white, black, next_player)
         if over:
             break
         current_player = next_player
-    update_q_values(game_history, winner)
+    return winner, game_history
+
+def simulate_game(update=None):
+    """
+    Simulate a single game and update Q values at the end (with update_q_values,
+    or update(game_history, winner)). Return the winner and number of moves.
+    """
+    winner, game_history = play_game()
+    (update or update_q_values)(game_history, winner)
     return winner, len(game_history)
 
-if __name__ == '__main__':
-    NUM_GAMES = 10000
+def main(default_size="3", default_games=10000, progress_bar=False):
+    """
+    Command-line entry point. 4by4/fast_train.py calls this with a 4x4
+    default and a tqdm progress bar.
+    """
+    global q_table, action_probabilities
+    parser = argparse.ArgumentParser(description="Offline self-play training for the Q-table.")
+    parser.add_argument("--size", type=str, default=default_size,
+                        help='board size, "N" or "WxH" (default: %(default)s)')
+    parser.add_argument("--games", type=int, default=default_games, help="number of games to play")
+    parser.add_argument("--batch-size", type=int, default=0,
+                        help="play this many games in lockstep with NumPy (0 = one game at a time)")
+    parser.add_argument("--seed", type=int, default=None, help="random seed for the lockstep trainer")
+    parser.add_argument("--compact", action="store_true",
+                        help="train on the array-backed CompactQTable instead of nested dicts")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="train in this many processes, merging Q deltas every --merge-every games")
+    parser.add_argument("--merge-every", type=int, default=5000,
+                        help="games each worker plays between merges")
+    parser.add_argument("--weights", choices=("clipped", "raw"), default="clipped",
+                        help="clipped: sample in proportion to max(q, 0), as the apps do (default); "
+                             "raw: pass Q values to random.choices as they are (the old trainer)")
+    parser.add_argument("--update", choices=("count", "td"), default="count",
+                        help="count: +1/-1 per move (default); td: return-based updates (td_train.py)")
+    parser.add_argument("--alpha", type=float, default=0.3, help="learning rate for --update td")
+    parser.add_argument("--gamma", type=float, default=0.9, help="discount per move for --update td")
+    parser.add_argument("--lam", type=float, default=0.8,
+                        help="TD(lambda) trace decay for --update td: 1 = Monte-Carlo, 0 = one-step TD")
+    parser.add_argument("--td-resume", action="store_true",
+                        help="with --update td, continue a table saved by --update td "
+                             f"(values scaled by {td_train.TD_SCALE})")
+    parser.add_argument("--policy-error", action="store_true",
+                        help="score the trained table against the exact solution (solver.py)")
+    parser.add_argument("--merge-report", type=str, default=None,
+                        help="comma-separated merge intervals to compare (with --workers); does not save")
+    args = parser.parse_args()
+    configure(*parse_size(args.size))
+    q_table = load_q_table()
+    trainer = sys.modules[__name__]
+    update = None
+    if args.weights == "raw":
+        if args.update == "td" or args.batch_size or args.compact or args.workers > 1:
+            parser.error("--weights raw is for the +1/-1 trainer one game at a time "
+                         "(no --update td, --batch-size, --compact or --workers)")
+        action_probabilities = raw_probabilities
+    if args.td_resume and args.update != "td":
+        parser.error("--td-resume needs --update td")
+    if args.update == "td":
+        if args.batch_size or args.compact or args.workers > 1:
+            parser.error("--update td trains one game at a time (no --batch-size, --compact or --workers)")
+        # A +1/-1 table holds visit counts, not outcomes, so it is never continued by td.
+        if not args.td_resume and (q_table["W"] or q_table["B"]):
+            parser.error(f"{Q_TABLE_FILE} is not empty: --update td starts from an empty table, "
+                         "or continues one it saved with --td-resume")
+        try:
+            q_table = td_train.unscaled(q_table)
+        except ValueError as exc:
+            parser.error(str(exc))
+        update = td_train.ReturnUpdate(q_table, args.alpha, args.gamma, args.lam)
+
+    if args.merge_report:
+        import parallel_train
+        merge_values = [int(v) for v in args.merge_report.split(",")]
+        parallel_train.merge_frequency_report(trainer, args.games, args.workers, merge_values)
+        return
+
+    NUM_GAMES = args.games
     wins = {"W": 0, "B": 0}
     total_moves = 0
+    bar = None
+    if progress_bar:
+        import tqdm
+        bar = tqdm.tqdm(total=NUM_GAMES)
+    progress = bar.update if bar is not None else None
     start_time = time.time()
-    for i in range(NUM_GAMES):
-        winner, num_moves = simulate_game()
-        wins[winner] += 1
-        total_moves += num_moves
-        if (i+1) % 100 == 0:
-            print(f"Game {i+1}: Winner = {winner}, Moves = {num_moves}")
+    if args.batch_size:
+        # Lockstep NumPy trainer: plays batch_size games at once.
+        import vector_train
+        wins, total_moves = vector_train.train(ENGINE, q_table, NUM_GAMES,
+                                               batch_size=args.batch_size, seed=args.seed,
+                                               progress=progress)
+    elif args.compact:
+        # Flat typed arrays with integer state ids; converted back to JSON for saving.
+        import qstore
+        table = qstore.CompactQTable.from_json(q_table, ENGINE)
+        for i in range(NUM_GAMES):
+            winner, num_moves = qstore.simulate_game(table)
+            wins[winner] += 1
+            total_moves += num_moves
+            if progress is not None:
+                progress(1)
+        q_table = table.to_json()
+    elif args.workers > 1:
+        # Worker processes play against a snapshot and return Q deltas.
+        import parallel_train
+        wins, total_moves = parallel_train.train(trainer, NUM_GAMES, args.workers,
+                                                 args.merge_every, progress=progress)
+    else:
+        for i in range(NUM_GAMES):
+            winner, num_moves = simulate_game(update)
+            wins[winner] += 1
+            total_moves += num_moves
+            if progress is not None:
+                progress(1)
+            elif (i+1) % 100 == 0:
+                print(f"Game {i+1}: Winner = {winner}, Moves = {num_moves}")
     end_time = time.time()
-    save_q_table(q_table)
+    if bar is not None:
+        bar.close()
+    save_q_table(td_train.scaled(q_table) if args.update == "td" else q_table)
     print("\nTraining complete!")
     print(f"Total games: {NUM_GAMES}")
     print(f"White wins: {wins['W']}, Black wins: {wins['B']}")
     print(f"Average moves per game: {total_moves / NUM_GAMES:.2f}")
     print(f"Total training time: {end_time - start_time:.2f} seconds")
+    if args.policy_error:
+        import solver
+        # selection_probabilities is the exact form of raw_probabilities under random.choices.
+        error = solver.policy_error(solver.solve(ENGINE), q_table,
+                                    None if args.weights == "raw" else action_probabilities)
+        print(f"Policy error vs perfect play over {error['positions']} winnable positions: "
+              f"greedy {error['greedy']:.3f}, sampled {error['sampled']:.3f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,207 @@
+"""
+Background self-play training jobs for the Flask apps.
+
+POST /jobs/train starts a job: a child process that installs a snapshot of
+the live Q-table as fast_train's q_table and runs the usual
+play_game/update_q_values loop, so request threads never wait on it. It
+samples moves with the apps' max(q, 0) weights, as fast_train always
+does, so it trains the policy it merges into. Every
+JOB_PROGRESS_INTERVAL seconds the child sends its progress (games played,
+games/s, wins per side, states discovered) over a queue. A monitor thread
+in the app process keeps it as the job's status.
+
+When the job finishes, the child sends back only the +1/-1 deltas it
+applied, as parallel_train.py does. The server adds them into the live
+table in one batch (GameServer.merge_deltas). Games the server learned
+from while the job ran are kept, which would not happen if the live table
+were replaced by the child's copy. A cancelled job stops at its next
+progress check and its games are discarded; a cancel that arrives after
+the last check is still honoured, by the child before it sends its deltas
+and by the monitor before it merges them.
+
+The child is started with the "spawn" method: a fresh interpreter that
+gets the snapshot as an argument. Forking the app would copy every lock
+its threads (request threads, the saver, executors) held at that moment,
+locked and with no thread to release them. The spawned child imports
+the app's main module again as __mp_main__, so the app wrappers (app.py,
+asgi_app.py) do not build an app under that name.
+
+Only one job runs at a time: training is CPU-bound, and a second job would
+only slow the first one down. The last JOB_HISTORY finished jobs are kept
+for GET /jobs.
+"""
+import multiprocessing
+import queue
+import random
+import threading
+import time
+import uuid
+from collections import Counter
+
+JOB_PROGRESS_INTERVAL = 0.5
+# Seconds a cancelled child gets to exit before it is terminated.
+JOB_CANCEL_GRACE = 5.0
+# Finished (or cancelled, or failed) jobs kept for GET /jobs.
+JOB_HISTORY = 100
+_CONTEXT = multiprocessing.get_context("spawn")
+
+
+def _train(width, height, snapshot, num_games, seed, messages, cancel):
+    """Child process: train on snapshot and send ("progress" | "done" | "cancelled" | "failed", payload)."""
+    try:
+        import fast_train
+        fast_train.configure(width, height)
+        fast_train.q_table = snapshot
+        random.seed(seed)
+        start_states = len(snapshot["W"]) + len(snapshot["B"])
+        deltas = Counter()
+        stats = {"games_played": 0, "wins": {"W": 0, "B": 0}, "states_discovered": 0, "elapsed": 0.0}
+        start = time.perf_counter()
+        next_report = start + JOB_PROGRESS_INTERVAL
+        for _ in range(num_games):
+            winner, game_history = fast_train.play_game()
+            fast_train.update_q_values(game_history, winner)
+            for player, state_key, action_str in game_history:
+                deltas[player, state_key, action_str] += 1 if player == winner else -1
+            stats["games_played"] += 1
+            stats["wins"][winner] += 1
+            now = time.perf_counter()
+            if now >= next_report:
+                next_report = now + JOB_PROGRESS_INTERVAL
+                stats["elapsed"] = now - start
+                stats["states_discovered"] = len(snapshot["W"]) + len(snapshot["B"]) - start_states
+                # A copy: the queue pickles it later, in its feeder thread.
+                messages.put(("progress", dict(stats, wins=dict(stats["wins"]))))
+                if cancel.is_set():
+                    messages.put(("cancelled", stats))
+                    return
+        stats["elapsed"] = time.perf_counter() - start
+        stats["states_discovered"] = len(snapshot["W"]) + len(snapshot["B"]) - start_states
+        if cancel.is_set():
+            messages.put(("cancelled", stats))
+            return
+        messages.put(("done", (stats, deltas)))
+    except Exception as exc:
+        messages.put(("failed", f"{type(exc).__name__}: {exc}"))
+
+
+class TrainingJob:
+    def __init__(self, job_id, num_games, seed):
+        self.job_id = job_id
+        self.num_games = num_games
+        self.seed = seed
+        self.status = "running"
+        self.stats = {"games_played": 0, "wins": {"W": 0, "B": 0}, "states_discovered": 0, "elapsed": 0.0}
+        self.merged_updates = None
+        self.error = None
+        self.started = time.time()
+        self.process = None
+        self.cancel = None
+
+    def to_json(self):
+        stats = self.stats
+        played = stats["games_played"]
+        return {
+            "jobID": self.job_id,
+            "status": self.status,
+            "games": self.num_games,
+            "games_played": played,
+            "games_per_second": round(played / stats["elapsed"], 1) if stats["elapsed"] else 0.0,
+            "win_ratio": {"white": round(stats["wins"]["W"] / played, 4) if played else None,
+                          "black": round(stats["wins"]["B"] / played, 4) if played else None},
+            "states_discovered": stats["states_discovered"],
+            "elapsed": round(stats["elapsed"], 3),
+            "started": self.started,
+            "merged_updates": self.merged_updates,
+            "error": self.error,
+        }
+
+
+class JobManager:
+    def __init__(self, server):
+        self.server = server
+        self.jobs = {}  # by jobID, oldest first
+        self.lock = threading.Lock()
+
+    def running(self):
+        return [job for job in self.jobs.values() if job.status == "running"]
+
+    def start(self, num_games, seed=None):
+        """Start a job, or return None if one is already running."""
+        with self.lock:
+            if self.running():
+                return None
+            finished = [job_id for job_id, job in self.jobs.items() if job.status != "running"]
+            for job_id in finished[:max(0, len(finished) - JOB_HISTORY + 1)]:
+                del self.jobs[job_id]
+            job = TrainingJob(str(uuid.uuid4()), num_games, seed if seed is not None else random.getrandbits(64))
+            engine = self.server.engine
+            # Plain dicts: the spawned child gets the snapshot pickled, and a
+            # memory-mapped table (qbin.py) cannot be.
+            snapshot = {player: dict(states.items()) for player, states in self.server.store.snapshot().items()}
+            messages = _CONTEXT.Queue()
+            job.cancel = _CONTEXT.Event()
+            job.process = _CONTEXT.Process(
+                target=_train, name=f"training-job-{job.job_id[:8]}", daemon=True,
+                args=(engine.width, engine.height, snapshot, num_games, job.seed,
+                      messages, job.cancel))
+            job.process.start()
+            self.jobs[job.job_id] = job
+        threading.Thread(target=self.monitor, args=(job, messages), name="training-job-monitor",
+                         daemon=True).start()
+        return job
+
+    def get(self, job_id):
+        return self.jobs.get(job_id)
+
+    def cancel(self, job_id):
+        """Ask a running job to stop; returns the job, or None if there is no such job."""
+        job = self.jobs.get(job_id)
+        if job is not None and job.status == "running":
+            job.cancel.set()
+        return job
+
+    def monitor(self, job, messages):
+        """Follow one job's messages until it ends, then merge its deltas into the live table."""
+        while True:
+            try:
+                kind, payload = messages.get(timeout=JOB_PROGRESS_INTERVAL * 4)
+            except queue.Empty:
+                if job.process.is_alive():
+                    continue
+                kind, payload = "failed", f"training process exited with code {job.process.exitcode}"
+            if kind == "progress":
+                job.stats = payload
+                continue
+            if kind == "done" and job.cancel.is_set():
+                job.stats = payload[0]  # cancelled after the child's last check
+                job.status = "cancelled"
+            elif kind == "done":
+                job.stats, deltas = payload
+                try:
+                    job.merged_updates = self.server.merge_deltas(deltas)
+                    job.status = "finished"
+                except Exception as exc:
+                    job.error = f"{type(exc).__name__}: {exc}"
+                    job.status = "failed"
+            elif kind == "cancelled":
+                job.stats = payload
+                job.status = "cancelled"
+            else:
+                job.error = payload
+                job.status = "failed"
+            break
+        job.process.join(JOB_CANCEL_GRACE)
+        if job.process.is_alive():
+            job.process.terminate()
+            job.process.join()
+
+    def close(self):
+        """Cancel running jobs and wait for their processes."""
+        for job in self.running():
+            job.cancel.set()
+        for job in list(self.jobs.values()):
+            if job.process is not None:
+                job.process.join(JOB_CANCEL_GRACE)
+                if job.process.is_alive():
+                    job.process.terminate()
@@ -0,0 +1,226 @@
+"""
+Append-only journal of Q-table updates.
+
+update_q_values appends one batch per finished game to the current journal
+segment instead of rewriting the whole table, so persisting a game costs
+O(game length). On startup the segments are replayed on top of the last
+snapshot, and compact() folds them into a new snapshot once they grow past
+a size threshold.
+
+Files, for a snapshot at q_table.json:
+  q_table.json.journal.<seq>   journal segments, replayed in seq order
+  q_table.json.checkpoint      {"folded": seq, "pending": path or null}
+
+A batch is a header ("PWQJ", record count) followed by fixed-size records
+(player, state code, action code, delta), with state and action codes as in
+qstore.py. A batch cut short by a crash is ignored on replay.
+
+Compaction:
+  1. under the lock, start a new segment and copy the table,
+  2. write the copy to <snapshot>.compact-<seq>,
+  3. commit: write the checkpoint {"folded": seq, "pending": that file},
+  4. rename the pending file over the snapshot and drop folded segments.
+recover() finishes step 4 if the process died after the commit, so a
+segment is never applied twice and never lost.
+"""
+import atexit
+import glob
+import json
+import os
+import struct
+import threading
+from contextlib import nullcontext
+
+from persistence import atomic_write
+from qstore import CompactQTable, INITIAL_Q
+
+BATCH = struct.Struct("<4sI")
+BATCH_MAGIC = b"PWQJ"
+RECORD = struct.Struct("<cqHi")
+
+
+class QJournal:
+    def __init__(self, snapshot_path, engine, fsync=False):
+        self.snapshot_path = snapshot_path
+        self.checkpoint_path = snapshot_path + ".checkpoint"
+        self.engine = engine
+        self.codec = CompactQTable(engine)
+        self.fsync = fsync
+        self.lock = threading.RLock()
+        # Serializes whole compactions, so snapshots are renamed in the order they were taken.
+        self.compact_lock = threading.Lock()
+        self.file = None
+        self.seq = 0
+        self.size = 0      # bytes in the current segment
+        self.records = 0   # records appended since startup
+        self.compactions = 0
+
+    # ------------------------------------------------------------------
+    # Files
+    # ------------------------------------------------------------------
+    def segment_path(self, seq):
+        return f"{self.snapshot_path}.journal.{seq}"
+
+    def segments(self):
+        prefix = self.snapshot_path + ".journal."
+        seqs = []
+        for path in glob.glob(glob.escape(prefix) + "*"):
+            suffix = path[len(prefix):]
+            if suffix.isdigit():
+                seqs.append(int(suffix))
+        return sorted(seqs)
+
+    def read_checkpoint(self):
+        if not os.path.exists(self.checkpoint_path):
+            return {"folded": -1, "pending": None}
+        with open(self.checkpoint_path) as f:
+            return json.load(f)
+
+    def write_checkpoint(self, folded, pending=None):
+        with atomic_write(self.checkpoint_path) as f:
+            json.dump({"folded": folded, "pending": pending}, f)
+
+    def pending_path(self, seq):
+        return f"{self.snapshot_path}.compact-{seq}"
+
+    # ------------------------------------------------------------------
+    # Startup
+    # ------------------------------------------------------------------
+    def recover(self):
+        """Finish an interrupted compaction. Call before loading the snapshot."""
+        checkpoint = self.read_checkpoint()
+        pending = checkpoint.get("pending")
+        if pending and os.path.exists(pending):
+            os.replace(pending, self.snapshot_path)
+        if pending:
+            self.write_checkpoint(checkpoint["folded"])
+        for seq in self.segments():
+            if seq <= checkpoint["folded"]:
+                os.remove(self.segment_path(seq))
+        # Snapshots written before a crash but never committed.
+        for path in glob.glob(glob.escape(self.snapshot_path) + ".compact-*"):
+            os.remove(path)
+
+    def replay(self, q_table):
+        """Apply every unfolded segment to q_table. Returns the number of records applied."""
+        folded = self.read_checkpoint()["folded"]
+        applied = 0
+        for seq in self.segments():
+            if seq <= folded:
+                continue
+            with open(self.segment_path(seq), "rb") as f:
+                data = f.read()
+            offset = 0
+            while offset + BATCH.size <= len(data):
+                magic, count = BATCH.unpack_from(data, offset)
+                end = offset + BATCH.size + count * RECORD.size
+                if magic != BATCH_MAGIC or end > len(data):
+                    break  # torn write at the end of a segment
+                for i in range(count):
+                    self.apply(q_table, *RECORD.unpack_from(data, offset + BATCH.size + i * RECORD.size))
+                applied += count
+                offset = end
+        return applied
+
+    def apply(self, q_table, player, code, action, delta):
+        player = player.decode()
+        white, black = self.codec.decode(code)
+        state_key = self.engine.state_key(white, black, player)
+        n = self.engine.num_squares
+        action_str = self.engine.action_str(action // n, action % n)
+        # An entry missing from the snapshot was created by choose_action
+        # (at INITIAL_Q) after the snapshot was taken.
+        state_q = q_table[player].setdefault(state_key, {})
+        state_q[action_str] = state_q.get(action_str, INITIAL_Q) + delta
+
+    def open(self):
+        """Start a fresh segment after the newest existing one."""
+        with self.lock:
+            segments = self.segments()
+            self.seq = max(segments[-1] if segments else -1, self.read_checkpoint()["folded"]) + 1
+            self.file = open(self.segment_path(self.seq), "ab")
+            self.size = 0
+        atexit.register(self.close)
+        return self
+
+    # ------------------------------------------------------------------
+    # Appends
+    # ------------------------------------------------------------------
+    def append(self, updates):
+        """
+        Append one batch of (player, state_key, action_str, delta) updates.
+        Callers hold a lock that compaction also takes (self.lock, or the
+        `exclusive` lock passed to compact()) around the in-memory update and
+        the append, so compaction sees each game either in the table copy or
+        in a later segment, never both.
+        """
+        if not updates:
+            return
+        n = self.engine.num_squares
+        parts = [BATCH.pack(BATCH_MAGIC, len(updates))]
+        for player, state_key, action_str, delta in updates:
+            white, black, _ = self.engine.position_from_key(state_key)
+            src, dst = self.engine.parse_action(action_str)
+            parts.append(RECORD.pack(player.encode(), self.codec.state_code(white, black),
+                                     src * n + dst, delta))
+        data = b"".join(parts)
+        with self.lock:
+            self.file.write(data)
+            self.file.flush()
+            if self.fsync:
+                os.fsync(self.file.fileno())
+            self.size += len(data)
+            self.records += len(updates)
+
+    # ------------------------------------------------------------------
+    # Compaction
+    # ------------------------------------------------------------------
+    def compact(self, take_snapshot, write_snapshot, exclusive=None, force=False):
+        """
+        Fold all segments into a new snapshot. take_snapshot() is called
+        under the lock and must return a copy of the table; write_snapshot
+        (path, copy) writes it durably. exclusive, if given, is a context
+        manager that keeps writers out; it is entered before self.lock,
+        matching the order writers take them. Returns False if there was
+        nothing to fold, unless force.
+        """
+        with self.compact_lock:
+            return self.compact_locked(take_snapshot, write_snapshot, exclusive, force)
+
+    def compact_locked(self, take_snapshot, write_snapshot, exclusive, force):
+        with exclusive() if exclusive else nullcontext(), self.lock:
+            if not force and self.size == 0 and self.segments() == [self.seq]:
+                return False
+            folded = self.seq
+            self.file.close()
+            self.seq += 1
+            self.file = open(self.segment_path(self.seq), "ab")
+            self.size = 0
+            snapshot = take_snapshot()
+        pending = self.pending_path(folded)
+        write_snapshot(pending, snapshot)
+        self.write_checkpoint(folded, pending)
+        os.replace(pending, self.snapshot_path)
+        self.write_checkpoint(folded)
+        for seq in self.segments():
+            if seq <= folded:
+                os.remove(self.segment_path(seq))
+        self.compactions += 1
+        return True
+
+    def retire(self):
+        """
+        Mark every segment as folded and delete it. Call after writing a
+        snapshot that already includes them.
+        """
+        segments = self.segments()
+        if segments:
+            self.write_checkpoint(segments[-1])
+            for seq in segments:
+                os.remove(self.segment_path(seq))
+
+    def close(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
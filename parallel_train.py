@@ -0,0 +1,152 @@
+"""
+Multiprocess self-play training with worker-local Q deltas.
+
+Each round the coordinator sends a snapshot of q_table to every worker. A
+worker installs the snapshot as its trainer's q_table, plays merge_every
+games with play_game/update_q_values (so it keeps learning from its own
+games) and returns only the +1/-1 deltas it applied. The coordinator adds
+all deltas into the master table, which becomes the next round's snapshot.
+
+The trainer is passed as a module (fast_train.py or 4by4/fast_train.py,
+usually running as __main__); workers import it by name, which finds
+__main__ in sys.modules and imports any other trainer that the main
+script did not (under spawn, e.g. when a test or a benchmark passes it).
+Each worker configures that module for the coordinator's board size when
+it starts, since under the "spawn" start method (the default on macOS and
+Windows) workers import the trainer afresh and would otherwise play 3x3.
+benchmarks/bench_workers.py measures throughput per worker count.
+"""
+import importlib
+import multiprocessing
+import random
+import time
+from collections import Counter
+
+INITIAL_Q = 20
+
+
+def _init_worker(module_name, width, height):
+    """Worker: set the trainer up for the coordinator's board size."""
+    importlib.import_module(module_name).configure(width, height)
+
+
+def _run_chunk(task):
+    """Worker: play num_games on top of snapshot and return (deltas, wins, total_moves)."""
+    module_name, snapshot, num_games, seed = task
+    trainer = importlib.import_module(module_name)
+    random.seed(seed)
+    trainer.q_table = snapshot
+    deltas = Counter()
+    wins = {"W": 0, "B": 0}
+    total_moves = 0
+    for _ in range(num_games):
+        winner, game_history = trainer.play_game()
+        trainer.update_q_values(game_history, winner)
+        for (player, state_key, action_str) in game_history:
+            deltas[(player, state_key, action_str)] += 1 if player == winner else -1
+        wins[winner] += 1
+        total_moves += len(game_history)
+    return deltas, wins, total_moves
+
+
+def merge_deltas(q_table, deltas):
+    """Add worker deltas into q_table; entries a worker discovered start at INITIAL_Q."""
+    for (player, state_key, action_str), delta in deltas.items():
+        state_q = q_table[player].setdefault(state_key, {})
+        state_q[action_str] = state_q.get(action_str, INITIAL_Q) + delta
+
+
+def train(trainer, num_games, workers, merge_every, progress=None, start_method=None):
+    """
+    Train trainer.q_table in place with a pool of worker processes.
+    Every round each worker plays merge_every games (fewer in the last
+    round). Returns (wins, total_moves) like the single-process loop.
+    start_method picks the multiprocessing start method (default: the
+    platform's).
+    """
+    wins = {"W": 0, "B": 0}
+    total_moves = 0
+    remaining = num_games
+    engine = trainer.ENGINE
+    context = multiprocessing.get_context(start_method)
+    with context.Pool(workers, _init_worker, (trainer.__name__, engine.width, engine.height)) as pool:
+        while remaining > 0:
+            chunks = []
+            for _ in range(workers):
+                size = min(merge_every, remaining)
+                if size <= 0:
+                    break
+                chunks.append(size)
+                remaining -= size
+            tasks = [(trainer.__name__, trainer.q_table, size, random.getrandbits(64))
+                     for size in chunks]
+            for deltas, chunk_wins, chunk_moves in pool.map(_run_chunk, tasks):
+                merge_deltas(trainer.q_table, deltas)
+                wins["W"] += chunk_wins["W"]
+                wins["B"] += chunk_wins["B"]
+                total_moves += chunk_moves
+            if progress is not None:
+                progress(sum(chunks))
+    return wins, total_moves
+
+
+def win_rate_vs_random(trainer, q_table, num_games):
+    """
+    Play the policy in q_table (sampled as in choose_action, learning
+    disabled) against a uniformly random opponent, half the games as each
+    colour. Returns the policy's win rate.
+    """
+    engine = trainer.ENGINE
+    saved = trainer.q_table
+    # choose_action inserts unseen states, so play against a throwaway copy.
+    trainer.q_table = {player: dict(states) for player, states in q_table.items()}
+    policy_wins = 0
+    try:
+        for i in range(num_games):
+            policy_side = "W" if i % 2 == 0 else "B"
+            white, black = engine.initial_position()
+            player = "W"
+            history = []
+            while True:
+                if player == policy_side:
+                    move = trainer.choose_action(player, (white, black), history)
+                else:
+                    moves = engine.moves(white, black, player)
+                    move = random.choice(moves) if moves else None
+                if move is None:
+                    winner = "B" if player == "W" else "W"
+                    break
+                white, black = engine.apply_move(white, black, player, *move)
+                next_player = "B" if player == "W" else "W"
+                over, winner = engine.game_over(white, black, next_player)
+                if over:
+                    break
+                player = next_player
+            policy_wins += winner == policy_side
+    finally:
+        trainer.q_table = saved
+    return policy_wins / num_games
+
+
+def merge_frequency_report(trainer, num_games, workers, merge_values, eval_games=2000):
+    """
+    Train a fresh copy of trainer.q_table once per merge interval and print
+    throughput and the resulting policy's win rate against a random opponent.
+    """
+    start_table = trainer.q_table
+    print(f"{'merge_every':>11} {'rounds':>7} {'games/s':>10} {'win vs random':>14}")
+    results = []
+    try:
+        for merge_every in merge_values:
+            trainer.q_table = {player: {key: dict(actions) for key, actions in states.items()}
+                               for player, states in start_table.items()}
+            start_time = time.time()
+            train(trainer, num_games, workers, merge_every)
+            elapsed = time.time() - start_time
+            rounds = -(-num_games // (workers * merge_every))
+            win_rate = win_rate_vs_random(trainer, trainer.q_table, eval_games)
+            results.append((merge_every, rounds, num_games / elapsed, win_rate))
+            print(f"{merge_every:>11} {rounds:>7} {num_games / elapsed:>10.0f} {win_rate:>14.3f}")
+    finally:
+        trainer.q_table = start_table
+    return results
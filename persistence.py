@@ -0,0 +1,124 @@
+"""
+Q-table persistence helpers for the Flask apps.
+
+atomic_write() writes to a temporary file in the target directory, fsyncs it
+and renames it over the target, so readers never see a half-written table.
+
+WriteBehindSaver moves saving off the request path: update_q_values only
+calls mark_dirty(), and a background thread calls the save function at
+most once per flush interval while there are unsaved changes. stop() (run
+at exit and on SIGTERM) flushes whatever is still pending.
+"""
+import atexit
+import json
+import os
+import signal
+import stat
+import sys
+import tempfile
+import threading
+from contextlib import contextmanager
+
+
+def _file_mode(path):
+    """Permissions of path, or the umask default for a new file."""
+    try:
+        return stat.S_IMODE(os.stat(path).st_mode)
+    except FileNotFoundError:
+        umask = os.umask(0)
+        os.umask(umask)
+        return 0o666 & ~umask
+
+
+@contextmanager
+def atomic_write(path, mode="w"):
+    """Open a temporary file next to path and move it over path on success."""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(path) + ".", suffix=".tmp", dir=directory)
+    try:
+        # mkstemp creates the file as 0600; keep the target's permissions instead.
+        os.chmod(tmp_path, _file_mode(path))
+        with os.fdopen(fd, mode) as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def snapshot_q_table(q_table):
+    """
+    Copy {"W": {state: {action: q}}, "B": ...} while request threads may be
+    mutating it. list(d.items()) and dict(d) run without releasing the GIL,
+    so each state is copied consistently and iteration cannot fail with
+    "dictionary changed size during iteration".
+    """
+    return {player: {state_key: dict(state_q) for state_key, state_q in list(states.items())}
+            for player, states in list(q_table.items())}
+
+
+def write_json(path, q_table):
+    with atomic_write(path) as f:
+        json.dump(snapshot_q_table(q_table), f)
+
+
+class WriteBehindSaver:
+    def __init__(self, save, interval=5.0):
+        self.save = save
+        self.interval = interval
+        self.generation = 0        # bumped by every mark_dirty()
+        self.saved_generation = 0  # generation covered by the last save
+        self.saves = 0
+        self.lock = threading.Lock()  # serializes saves
+        self.wakeup = threading.Event()
+        self.stopped = False
+        self.thread = None
+
+    def mark_dirty(self):
+        self.generation += 1
+
+    @property
+    def dirty(self):
+        return self.generation != self.saved_generation
+
+    def flush(self):
+        """Save now if there are unsaved changes. Returns True if a save ran."""
+        with self.lock:
+            generation = self.generation
+            if generation == self.saved_generation:
+                return False
+            self.save()
+            self.saved_generation = generation
+            self.saves += 1
+            return True
+
+    def run(self):
+        while not self.stopped:
+            self.wakeup.wait(self.interval)
+            self.wakeup.clear()
+            try:
+                self.flush()
+            except Exception as exc:  # keep the thread alive; retry next interval
+                print(f"write-behind save failed: {exc!r}", file=sys.stderr)
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run, name="q-table-writer", daemon=True)
+            self.thread.start()
+            atexit.register(self.stop)
+            if threading.current_thread() is threading.main_thread():
+                # Turn SIGTERM into a normal exit so atexit handlers flush.
+                if signal.getsignal(signal.SIGTERM) is signal.SIG_DFL:
+                    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+        return self
+
+    def stop(self):
+        """Stop the background thread and flush pending changes."""
+        self.stopped = True
+        self.wakeup.set()
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join(timeout=self.interval + 5)
+        self.flush()
@@ -0,0 +1,257 @@
+"""
+Binary, memory-mappable Q-table format.
+
+Layout (little-endian, every section 8-byte aligned):
+
+  header   magic b"PWQT", version u16, width u8, height u8,
+           then for W and B: number of states u64, number of actions u64
+  per player, W then B:
+    codes    int64[states]   sorted base-3 state codes (see qstore.py)
+    starts   uint32[states]  offset of each state's actions
+    counts   uint8[states]   number of actions per state
+    actions  uint16[actions] src * squares + dst
+    values   int32[actions]  Q values
+
+open_table() maps the file and returns a MappedQTable that behaves like the
+{"W": {...}, "B": {...}} dict the apps use. A state is looked up with a
+binary search over the mapped codes and materialized into a normal dict the
+first time it is touched, so nothing is parsed at startup and changes stay
+in memory until write() saves a new file.
+
+Convert with:
+  python qbin.py to-bin q_table.json q_table.bin
+  python qbin.py to-json q_table.bin q_table.json
+"""
+import argparse
+import json
+import mmap
+import struct
+import sys
+from array import array
+from bisect import bisect_left
+from collections.abc import MutableMapping
+
+from bitboard import BitboardEngine, infer_engine
+from persistence import atomic_write
+from qstore import CompactQTable, PLAYERS
+from symmetry import fold
+
+MAGIC = b"PWQT"
+VERSION = 1
+HEADER = struct.Struct("<4sHBB4Q")
+
+if sys.byteorder != "little":
+    raise ImportError("qbin stores native little-endian arrays")
+
+
+def _aligned(size):
+    return (size + 7) & ~7
+
+
+def write(path, q_table, engine):
+    """Write q_table (any {"W": mapping, "B": mapping}) to path atomically."""
+    table = q_table if isinstance(q_table, CompactQTable) else CompactQTable.from_json(q_table, engine)
+    table.rank()
+    sizes = []
+    for player in PLAYERS:
+        sizes += [len(table.codes[player]), len(table.values[player])]
+    with atomic_write(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, engine.width, engine.height, *sizes))
+        f.write(b"\0" * (_aligned(HEADER.size) - HEADER.size))
+        for player in PLAYERS:
+            for section in (table.codes, table.starts, table.counts, table.actions, table.values):
+                data = section[player].tobytes()
+                f.write(data)
+                f.write(b"\0" * (_aligned(len(data)) - len(data)))
+
+
+class MappedStates(MutableMapping):
+    """One player's states: mapped file plus an in-memory overlay of touched states."""
+
+    def __init__(self, table, player, sections):
+        self.table = table
+        self.player = player
+        self.codes, self.starts, self.counts, self.actions, self.values = sections
+        self.overlay = {}
+        self.deleted = set()
+        self.added = set()  # states in the overlay that the mapped file does not have
+
+    def _find(self, state_key):
+        """Return the mapped index of state_key, or -1."""
+        white, black, _ = self.table.engine.position_from_key(state_key)
+        code = self.table.codec.state_code(white, black)
+        i = bisect_left(self.codes, code)
+        if i < len(self.codes) and self.codes[i] == code:
+            return i
+        return -1
+
+    def _load(self, i):
+        names = self.table.engine.action_names
+        n = self.table.engine.num_squares
+        start = self.starts[i]
+        end = start + self.counts[i]
+        return {names[a // n][a % n]: v
+                for a, v in zip(self.actions[start:end], self.values[start:end])}
+
+    def __getitem__(self, state_key):
+        state_q = self.overlay.get(state_key)
+        if state_q is not None:
+            return state_q
+        if state_key in self.deleted:
+            raise KeyError(state_key)
+        i = self._find(state_key)
+        if i < 0:
+            raise KeyError(state_key)
+        # setdefault: if two threads load the same state, both get the first copy.
+        return self.overlay.setdefault(state_key, self._load(i))
+
+    def __contains__(self, state_key):
+        if state_key in self.overlay:
+            return True
+        if state_key in self.deleted:
+            return False
+        # Membership tests are usually followed by a read, so cache the hit.
+        i = self._find(state_key)
+        if i < 0:
+            return False
+        self.overlay.setdefault(state_key, self._load(i))
+        return True
+
+    def __setitem__(self, state_key, state_q):
+        if state_key not in self.overlay and self._find(state_key) < 0:
+            self.added.add(state_key)
+        self.deleted.discard(state_key)
+        self.overlay[state_key] = state_q
+
+    def __delitem__(self, state_key):
+        if state_key not in self:
+            raise KeyError(state_key)
+        self.overlay.pop(state_key, None)
+        self.added.discard(state_key)
+        self.deleted.add(state_key)
+
+    def __iter__(self):
+        engine = self.table.engine
+        seen = set()
+        for code in self.codes:
+            white, black = self.table.codec.decode(code)
+            state_key = engine.state_key(white, black, self.player)
+            if state_key not in self.deleted:
+                seen.add(state_key)
+                yield state_key
+        for state_key in list(self.overlay):
+            if state_key not in seen:
+                yield state_key
+
+    def __len__(self):
+        """Mapped states plus added ones, without walking the file (deletions are rare)."""
+        deleted = sum(1 for state_key in list(self.deleted) if self._find(state_key) >= 0)
+        return len(self.codes) - deleted + len(self.added)
+
+    def copy(self, table):
+        """A copy sharing the mapped sections, with its own copy of the overlay."""
+        states = MappedStates(table, self.player, (self.codes, self.starts, self.counts,
+                                                   self.actions, self.values))
+        states.overlay = {state_key: dict(state_q) for state_key, state_q in list(self.overlay.items())}
+        states.deleted = set(self.deleted)
+        states.added = set(self.added)
+        return states
+
+    def items(self):
+        """
+        Yield (state_key, actions) without caching untouched states in the
+        overlay. Touched states are yielded as copies, so a writer thread can
+        iterate while requests keep updating them.
+        """
+        engine = self.table.engine
+        seen = set()
+        for i, code in enumerate(self.codes):
+            white, black = self.table.codec.decode(code)
+            state_key = engine.state_key(white, black, self.player)
+            if state_key in self.deleted:
+                continue
+            seen.add(state_key)
+            state_q = self.overlay.get(state_key)
+            yield state_key, dict(state_q) if state_q is not None else self._load(i)
+        for state_key, state_q in list(self.overlay.items()):
+            if state_key not in seen:
+                yield state_key, dict(state_q)
+
+
+class MappedQTable(dict):
+    """{"W": MappedStates, "B": MappedStates} backed by one mapped file."""
+
+    def __init__(self, path, engine=None):
+        super().__init__()
+        self.path = path
+        self.file = open(path, "rb")
+        self.mm = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, width, height, *sizes = HEADER.unpack_from(self.mm, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} Q-table file")
+        if engine is None:
+            engine = BitboardEngine(width, height)
+        elif (engine.width, engine.height) != (width, height):
+            raise ValueError(f"{path} holds a {width}x{height} table, expected {engine.width}x{engine.height}")
+        self.engine = engine
+        self.codec = CompactQTable(engine)
+        view = memoryview(self.mm)
+        offset = _aligned(HEADER.size)
+        for player, (num_states, num_actions) in zip(PLAYERS, (sizes[0:2], sizes[2:4])):
+            sections = []
+            for fmt, count in (("q", num_states), ("I", num_states), ("B", num_states),
+                               ("H", num_actions), ("i", num_actions)):
+                size = count * array(fmt).itemsize
+                sections.append(view[offset:offset + size].cast(fmt))
+                offset += _aligned(size)
+            self[player] = MappedStates(self, player, sections)
+
+    def frozen(self):
+        """
+        Point-in-time copy for saving: shares the mapped file and copies only
+        the overlay of touched states.
+        """
+        frozen = dict.__new__(MappedQTable)
+        frozen.__dict__.update(self.__dict__)
+        for player in PLAYERS:
+            frozen[player] = self[player].copy(frozen)
+        return frozen
+
+
+def open_table(path, engine=None):
+    return MappedQTable(path, engine)
+
+
+def table_size(path):
+    """(width, height) recorded in a table file's header."""
+    with open(path, "rb") as f:
+        header = f.read(HEADER.size)
+    if len(header) < HEADER.size:
+        raise ValueError(f"{path} is not a version {VERSION} Q-table file")
+    magic, version, width, height, *_ = HEADER.unpack(header)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"{path} is not a version {VERSION} Q-table file")
+    return width, height
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert Q-tables between JSON and the binary format.")
+    parser.add_argument("command", choices=["to-bin", "to-json"])
+    parser.add_argument("source")
+    parser.add_argument("target")
+    parser.add_argument("--size", type=int, default=None,
+                        help="board size for to-bin (default: inferred from the state keys)")
+    args = parser.parse_args()
+    if args.command == "to-bin":
+        with open(args.source) as f:
+            q_table = json.load(f)
+        engine = BitboardEngine(args.size, args.size) if args.size else infer_engine(q_table)
+        write(args.target, fold(q_table, engine), engine)
+    else:
+        table = open_table(args.source)
+        with open(args.target, "w") as f:
+            json.dump({player: dict(table[player].items()) for player in PLAYERS}, f)
+
+
+if __name__ == "__main__":
+    main()
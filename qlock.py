@@ -0,0 +1,54 @@
+"""
+Lock striping for the apps' shared Q-table.
+
+Under a threaded server several requests touch the table at once:
+choose_action and state_q_values insert unseen states, update_q_values
+adds +1/-1 to finished games' entries, and compaction copies the whole
+table. StripedLocks guards it with a fixed set of locks picked by the
+state key's hash, so requests for different states rarely wait on each
+other:
+
+  - Reads take no lock. A new state's dict is filled in completely before
+    it is stored, and a missing action is added with one setdefault(), so a
+    reader sees either the old or the new entry, never a half-built one.
+  - Writers to a state hold its stripe (for_keys() takes the stripes of a
+    whole game in index order, so two games cannot deadlock).
+  - exclusive() takes every stripe, for compaction to copy the table and
+    rotate the journal while no update is half-applied.
+"""
+import threading
+from contextlib import contextmanager
+
+
+class StripedLocks:
+    def __init__(self, stripes=64):
+        self.locks = [threading.Lock() for _ in range(stripes)]
+
+    def index(self, state_key):
+        return hash(state_key) % len(self.locks)
+
+    def for_key(self, state_key):
+        return self.locks[self.index(state_key)]
+
+    @contextmanager
+    def for_keys(self, state_keys):
+        """Hold the stripes of all state_keys."""
+        locks = [self.locks[i] for i in sorted({self.index(key) for key in state_keys})]
+        for lock in locks:
+            lock.acquire()
+        try:
+            yield
+        finally:
+            for lock in reversed(locks):
+                lock.release()
+
+    @contextmanager
+    def exclusive(self):
+        """Hold every stripe."""
+        for lock in self.locks:
+            lock.acquire()
+        try:
+            yield
+        finally:
+            for lock in reversed(self.locks):
+                lock.release()
@@ -0,0 +1,274 @@
+"""
+Compact array-backed Q-table.
+
+The JSON q_table keeps one string key and one dict per state and one string
+per action. CompactQTable keeps the same information in flat typed arrays:
+
+  codes    array('q')  sorted state codes; a state's id is its rank here
+  starts   array('I')  offset of each state's actions in actions/values
+  counts   array('B')  number of actions of each state
+  actions  array('H')  action codes, src * num_squares + dst
+  values   array('i')  Q values
+
+A state code is the base-3 rank of the board (0 = empty, 1 = White,
+2 = Black per square), so boards up to 39 squares fit in an int64. Tables
+are kept per player, exactly like the JSON format.
+
+States first seen after the last rank() get the next ids and are found
+through the small `recent` dict; rank() folds them back into the sorted
+index. If a state gains actions, its span is moved to the end of the
+arrays and the old span is dropped at the next rank(). simulate_game calls
+maybe_rank() after every game, which ranks once the recent states or the
+dropped spans reach a quarter of the ranked states (at least RANK_MIN), so
+long training runs keep the compact layout at an amortized O(log n) per
+new state.
+
+choose_action/update_q_values below mirror fast_train.py, sampling with
+the same max(q, 0) weights, but history entries are (player, value index)
+instead of (player, state_key, action_str).
+"""
+import random
+from array import array
+from bisect import bisect_left
+
+import sampling
+from symmetry import Mirror
+
+INITIAL_Q = 20
+PLAYERS = ("W", "B")
+# maybe_rank() leaves at least this many recent states or dropped spans unranked.
+RANK_MIN = 1024
+
+
+class CompactQTable:
+    def __init__(self, engine):
+        self.engine = engine
+        self.mirror = Mirror(engine)
+        self.num_squares = engine.num_squares
+        if 3 ** self.num_squares >= 2 ** 63:
+            raise ValueError("compact Q-table supports boards of at most 39 squares")
+        if self.num_squares * self.num_squares > 65535:
+            raise ValueError("compact Q-table supports boards of at most 255 squares")
+        # Base-3 rank contribution of each 8-square chunk of a bitboard.
+        self.chunks = []
+        for base in range(0, self.num_squares, 8):
+            width = min(8, self.num_squares - base)
+            weights = [3 ** (base + i) for i in range(width)]
+            table = [sum(w for i, w in enumerate(weights) if bits >> i & 1) for bits in range(1 << width)]
+            self.chunks.append((base, (1 << width) - 1, table))
+        self.codes = {p: array("q") for p in PLAYERS}
+        self.recent = {p: {} for p in PLAYERS}
+        self.recent_codes = {p: array("q") for p in PLAYERS}
+        self.starts = {p: array("I") for p in PLAYERS}
+        self.counts = {p: array("B") for p in PLAYERS}
+        self.actions = {p: array("H") for p in PLAYERS}
+        self.values = {p: array("i") for p in PLAYERS}
+        self.garbage = 0  # spans dropped by ensure_actions since the last rank()
+
+    # ------------------------------------------------------------------
+    # State codes
+    # ------------------------------------------------------------------
+    def state_code(self, white, black):
+        code = 0
+        for base, mask, table in self.chunks:
+            code += table[(white >> base) & mask] + 2 * table[(black >> base) & mask]
+        return code
+
+    def decode(self, code):
+        """Return the (white, black) pair for a state code."""
+        white = black = 0
+        for sq in range(self.num_squares):
+            code, digit = divmod(code, 3)
+            if digit == 1:
+                white |= 1 << sq
+            elif digit == 2:
+                black |= 1 << sq
+        return white, black
+
+    def state_id(self, player, code):
+        """Return the dense id of a state, or -1 if it is not in the table."""
+        codes = self.codes[player]
+        lo = bisect_left(codes, code)
+        if lo < len(codes) and codes[lo] == code:
+            return lo
+        return self.recent[player].get(code, -1)
+
+    def __len__(self):
+        return sum(len(self.starts[p]) for p in PLAYERS)
+
+    # ------------------------------------------------------------------
+    # Mutation
+    # ------------------------------------------------------------------
+    def add_state(self, player, code, action_codes, values):
+        """Append a new state with the given actions and values; returns its id."""
+        state_id = len(self.starts[player])
+        self.recent[player][code] = state_id
+        self.recent_codes[player].append(code)
+        self.starts[player].append(len(self.values[player]))
+        self.counts[player].append(len(action_codes))
+        self.actions[player].extend(action_codes)
+        self.values[player].extend(values)
+        return state_id
+
+    def ensure_actions(self, player, state_id, action_codes):
+        """
+        Make sure every code in action_codes exists for the state, adding
+        missing ones at INITIAL_Q. Returns (start, end) of the state's span.
+        """
+        start = self.starts[player][state_id]
+        end = start + self.counts[player][state_id]
+        stored = self.actions[player][start:end]
+        missing = [a for a in action_codes if a not in stored]
+        if not missing:
+            return start, end
+        # Move the span to the end so it can grow; the old span is garbage
+        # until the next rank().
+        values = self.values[player][start:end]
+        new_start = len(self.values[player])
+        self.actions[player].extend(stored)
+        self.actions[player].extend(missing)
+        self.values[player].extend(values)
+        self.values[player].extend([INITIAL_Q] * len(missing))
+        self.starts[player][state_id] = new_start
+        self.garbage += 1
+        self.counts[player][state_id] = len(stored) + len(missing)
+        return new_start, new_start + len(stored) + len(missing)
+
+    def rank(self):
+        """Re-sort all states so that ids are dense ranks again and drop garbage spans."""
+        for player in PLAYERS:
+            all_codes = list(self.codes[player]) + list(self.recent_codes[player])
+            ids = list(range(len(all_codes)))
+            ids.sort(key=all_codes.__getitem__)
+            old_starts, old_counts = self.starts[player], self.counts[player]
+            old_actions, old_values = self.actions[player], self.values[player]
+            codes, starts, counts = array("q"), array("I"), array("B")
+            actions, values = array("H"), array("i")
+            for old_id in ids:
+                start, count = old_starts[old_id], old_counts[old_id]
+                codes.append(all_codes[old_id])
+                starts.append(len(values))
+                counts.append(count)
+                actions.extend(old_actions[start:start + count])
+                values.extend(old_values[start:start + count])
+            self.codes[player] = codes
+            self.starts[player], self.counts[player] = starts, counts
+            self.actions[player], self.values[player] = actions, values
+            self.recent[player] = {}
+            self.recent_codes[player] = array("q")
+        self.garbage = 0
+
+    def maybe_rank(self):
+        """
+        rank() if enough has piled up since the last one. Value indices
+        change, so call it between games, never with a game history open.
+        """
+        ranked = sum(len(self.codes[p]) for p in PLAYERS)
+        pending = sum(len(self.recent_codes[p]) for p in PLAYERS) + self.garbage
+        if pending >= max(RANK_MIN, ranked // 4):
+            self.rank()
+
+    # ------------------------------------------------------------------
+    # JSON import / export
+    # ------------------------------------------------------------------
+    @classmethod
+    def from_json(cls, q_table, engine):
+        """Build a compact table from a {"W": {state_key: {action_str: q}}, "B": ...} dict."""
+        table = cls(engine)
+        n = engine.num_squares
+        for player in PLAYERS:
+            for state_key, state_q in q_table.get(player, {}).items():
+                white, black, _ = engine.position_from_key(state_key)
+                action_codes = []
+                for action_str in state_q:
+                    src, dst = engine.parse_action(action_str)
+                    action_codes.append(src * n + dst)
+                table.add_state(player, table.state_code(white, black), action_codes,
+                                list(state_q.values()))
+        table.rank()
+        return table
+
+    def to_json(self):
+        """Export to the {"W": {...}, "B": {...}} format, states in rank order."""
+        engine = self.engine
+        n = self.num_squares
+        names = engine.action_names
+        q_table = {}
+        for player in PLAYERS:
+            states = {}
+            codes = list(self.codes[player]) + list(self.recent_codes[player])
+            for state_id, code in enumerate(codes):
+                white, black = self.decode(code)
+                start = self.starts[player][state_id]
+                end = start + self.counts[player][state_id]
+                states[engine.state_key(white, black, player)] = {
+                    names[a // n][a % n]: v
+                    for a, v in zip(self.actions[player][start:end], self.values[player][start:end])
+                }
+            q_table[player] = states
+        return q_table
+
+
+# ----------------------------------------------------------------------
+# Policy on a CompactQTable (same behaviour as fast_train.py)
+# ----------------------------------------------------------------------
+def choose_action(table, player, position, game_history):
+    """
+    Sample a move for player from the Q values of the state (in its
+    mirror-canonical orientation), adding the state and any new moves at
+    INITIAL_Q first. Records (player, value index) in game_history and
+    returns the (src, dst) move on the real board.
+    """
+    white, black, flipped = table.mirror.canonical(*position)
+    possible_moves = table.engine.moves(white, black, player)
+    if not possible_moves:
+        return None
+    n = table.num_squares
+    action_codes = [src * n + dst for src, dst in possible_moves]
+    code = table.state_code(white, black)
+    state_id = table.state_id(player, code)
+    if state_id < 0:
+        start = len(table.values[player])
+        table.add_state(player, code, action_codes, [INITIAL_Q] * len(action_codes))
+        end = start + len(action_codes)
+    else:
+        start, end = table.ensure_actions(player, state_id, action_codes)
+
+    probabilities = sampling.probabilities(table.values[player][start:end])
+    index = random.choices(range(start, end), weights=probabilities, k=1)[0]
+    game_history.append((player, index))
+    action = table.actions[player][index]
+    chosen_move = (action // n, action % n)
+    if chosen_move not in possible_moves:
+        # Spans only ever hold the state's legal moves; anything else is a corrupt table.
+        raise ValueError(f"Q-table action {table.engine.action_str(*chosen_move)} is not a legal move "
+                         f"for {player} in {table.engine.state_key(white, black, player)}")
+    return table.mirror.mirror_move(chosen_move) if flipped else chosen_move
+
+
+def update_q_values(table, game_history, winner):
+    """+1 for every move of the winner, -1 for every move of the loser."""
+    for player, index in game_history:
+        table.values[player][index] += 1 if player == winner else -1
+
+
+def simulate_game(table):
+    """Play one game on table, update it and return (winner, number of moves)."""
+    engine = table.engine
+    white, black = engine.initial_position()
+    game_history = []
+    current_player = "W"
+    while True:
+        move = choose_action(table, current_player, (white, black), game_history)
+        if move is None:
+            winner = "B" if current_player == "W" else "W"
+            break
+        white, black = engine.apply_move(white, black, current_player, *move)
+        next_player = "B" if current_player == "W" else "W"
+        over, winner = engine.game_over(white, black, next_player)
+        if over:
+            break
+        current_player = next_player
+    update_q_values(table, game_history, winner)
+    table.maybe_rank()
+    return winner, len(game_history)
@@ -0,0 +1,182 @@
+"""
+Cached per-state sampling tables for the apps' choose_action.
+
+choose_action draws a move with probability proportional to its Q value.
+Rebuilding the weight lists and calling random.choices on every move is
+wasted work, because a state's Q values only change when a finished game
+updates them. SamplerCache keeps one AliasSampler per state,
+built once from the store's values. SamplerCache keys states by their
+Zobrist hash (see zobrist.py). A finished game changes the Q values of
+every state it visited, so dropping those samplers would turn most
+lookups into misses on a small board (the 3x3 table has 37 states, and a
+game visits about 8). Instead GameServer passes the updates the store
+applied to SamplerCache.update(), which adds the same deltas to the
+cached values. The alias table is rebuilt from them on the state's next
+lookup, without reading the store, so a state updated by several games
+in a row is rebuilt once, and finishing a game stays cheap. Every
+sampler is dropped when the table is reloaded or merged.
+
+Weights. A Q value counts as max(q, 0): a move whose Q has fallen to zero
+or below is never sampled while its state has a move with positive Q. If
+no move has positive Q, every move is equally likely, as before. The old
+code passed negative Q values (the 3x3 table has e.g. -3130) straight to
+random.choices. Its bisection over a non-monotone running sum gave
+arbitrary probabilities, and sometimes picked a negative move over a
+positive one. For states whose Q values are all positive, the
+distribution is unchanged.
+
+Sampling uses Walker's alias method (Vose's construction): one uniform
+draw picks a column and a second comparison picks the column's move or
+its alias, in O(1) whatever the number of moves.
+
+Only stores whose table lives in this process are cached. With
+Q_STORE=shared or sqlite, other workers update the table behind this
+process's back, so GameServer reads the store on every move.
+"""
+import random
+import threading
+
+
+class AliasSampler:
+    __slots__ = ("actions", "moves", "values", "probabilities", "cutoff", "alias", "mirrored")
+
+    def __init__(self, actions, values, moves):
+        """actions are "a1a2" strings, values their Q values and moves their (src, dst) pairs."""
+        self.actions = actions
+        self.moves = moves
+        self.values = values
+        self.probabilities = probabilities(values)
+        self.cutoff, self.alias = alias_table(self.probabilities)
+        self.mirrored = None  # actions in the mirrored orientation, filled in on first use
+
+    def sample(self, uniform=random.random):
+        """Index of a move drawn with self.probabilities."""
+        column = uniform() * len(self.cutoff)
+        index = int(column)
+        return index if column - index < self.cutoff[index] else self.alias[index]
+
+
+class UpdatedValues:
+    """A cached state's Q values after an update, until its next lookup rebuilds the sampler."""
+    __slots__ = ("actions", "moves", "values", "mirrored")
+
+    def __init__(self, actions, values, moves, mirrored):
+        self.actions = actions
+        self.moves = moves
+        self.values = values
+        self.mirrored = mirrored
+
+    def build(self):
+        sampler = AliasSampler(self.actions, self.values, self.moves)
+        sampler.mirrored = self.mirrored
+        return sampler
+
+
+def probabilities(values):
+    """Sampling probabilities for Q values: proportional to max(q, 0), uniform if none is positive."""
+    weights = [q if q > 0 else 0 for q in values]
+    total = sum(weights)
+    if total <= 0:
+        return [1 / len(values)] * len(values)
+    return [weight / total for weight in weights]
+
+
+def alias_table(probabilities):
+    """Vose's alias method: (cutoff, alias) lists for O(1) sampling."""
+    count = len(probabilities)
+    scaled = [p * count for p in probabilities]
+    cutoff = [1.0] * count
+    alias = list(range(count))
+    small = [i for i, p in enumerate(scaled) if p < 1.0]
+    large = [i for i, p in enumerate(scaled) if p >= 1.0]
+    while small and large:
+        less, more = small.pop(), large.pop()
+        cutoff[less] = scaled[less]
+        alias[less] = more
+        scaled[more] -= 1.0 - scaled[less]
+        (small if scaled[more] < 1.0 else large).append(more)
+    # Whatever is left is 1 up to rounding and keeps cutoff 1.0.
+    return cutoff, alias
+
+
+class SamplerCache:
+    """
+    AliasSamplers by state key, at most max_entries (oldest
+    dropped first). A sampler built from values read before an update of
+    its state is not stored: every update bumps a stamp for the state's
+    stripe, and a sampler is only stored if its stripe's stamp has not
+    changed since the values were read.
+    """
+
+    def __init__(self, max_entries=100000, stripes=64):
+        self.max_entries = max_entries
+        self.samplers = {}
+        self.stamps = [0] * stripes
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.samplers)
+
+    def get(self, key, load):
+        """
+        The sampler for a state, built from load() -> (actions, values, moves)
+        on a miss. Returns None, and caches nothing, if load() returns None.
+        """
+        sampler = self.samplers.get(key)
+        if sampler is not None:
+            self.hits += 1
+            if sampler.__class__ is AliasSampler:
+                return sampler
+            updated, sampler = sampler, sampler.build()
+            with self.lock:
+                if self.samplers.get(key) is updated:
+                    self.samplers[key] = sampler
+            return sampler
+        self.misses += 1
+        stripe = hash(key) % len(self.stamps)
+        stamp = self.stamps[stripe]
+        loaded = load()
+        if loaded is None:
+            return None
+        sampler = AliasSampler(*loaded)
+        with self.lock:
+            if self.stamps[stripe] == stamp:
+                if len(self.samplers) >= self.max_entries:
+                    self.samplers.pop(next(iter(self.samplers)))
+                self.samplers[key] = sampler
+        return sampler
+
+    def hit_ratio(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def update(self, changes):
+        """
+        Apply {key: {action_str: delta}}, the deltas the store has just
+        added, to the cached values; get() rebuilds the sampler. Call it
+        after the store has applied them. A state whose cached actions
+        do not include one of them is dropped.
+        """
+        with self.lock:
+            for key, deltas in changes.items():
+                self.stamps[hash(key) % len(self.stamps)] += 1
+                sampler = self.samplers.get(key)
+                if sampler is None:
+                    continue
+                values = list(sampler.values)
+                for action_str, delta in deltas.items():
+                    try:
+                        values[sampler.actions.index(action_str)] += delta
+                    except ValueError:
+                        del self.samplers[key]
+                        break
+                else:
+                    # New values rather than changing the sampler under its readers.
+                    self.samplers[key] = UpdatedValues(sampler.actions, values, sampler.moves, sampler.mirrored)
+
+    def clear(self):
+        with self.lock:
+            self.stamps = [stamp + 1 for stamp in self.stamps]
+            self.samplers.clear()
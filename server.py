@@ -0,0 +1,991 @@
+"""
+Pawn Wars Flask app for any board size.
+
+app.py (3x3) and 4by4/app.py (4x4) are thin wrappers around create_app();
+the routes, Q-table handling and JSON shapes are shared. GameServer holds
+one board size's state: the engine, the Q-table store (see store.py) with
+its write-behind saver, the live games and the metrics served at /metrics
+(see metrics.py). The bundled templates draw 3x3 and
+4x4 boards; larger boards (PAWN_WARS_SIZE=5 python app.py) serve the same
+JSON API.
+"""
+from flask import Flask, Response, g, request, jsonify, render_template
+import uuid, os, time, json, signal, threading, hmac, ipaddress
+from functools import wraps
+
+from bitboard import get_engine
+import persistence
+from store import DictStore, load_table
+from jobs import JobManager
+from sessions import Session, SessionStore
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, Metrics, timed
+from symmetry import Mirror
+from sampling import AliasSampler, SamplerCache, probabilities
+from qstore import INITIAL_Q
+from zobrist import StateKeys, Zobrist
+from solver import MAX_SQUARES as SOLVER_MAX_SQUARES, solve
+
+Q_TABLE_FILE = "q_table.json"
+# If present, the binary table is memory-mapped instead of parsing the JSON.
+Q_TABLE_BIN = "q_table.bin"
+# Finished games are appended to a journal next to the snapshot. A background
+# thread checks every interval (seconds) whether the journal has grown past
+# Q_JOURNAL_COMPACT_BYTES and, if so, folds it into a new snapshot.
+Q_TABLE_FLUSH_INTERVAL = float(os.environ.get("Q_TABLE_FLUSH_INTERVAL", "5"))
+Q_JOURNAL_COMPACT_BYTES = int(os.environ.get("Q_JOURNAL_COMPACT_BYTES", str(4 * 1024 * 1024)))
+Q_JOURNAL_FSYNC = os.environ.get("Q_JOURNAL_FSYNC", "0") == "1"
+# Q_STORE=shared keeps the table in Q_TABLE_SHARED, mapped by every app
+# process on the machine (for several WSGI workers, see sharedq.py), with
+# room for Q_SHARED_SLOTS (state, action) entries.
+Q_STORE = os.environ.get("Q_STORE", "json")
+Q_TABLE_SHARED = "q_table.shared"
+Q_SHARED_SLOTS = int(os.environ.get("Q_SHARED_SLOTS", str(1 << 20)))
+# Q_STORE=sqlite keeps the table in the SQLite database Q_TABLE_SQLITE and
+# reads it one state at a time (see sqlstore.py).
+Q_TABLE_SQLITE = "q_table.sqlite"
+# Reloading the Q-table (POST /admin/reload, or this signal) loads the
+# snapshot file again, or another .json/.bin file in the working directory,
+# in a background thread and swaps it in without dropping live games.
+Q_RELOAD_SIGNAL = os.environ.get("Q_RELOAD_SIGNAL", "SIGHUP")
+# Live games are dropped when they finish, after SESSION_TTL idle seconds, or
+# least recently used first once there are SESSION_MAX_GAMES of them.
+SESSION_MAX_GAMES = int(os.environ.get("SESSION_MAX_GAMES", "10000"))
+SESSION_TTL = float(os.environ.get("SESSION_TTL", "1800"))
+# States whose sampling tables are cached for choose_action (see sampling.py).
+SAMPLER_CACHE_SIZE = int(os.environ.get("SAMPLER_CACHE_SIZE", "100000"))
+# States whose Zobrist hashes are mapped back to positions (see zobrist.py).
+STATE_KEYS_SIZE = int(os.environ.get("STATE_KEYS_SIZE", "100000"))
+# Largest number of games one /jobs/train request may play (about two
+# minutes of one CPU on 4x4). Only one job runs at a time.
+JOB_MAX_GAMES = int(os.environ.get("JOB_MAX_GAMES", "1000000"))
+# Admin routes (starting and cancelling training jobs, /simulate, reloading the table)
+# need "Authorization: Bearer <ADMIN_TOKEN>" when ADMIN_TOKEN is set, and
+# otherwise only accept requests from the loopback interface. Behind a
+# reverse proxy every request comes from the proxy, so set a token there.
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN", "")
+# Largest number of games one /simulate request may play.
+SIMULATE_MAX_GAMES = int(os.environ.get("SIMULATE_MAX_GAMES", "10000"))
+# Largest number of states one /policy request may query.
+POLICY_MAX_STATES = int(os.environ.get("POLICY_MAX_STATES", "10000"))
+# Routes whose latency is recorded in the /metrics request histogram.
+TIMED_ROUTES = ("/start", "/continue", "/play_drag/start", "/play_drag/move")
+
+
+class GameServer:
+    def __init__(self, width, height):
+        # Move generation and terminal detection run on integer bitboards.
+        self.engine = get_engine(width, height)
+        # Q-table states are stored in mirror-canonical form (see symmetry.py).
+        self.mirror = Mirror(self.engine)
+        # States are identified by incremental Zobrist hashes (see zobrist.py).
+        self.zobrist = Zobrist(self.engine, self.mirror)
+        self.state_keys = StateKeys(self.engine, STATE_KEYS_SIZE)
+        # Exact solution for the "perfect" opponent, solved before any request
+        # arrives (about 0.1 s on 4x4); None on boards too large to solve.
+        self.solution = solve(self.engine) if self.engine.num_squares <= SOLVER_MAX_SQUARES else None
+        self.games = SessionStore(SESSION_MAX_GAMES, SESSION_TTL)  # live games by gameID
+        self.metrics = Metrics()
+        self.store = self.open_store()
+        # Only a table no other process writes can be cached.
+        self.samplers = SamplerCache(SAMPLER_CACHE_SIZE) if self.store.process_local else None
+        self.saver = persistence.WriteBehindSaver(self.save_q_table, interval=Q_TABLE_FLUSH_INTERVAL).start()
+        self.jobs = JobManager(self)  # background training jobs (see jobs.py)
+        self.reload_lock = threading.Lock()
+        self.reload_status = {"status": "idle"}
+        # If set (by the asyncio app), finished games are written to the store
+        # from this executor instead of the request's thread.
+        self.update_executor = None
+
+    # ------------------------------------------------------------------
+    # Q-table persistence
+    # ------------------------------------------------------------------
+    def snapshot_path(self):
+        return Q_TABLE_BIN if os.path.exists(Q_TABLE_BIN) else Q_TABLE_FILE
+
+    def open_store(self):
+        snapshot_path = self.snapshot_path()
+        if Q_STORE == "shared":
+            from sharedq import SharedStore  # POSIX only (fcntl)
+            return SharedStore(Q_TABLE_SHARED, self.engine, snapshot_path, slots=Q_SHARED_SLOTS)
+        if Q_STORE == "sqlite":
+            from sqlstore import SQLiteStore
+            return SQLiteStore(Q_TABLE_SQLITE, self.engine, snapshot_path, fsync=Q_JOURNAL_FSYNC)
+        if Q_STORE != "json":
+            raise ValueError(f"unknown Q_STORE {Q_STORE!r}")
+        return DictStore(self.engine, snapshot_path, Q_JOURNAL_COMPACT_BYTES, fsync=Q_JOURNAL_FSYNC)
+
+    @timed("save_q_table")
+    def save_q_table(self):
+        """
+        Run by the write-behind saver: the JSON store folds its journal into a
+        new snapshot once it passes Q_JOURNAL_COMPACT_BYTES.
+        """
+        self.store.flush()
+
+    def reload_q_table(self, path=None):
+        """
+        Load path (default: the snapshot file) and make it the live table.
+        Parsing, or mapping a .bin file, happens here, off the request
+        threads; the store then swaps the table in at once (store.replace),
+        so a choose_action call sees either the old table or the new one.
+        Reloading the snapshot file itself keeps the games journalled since
+        the last compaction, as a restart would; another file replaces the
+        table outright. A store whose snapshot is older than its table
+        (SQLite) refuses to reload the snapshot (see reload_refusal). Live
+        games continue, and their updates apply to the new table.
+        """
+        path = path or self.snapshot_path()
+        live = os.path.abspath(path) == os.path.abspath(self.snapshot_path())
+        status = {"status": "reloading", "file": path}
+        self.reload_status = status
+        start = time.perf_counter()
+        try:
+            refusal = self.reload_refusal(path)
+            if refusal is not None:
+                raise ValueError(refusal)
+            if not os.path.exists(path):
+                raise FileNotFoundError(f"{path} does not exist")
+            table = load_table(path, self.engine)
+            self.store.replace(table, replay_journal=live)
+            if self.samplers is not None:
+                self.samplers.clear()
+        except Exception as exc:
+            status.update(status="failed", error=f"{type(exc).__name__}: {exc}")
+        else:
+            status.update(status="reloaded", states={player: self.store.state_count(player) for player in ("W", "B")})
+        status["seconds"] = round(time.perf_counter() - start, 3)
+        status["finished"] = time.time()
+        return status
+
+    def reload_refusal(self, path=None):
+        """Why this store cannot reload path (default: the snapshot file), or None if it can."""
+        if not self.store.replaceable:
+            return (f"Q_STORE={Q_STORE} cannot be reloaded in place; stop every worker, delete "
+                    f"{Q_TABLE_SHARED} and start again to import a new table")
+        snapshot = self.snapshot_path()
+        if not self.store.snapshot_complete and os.path.abspath(path or snapshot) == os.path.abspath(snapshot):
+            return (f"Q_STORE={Q_STORE} keeps its updates in {Q_TABLE_SQLITE}, not in {snapshot}; "
+                    f"reloading {snapshot} would drop them. Reload another file, or export "
+                    f"{Q_TABLE_SQLITE} over {snapshot} first (python sqlstore.py to-json)")
+        return None
+
+    def start_reload(self, path=None):
+        """
+        Run reload_q_table in a background thread; returns False if a reload
+        is already running or the store cannot be reloaded (see reload_status).
+        """
+        refusal = self.reload_refusal(path)
+        if refusal is not None:
+            self.reload_status = {"status": "failed", "error": refusal, "finished": time.time()}
+            return False
+        if not self.reload_lock.acquire(blocking=False):
+            return False
+        self.reload_status = {"status": "reloading", "file": path or self.snapshot_path()}
+
+        def run():
+            try:
+                self.reload_q_table(path)
+            finally:
+                self.reload_lock.release()
+        threading.Thread(target=run, name="q-table-reload", daemon=True).start()
+        return True
+
+    def close(self):
+        """Stop training jobs, flush pending work and release the store (the saver also stops at exit)."""
+        self.jobs.close()
+        if self.update_executor is not None:
+            self.update_executor.shutdown(wait=True)
+        self.saver.stop()
+        self.store.close()
+
+    # ------------------------------------------------------------------
+    # Game logic
+    # ------------------------------------------------------------------
+    def initial_board(self):
+        """White pawns on rank 1, Black pawns on the last rank."""
+        return self.engine.to_board(*self.engine.initial_position())
+
+    def get_possible_moves(self, board, player):
+        white, black = self.engine.from_board(board)
+        return self.engine.move_names(self.engine.moves(white, black, player))
+
+    def board_to_state_key(self, board, player):
+        """
+        Create a canonical string representation of the board along with the player.
+        This ensures that states are maintained separately for white and black.
+        """
+        items = sorted(board.items())  # sort by cell name
+        state_repr = ",".join([f"{pos}:{piece}" for pos, piece in items])
+        return player + "|" + state_repr
+
+    def locate(self, player, white, black, hashes=None):
+        """
+        Return (white, black, flipped, key) for player to move: the canonical
+        position, whether it is the mirror image of the given one, and the
+        state's key for the sampler cache and game histories (its Zobrist
+        hash; see zobrist.py). hashes are the position's Zobrist hashes if
+        the caller keeps them up to date, else they are computed.
+        """
+        canonical_white, canonical_black, flipped = self.mirror.canonical(white, black)
+        if hashes is None:
+            hashes = self.zobrist.position(white, black)
+        state_hash = self.zobrist.state_hash(hashes, flipped, player)
+        key = self.state_keys.resolve(state_hash, canonical_white, canonical_black, player)
+        return canonical_white, canonical_black, flipped, key
+
+    def history_entry(self, player, board, action_str, hashes=None):
+        """A (player, key, action_str) game-history entry for board, in canonical orientation."""
+        _, _, flipped, key = self.locate(player, *self.engine.from_board(board), hashes)
+        return player, key, self.mirror.mirror_action(action_str) if flipped else action_str
+
+    @timed("choose_action")
+    def choose_action(self, player, board, game_history, hashes=None):
+        """
+        Sample a move for player from the Q values of the board's state and
+        record (player, state key, action_str) in game_history. Returns
+        (chosen_move, q_actions, q_values): the (src, dst) move or None if
+        there are no moves, and the actions and Q values it was drawn from.
+        hashes are the board's Zobrist hashes, if the caller keeps them.
+        """
+        # Look the state up in its canonical orientation; the chosen move is
+        # mapped back to the real board below.
+        white, black, flipped, key = self.locate(player, *self.engine.from_board(board), hashes)
+        sampler = self.state_sampler(player, white, black, key)
+        if sampler is None:
+            return None, [], []  # no moves available
+        index = sampler.sample()
+        chosen_action_str = sampler.actions[index]
+        chosen_move = sampler.moves[index]
+        # Record this state-action pair in the game's history.
+        game_history.append((player, key, chosen_action_str))
+        actions = sampler.actions
+        if flipped:
+            if chosen_move is not None:
+                chosen_move = self.mirror.mirror_move_names(chosen_move)
+            actions = self.mirrored_actions(sampler)
+        return chosen_move, actions, sampler.values
+
+    def state_sampler(self, player, white, black, key):
+        """
+        The AliasSampler for player's moves in a canonical position with the
+        given key (from locate), from the cache when the store allows it, or
+        None if there are no moves. The state, or moves missing from it, are
+        added at 20.
+        """
+        def load():
+            moves = self.engine.moves(white, black, player)
+            if not moves:
+                return None
+            move_by_action = {move[0] + move[1]: move for move in self.engine.move_names(moves)}
+            state_key = self.state_keys.readable(key) or self.engine.state_key(white, black, player)
+            items = self.store.state_values(player, state_key, list(move_by_action))
+            return ([action_str for action_str, _ in items], [q for _, q in items],
+                    [move_by_action.get(action_str) for action_str, _ in items])
+
+        if self.samplers is None:
+            loaded = load()
+            return AliasSampler(*loaded) if loaded is not None else None
+        return self.samplers.get(key, load)
+
+    def mirrored_actions(self, sampler):
+        if sampler.mirrored is None:
+            sampler.mirrored = [self.mirror.mirror_action(a) for a in sampler.actions]
+        return sampler.mirrored
+
+    def perfect_move(self, board, player):
+        """Best move from the solved game as a (src, dst) pair, or None if there is none."""
+        white, black = self.engine.from_board(board)
+        move = self.solution.best_move(white, black, player)
+        return self.engine.move_names([move])[0] if move else None
+
+    def computer_move(self, opponent, player, board, game_history, hashes=None):
+        """
+        The play-mode computer's move: sampled from the Q-table by default, or
+        perfect play for opponent "perfect" (not recorded in game_history).
+        """
+        if opponent == "perfect":
+            return self.perfect_move(board, player), [], []
+        return self.choose_action(player, board, game_history, hashes)
+
+    def state_q_values(self, board, player, hashes=None):
+        """
+        Return (actions, values) for player's moves on board, with actions in the
+        board's own orientation. An unseen state is added with every move at 20.
+        """
+        white, black, flipped, key = self.locate(player, *self.engine.from_board(board), hashes)
+        sampler = self.state_sampler(player, white, black, key)
+        if sampler is None:
+            return [], []
+        return self.mirrored_actions(sampler) if flipped else sampler.actions, sampler.values
+
+    def query_policy(self, entries):
+        """
+        Legal moves, Q values and sampling probabilities for a batch of
+        states, each a "W|a1:W,..." state key or a {"board": ..., "player": ...}
+        dict. The moves are the ones choose_action would sample from, in
+        the orientation given. States are evaluated once per canonical
+        state, and read from the store in one lookup_values call, which adds
+        nothing to the table: a move without a Q value is reported at 20,
+        the value choose_action would give it, and the state with
+        "seen": false. ValueError names the first entry that is not a valid
+        position.
+        """
+        results = [None] * len(entries)
+        states = {}  # (player, white, black), canonical -> [state key, actions, [(index, flipped), ...]]
+        for index, entry in enumerate(entries):
+            try:
+                white, black, player = self.policy_position(entry)
+            except ValueError as exc:
+                raise ValueError(f"states[{index}]: {exc}") from None
+            white, black, flipped = self.mirror.canonical(white, black)
+            state = states.get((player, white, black))
+            if state is None:
+                actions = [src + dst for src, dst in self.engine.move_names(self.engine.moves(white, black, player))]
+                state = states[player, white, black] = [self.engine.state_key(white, black, player), actions, []]
+            state[2].append((index, flipped))
+        stored = self.store.lookup_values([(player, state_key, actions)
+                                           for (player, _, _), (state_key, actions, _) in states.items()])
+        for ((player, _, _), (state_key, actions, entries_at)), values in zip(states.items(), stored):
+            q_values = [INITIAL_Q if q is None else q for q in values]
+            result = {
+                "player": player,
+                "state_key": state_key,
+                "moves": actions,
+                "qvalues": q_values,
+                "probabilities": probabilities(q_values) if q_values else [],
+                "seen": bool(values) and None not in values,
+            }
+            mirrored = None
+            for index, flipped in entries_at:
+                if flipped:
+                    if mirrored is None:
+                        mirrored = dict(result, moves=[self.mirror.mirror_action(a) for a in actions])
+                    results[index] = mirrored
+                else:
+                    results[index] = result
+        return results
+
+    def policy_position(self, entry):
+        """(white, black, player) of a /policy state; ValueError if it is not a valid position."""
+        squares = self.engine.square_index
+        if isinstance(entry, str):
+            player, _, cells = entry.partition("|")
+            board = {}
+            for cell in cells.split(",") if cells else []:
+                square, _, piece = cell.partition(":")
+                if square in board:
+                    raise ValueError(f"square {square!r} appears more than once")
+                board[square] = piece
+        elif isinstance(entry, dict):
+            board, player = entry.get("board"), entry.get("player")
+            if not isinstance(board, dict):
+                raise ValueError("board must be an object such as {\"a1\": \"W\"}")
+        else:
+            raise ValueError("a state must be a state key or an object with board and player")
+        if player not in ("W", "B"):
+            raise ValueError("player must be \"W\" or \"B\"")
+        for square, piece in board.items():
+            if square not in squares or piece not in ("W", "B"):
+                raise ValueError(f"invalid square or piece {square!r}: {piece!r}")
+        for side in ("W", "B"):
+            # Pawns are never added, so each side has at most one per file.
+            if sum(piece == side for piece in board.values()) > self.engine.width:
+                raise ValueError(f"{side} has more than {self.engine.width} pawns")
+        return (*self.engine.from_board(board), player)
+
+    @timed("check_game_over", every=64)
+    def check_game_over(self, board, current_player):
+        """
+        Game is over if:
+          - A pawn reaches the opponent's rank (for white: the last rank, for black: rank 1)
+          - The current player has no moves
+        Returns a tuple: (True/False, winner) where winner is "W" or "B" if game over.
+        """
+        white, black = self.engine.from_board(board)
+        return self.engine.game_over(white, black, current_player)
+
+    def update_q_values(self, game_history, winner):
+        """
+        For every state-action encountered during the game, update its Q value:
+          +1 if the move was made by the winner, -1 if by the loser.
+        The store applies them as one batch (one journal record with the JSON store).
+        """
+        updates = []
+        keys = {}  # (player, readable state key) -> state key
+        for player, key, action_str in game_history:
+            if isinstance(key, str):
+                # A readable key recorded by other code, in either orientation.
+                state_key, action_str = self.mirror.canonical_entry(key, action_str)
+                white, black, _ = self.engine.position_from_key(state_key)
+                key = self.locate(player, white, black)[3]
+            state_key = self.state_keys.readable(key)
+            if state_key is None:
+                continue  # forgotten while the game sat idle (see zobrist.py)
+            keys[player, state_key] = key
+            updates.append((player, state_key, action_str, 1 if player == winner else -1))
+        if self.update_executor is not None:
+            self.update_executor.submit(self.apply_updates, updates, keys)
+        else:
+            self.apply_updates(updates, keys)
+
+    def apply_updates(self, updates, keys):
+        """
+        Add a finished game's updates to the store (and its journal), then
+        the same deltas to the cached samplers of their states.
+        """
+        applied = self.store.add(updates)
+        if self.samplers is not None:
+            changes = {}
+            for player, state_key, action_str, delta in applied:
+                deltas = changes.setdefault(keys[player, state_key], {})
+                deltas[action_str] = deltas.get(action_str, 0) + delta
+            self.samplers.update(changes)
+        self.saver.mark_dirty()  # lets the background thread flush the store
+        self.metrics.games_finished.mark()
+
+    def merge_deltas(self, deltas):
+        """
+        Add a training job's {(player, state_key, action_str): delta} into the
+        live table as one batch. Entries the job discovered start at 20.
+        Returns the number of entries updated.
+        """
+        actions_by_state = {}
+        for player, state_key, action_str in deltas:
+            actions_by_state.setdefault((player, state_key), []).append(action_str)
+        for (player, state_key), actions in actions_by_state.items():
+            self.store.state_values(player, state_key, actions)
+        applied = self.store.add([(player, state_key, action_str, delta)
+                                  for (player, state_key, action_str), delta in deltas.items() if delta])
+        if self.samplers is not None:
+            self.samplers.clear()
+        self.saver.mark_dirty()
+        return len(applied)
+
+    def play_game(self, moves=True):
+        """
+        Play one AI-vs-AI game server-side, as /start and /continue do, and
+        learn from it. With moves, yields one /continue-shaped dict per move
+        (the last has "message": "Game Over" and the game's "moves" count);
+        otherwise yields only the last.
+        """
+        board = self.initial_board()
+        hashes = self.zobrist.position(*self.engine.initial_position())
+        history = []
+        player = "W"
+        num_moves = 0
+        while True:
+            move, _, _ = self.choose_action(player, board, history, hashes)
+            next_player = "B" if player == "W" else "W"
+            event = {"player": "white" if player == "W" else "black", "from": None, "to": None}
+            if move is None:
+                # No moves available – the player to move loses.
+                over, winner = True, next_player
+            else:
+                src, dst = move
+                event["from"], event["to"] = src, dst
+                num_moves += 1
+                hashes = self.zobrist.move(hashes, player, src, dst, dst in board)
+                board.pop(dst, None)
+                board[dst] = player
+                del board[src]
+                over, winner = self.check_game_over(board, next_player)
+            if over:
+                self.update_q_values(history, winner)
+                event.update({"message": "Game Over", "winner": "white" if winner == "W" else "black",
+                              "qvalues": {"actions": [], "values": []}, "moves": num_moves})
+                yield event
+                return
+            if moves:
+                q_actions, q_values = self.state_q_values(board, next_player, hashes)
+                event["qvalues"] = {"actions": q_actions, "values": q_values}
+                yield event
+            player = next_player
+
+    # ------------------------------------------------------------------
+    # Route handlers: request JSON in, response JSON out, shared by the
+    # Flask app below and the asyncio app (asgi_app.py)
+    # ------------------------------------------------------------------
+    def start_game(self, data):
+        """/start: a new AI-vs-AI game and White's first move."""
+        gameID = data.get("gameID", str(uuid.uuid4()))
+        board = self.initial_board()
+        # Set up the game state with white's turn and an empty history.
+        initial = self.engine.initial_position()
+        game = Session(*initial, "W", hashes=self.zobrist.position(*initial))
+        current_player = "W"
+        move, _, _ = self.choose_action(current_player, board, game.history, game.hashes)
+        if move is None:
+            # No moves available—white loses immediately.
+            self.update_q_values(game.history, "B")
+            response = {
+                "message": "Game Over",
+                "winner": "black",
+                "gameID": gameID,
+                "player": "white",
+                "from": None,
+                "to": None,
+                "qvalues": {"actions": [], "values": []}
+            }
+            return response
+        src, dst = move
+        # Execute white's move.
+        game.hashes = self.zobrist.move(game.hashes, "W", src, dst, dst in board)
+        if dst in board:
+            del board[dst]
+        board[dst] = "W"
+        del board[src]
+        # Check if game is over after white's move.
+        over, winner = self.check_game_over(board, "B")
+        if over:
+            self.update_q_values(game.history, winner)
+            response = {
+                "message": "Game Over",
+                "winner": "white" if winner=="W" else "black",
+                "gameID": gameID,
+                "player": "white",
+                "from": src,
+                "to": dst,
+                "qvalues": {"actions": [], "values": []}
+            }
+            return response
+        # Prepare Q values for black's next moves.
+        next_player = "B"
+        q_actions, q_values = self.state_q_values(board, next_player, game.hashes)
+        game.white, game.black = self.engine.from_board(board)
+        game.turn = next_player
+        self.games.put(gameID, game)
+        response = {
+            "player": "white",
+            "from": src,
+            "to": dst,
+            "qvalues": {"actions": q_actions, "values": q_values},
+            "gameID": gameID
+        }
+        return response
+
+    def continue_game(self, data):
+        """/continue: the next move of an AI-vs-AI game."""
+        gameID = data.get("gameID")
+        game = self.games.get(gameID)
+        if game is None:
+            return {"error": "Invalid gameID"}
+        board = self.engine.to_board(game.white, game.black)
+        current_player = game.turn
+        move, _, _ = self.choose_action(current_player, board, game.history, game.hashes)
+        if move is None:
+            # No moves available – current player loses.
+            winner = "B" if current_player == "W" else "W"
+            self.update_q_values(game.history, winner)
+            self.games.release(gameID)
+            response = {
+                "message": "Game Over",
+                "winner": "white" if winner=="W" else "black",
+                "gameID": gameID,
+                "player": "white" if current_player=="W" else "black",
+                "from": None,
+                "to": None,
+                "qvalues": {"actions": [], "values": []}
+            }
+            return response
+        src, dst = move
+        # Execute the move.
+        if game.hashes is not None:
+            game.hashes = self.zobrist.move(game.hashes, current_player, src, dst, dst in board)
+        if dst in board:
+            del board[dst]
+        board[dst] = current_player
+        del board[src]
+        # Check if the game is over after this move.
+        next_player = "B" if current_player=="W" else "W"
+        over, winner = self.check_game_over(board, next_player)
+        if over:
+            self.update_q_values(game.history, winner)
+            self.games.release(gameID)
+            response = {
+                "message": "Game Over",
+                "winner": "white" if winner=="W" else "black",
+                "gameID": gameID,
+                "player": "white" if current_player=="W" else "black",
+                "from": src,
+                "to": dst,
+                "qvalues": {"actions": [], "values": []}
+            }
+            return response
+        # Prepare Q values for the next player's moves.
+        q_actions, q_values = self.state_q_values(board, next_player, game.hashes)
+        game.white, game.black = self.engine.from_board(board)
+        game.turn = next_player
+        response = {
+            "player": "white" if current_player=="W" else "black",
+            "from": src,
+            "to": dst,
+            "qvalues": {"actions": q_actions, "values": q_values},
+            "gameID": gameID
+        }
+        return response
+
+    def play_drag_start(self, data):
+        """/play_drag/start: a new game against a human (the computer moves first if they play Black)."""
+        player_side = data.get("player_side", "W")  # "W" or "B"
+        opponent = data.get("opponent", "q")  # "q" (Q-table) or "perfect"
+        if opponent == "perfect" and self.solution is None:
+            return {"error": f"Perfect play is only available on boards of at most {SOLVER_MAX_SQUARES} squares"}
+        gameID = str(uuid.uuid4())
+        board = self.initial_board()
+        # Set up the game: if the user chooses White, human goes first;
+        # if Black, computer makes the first move.
+        history = []
+        hashes = self.zobrist.position(*self.engine.initial_position())
+        if player_side == "W":
+            turn = "W"
+            message = "Game started. Your move."
+            response = {
+                "gameID": gameID,
+                "board": board,
+                "turn": turn,
+                "message": message
+            }
+        else:
+            # If playing as Black, computer plays as White first.
+            comp_move, comp_q_actions, comp_q_values = self.computer_move(opponent, "W", board, history, hashes)
+            if comp_move:
+                src, dst = comp_move
+                hashes = self.zobrist.move(hashes, "W", src, dst, dst in board)
+                if dst in board:
+                    del board[dst]
+                board[dst] = "W"
+                del board[src]
+                history.append(self.history_entry("W", board, src+dst, hashes))
+                turn = "B"
+                message = f"Computer played {src+dst}. Your move as Black."
+                response = {
+                    "gameID": gameID,
+                    "board": board,
+                    "turn": turn,
+                    "message": message,
+                    "computer_qvalues": {"actions": comp_q_actions, "values": comp_q_values}
+                }
+            else:
+                turn = "B"
+                message = "Game Over"
+                response = {
+                    "gameID": gameID,
+                    "board": board,
+                    "turn": turn,
+                    "message": message
+                }
+        if message != "Game Over":
+            white, black = self.engine.from_board(board)
+            self.games.put(gameID, Session(white, black, turn, history, player_side, opponent, hashes))
+        return response
+
+    def play_drag_move(self, data):
+        """/play_drag/move: the human's move and the computer's reply."""
+        gameID = data.get("gameID")
+        human_from = data.get("from")
+        human_to = data.get("to")
+        game = self.games.get(gameID)
+        if game is None:
+            return {"error": "Invalid gameID"}
+        board = self.engine.to_board(game.white, game.black)
+        player_side = game.player_side or "W"
+        # Determine human and computer sides.
+        human_player = player_side
+        computer_player = "B" if player_side == "W" else "W"
+        if game.turn != human_player:
+            return {"error": "Not your turn."}
+        valid_moves = self.get_possible_moves(board, human_player)
+        if (human_from, human_to) not in valid_moves:
+            return {"error": "Invalid move", "valid_moves": [m[0]+m[1] for m in valid_moves]}
+        hashes = game.hashes or self.zobrist.position(game.white, game.black)
+        hashes = self.zobrist.move(hashes, human_player, human_from, human_to, human_to in board)
+        if human_to in board:
+            del board[human_to]
+        board[human_to] = human_player
+        del board[human_from]
+        game.history.append(self.history_entry(human_player, board, human_from+human_to, hashes))
+        over, winner = self.check_game_over(board, computer_player)
+        if over:
+            self.update_q_values(game.history, winner)
+            self.games.release(gameID)
+            return {
+                  "message": "Game Over",
+                  "winner": "white" if winner=="W" else "black",
+                  "board": board,
+                  "human_move": human_from+human_to,
+                  "computer_move": None,
+                  "turn": None
+            }
+        # Computer's turn.
+        comp_move, comp_q_actions, comp_q_values = self.computer_move(
+            game.opponent, computer_player, board, game.history, hashes)
+        if comp_move is None:
+            winner = human_player
+            self.update_q_values(game.history, winner)
+            self.games.release(gameID)
+            return {
+                  "message": "Game Over",
+                  "winner": "white" if winner=="W" else "black",
+                  "board": board,
+                  "human_move": human_from+human_to,
+                  "computer_move": None,
+                  "turn": None
+            }
+        comp_from, comp_to = comp_move
+        hashes = self.zobrist.move(hashes, computer_player, comp_from, comp_to, comp_to in board)
+        if comp_to in board:
+            del board[comp_to]
+        board[comp_to] = computer_player
+        del board[comp_from]
+        game.history.append(self.history_entry(computer_player, board, comp_from+comp_to, hashes))
+        over, winner = self.check_game_over(board, human_player)
+        if over:
+            self.update_q_values(game.history, winner)
+            self.games.release(gameID)
+            message = "Game Over"
+            turn = None
+        else:
+            message = "Your move."
+            game.white, game.black = self.engine.from_board(board)
+            game.hashes = hashes
+            game.turn = human_player
+            turn = human_player
+        valid_moves = self.get_possible_moves(board, human_player)
+        return {
+             "message": message,
+             "board": board,
+             "human_move": human_from+human_to,
+             "computer_move": comp_from+comp_to,
+             "computer_qvalues": {"actions": comp_q_actions, "values": comp_q_values},
+             "possible_moves": [m[0]+m[1] for m in valid_moves],
+             "turn": turn,
+             "winner": "white" if over and winner=="W" else "black" if over else None
+        }
+
+    # Routes that can fail with an HTTP status return (response, status).
+    def authorize_admin(self, authorization, client_host):
+        """
+        None if an admin request with this Authorization header from
+        client_host may go ahead, else the (response, status) refusing it.
+        """
+        if ADMIN_TOKEN:
+            scheme, _, token = (authorization or "").partition(" ")
+            if scheme.lower() != "bearer" or not hmac.compare_digest(token.strip().encode(), ADMIN_TOKEN.encode()):
+                return {"error": "Admin routes need an Authorization: Bearer <ADMIN_TOKEN> header"}, 401
+            return None
+        try:
+            local = client_host is not None and ipaddress.ip_address(client_host).is_loopback
+        except ValueError:
+            local = False
+        if not local:
+            return {"error": "Admin routes only accept local requests unless ADMIN_TOKEN is set"}, 403
+        return None
+
+    def policy(self, data):
+        """POST /policy: query_policy for data["states"]."""
+        entries = data.get("states")
+        if not isinstance(entries, list):
+            return {"error": "states must be a list of state keys or {board, player} objects"}, 400
+        if len(entries) > POLICY_MAX_STATES:
+            return {"error": f"at most {POLICY_MAX_STATES} states per request"}, 400
+        try:
+            return {"results": self.query_policy(entries)}, 200
+        except ValueError as exc:
+            return {"error": str(exc)}, 400
+
+    def admin_reload(self, data):
+        """POST /admin/reload: start reloading the snapshot, or the table file data["file"]."""
+        path = data.get("file")
+        # Only table files next to the snapshot, by name.
+        if path is not None and (not isinstance(path, str) or os.path.basename(path) != path
+                                 or not path.endswith((".json", ".bin"))):
+            return {"error": "file must be a .json or .bin file name in the working directory"}, 400
+        refusal = self.reload_refusal(path)
+        if refusal is not None:
+            return {"error": refusal}, 409
+        if not self.start_reload(path):
+            return {"error": "A reload is already running"}, 409
+        return self.reload_status, 202
+
+    def start_training_job(self, data):
+        """POST /jobs/train: start a background training job (see jobs.py)."""
+        try:
+            num_games = int(data.get("games", 10000))
+            seed = None if data.get("seed") is None else int(data["seed"])
+        except (TypeError, ValueError):
+            return {"error": "games and seed must be integers"}, 400
+        if not 1 <= num_games <= JOB_MAX_GAMES:
+            return {"error": f"games must be between 1 and {JOB_MAX_GAMES}"}, 400
+        job = self.jobs.start(num_games, seed)
+        if job is None:
+            return {"error": "A training job is already running",
+                    "running": [running.job_id for running in self.jobs.running()]}, 409
+        return job.to_json(), 202
+
+    def training_job(self, job_id, cancel=False):
+        """GET /jobs/<jobID>, or POST /jobs/<jobID>/cancel with cancel."""
+        job = self.jobs.cancel(job_id) if cancel else self.jobs.get(job_id)
+        if job is None:
+            return {"error": "Invalid jobID"}, 404
+        return job.to_json(), 200
+
+    def simulate_options(self, options):
+        """(num_games, moves, stream_format) from /simulate's options; ValueError if they are invalid."""
+        try:
+            num_games = int(options.get("games", 1))
+        except (TypeError, ValueError):
+            raise ValueError("games must be an integer") from None
+        if not 1 <= num_games <= SIMULATE_MAX_GAMES:
+            raise ValueError(f"games must be between 1 and {SIMULATE_MAX_GAMES}")
+        moves = options.get("moves", True)
+        if isinstance(moves, str):
+            moves = moves.lower() not in ("0", "false", "no")
+        stream_format = options.get("format", "ndjson")
+        if stream_format not in ("ndjson", "sse"):
+            raise ValueError("format must be ndjson or sse")
+        return num_games, moves, stream_format
+
+    def simulate_stream(self, num_games, moves, stream_format):
+        """/simulate's response body: one encoded line (or SSE event) per event."""
+        def encode(event):
+            line = json.dumps(event, separators=(",", ":"))
+            return f"data: {line}\n\n" if stream_format == "sse" else line + "\n"
+
+        start = time.perf_counter()
+        wins = {"white": 0, "black": 0}
+        total_moves = 0
+        for game_index in range(num_games):
+            for event in self.play_game(moves):
+                event["game"] = game_index
+                if moves:
+                    yield encode(event)
+            # event is the game's final one.
+            total_moves += event["moves"]
+            wins[event["winner"]] += 1
+            if not moves:
+                yield encode({"game": game_index, "winner": event["winner"], "moves": event["moves"]})
+        elapsed = time.perf_counter() - start
+        yield encode({"message": "Done", "games": num_games, "white_wins": wins["white"],
+                      "black_wins": wins["black"], "moves_per_game": round(total_moves / num_games, 2),
+                      "seconds": round(elapsed, 3),
+                      "games_per_second": round(num_games / elapsed, 1) if elapsed else None})
+
+
+def create_app(width, height, template_folder="templates", static_folder="static"):
+    """Build the Flask app for a width x height board. Folders are relative to this file."""
+    app = Flask(__name__, template_folder=template_folder, static_folder=static_folder)
+    server = app.pawn_wars = GameServer(width, height)
+    reload_signal = getattr(signal, Q_RELOAD_SIGNAL, None)
+    # Only if nobody else (a WSGI server, another app in this process) handles the signal.
+    if (reload_signal is not None and threading.current_thread() is threading.main_thread()
+            and signal.getsignal(reload_signal) is signal.SIG_DFL):
+        signal.signal(reload_signal, lambda signum, frame: server.start_reload())
+
+    def admin_only(view):
+        """Refuse the view unless server.authorize_admin accepts the request."""
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            refusal = server.authorize_admin(request.headers.get("Authorization"), request.remote_addr)
+            if refusal is not None:
+                response, status = refusal
+                return jsonify(response), status
+            return view(*args, **kwargs)
+        return wrapper
+
+    @app.before_request
+    def start_timer():
+        g.request_start = time.perf_counter()
+
+    @app.teardown_request
+    def record_latency(exc):
+        rule = request.url_rule
+        if rule is not None and rule.rule in TIMED_ROUTES and "request_start" in g:
+            server.metrics.requests.observe(rule.rule, time.perf_counter() - g.request_start)
+
+    @app.route('/metrics')
+    def metrics():
+        return Response(server.metrics.render(server), content_type=METRICS_CONTENT_TYPE)
+
+    @app.route('/start', methods=['POST'])
+    def start():
+        return jsonify(server.start_game(request.get_json()))
+
+    @app.route('/continue', methods=['POST'])
+    def continue_game():
+        return jsonify(server.continue_game(request.get_json()))
+
+    @app.route('/policy', methods=['POST'])
+    def policy():
+        response, status = server.policy(request.get_json(silent=True) or {})
+        return jsonify(response), status
+
+    @app.route('/admin/reload', methods=['POST'])
+    @admin_only
+    def reload_q_table():
+        response, status = server.admin_reload(request.get_json(silent=True) or {})
+        return jsonify(response), status
+
+    @app.route('/admin/reload')
+    def reload_status():
+        return jsonify(server.reload_status)
+
+    @app.route('/jobs/train', methods=['POST'])
+    @admin_only
+    def start_training_job():
+        response, status = server.start_training_job(request.get_json(silent=True) or {})
+        return jsonify(response), status
+
+    @app.route('/jobs')
+    def list_training_jobs():
+        return jsonify({"jobs": [job.to_json() for job in list(server.jobs.jobs.values())]})
+
+    @app.route('/jobs/<job_id>')
+    def training_job_status(job_id):
+        response, status = server.training_job(job_id)
+        return jsonify(response), status
+
+    @app.route('/jobs/<job_id>/cancel', methods=['POST'])
+    @admin_only
+    def cancel_training_job(job_id):
+        response, status = server.training_job(job_id, cancel=True)
+        return jsonify(response), status
+
+    @app.route('/simulate', methods=['POST'])
+    @admin_only
+    def simulate():
+        """
+        Play whole games server-side and stream them from one response.
+        The games update the live Q-table, so this is an admin route.
+        Options (JSON body):
+          games   number of games (default 1, at most SIMULATE_MAX_GAMES)
+          moves   stream every move with its Q values (default true); false
+                  streams one result per game, for bulk training
+          format  "ndjson" (default) or "sse"
+        Each event carries "game" (0-based); the last one is a summary with
+        "message": "Done".
+        """
+        try:
+            num_games, moves, stream_format = server.simulate_options(request.get_json(silent=True) or {})
+        except ValueError as exc:
+            return jsonify({"error": str(exc)}), 400
+        mimetype = "text/event-stream" if stream_format == "sse" else "application/x-ndjson"
+        return Response(server.simulate_stream(num_games, moves, stream_format), mimetype=mimetype,
+                        headers={"Cache-Control": "no-cache"})
+
+    @app.route('/')
+    def index():
+        return render_template('index.html')
+
+    @app.route('/play_drag/start', methods=['POST'])
+    def play_drag_start():
+        return jsonify(server.play_drag_start(request.get_json()))
+
+    @app.route('/play_drag/move', methods=['POST'])
+    def play_drag_move():
+        return jsonify(server.play_drag_move(request.get_json()))
+
+    @app.route('/play')
+    def play_drag():
+        return render_template('play.html')
+
+    return app
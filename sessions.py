@@ -0,0 +1,91 @@
+"""
+Bounded store for the apps' live games.
+
+Every /start and /play_drag/start creates a game, and a client that walks
+away never tells the server. SessionStore keeps the live games in an
+OrderedDict in least-recently-used order and drops them:
+
+  - when a game finishes (the routes call release()),
+  - after `ttl` seconds without a request (checked on access and on every
+    new game, oldest first, so the cost is amortized O(1)),
+  - when a new game would exceed `max_entries` (the least recently used
+    game goes).
+
+Sessions hold the position as two bitboard ints instead of a dict of
+square names, and use __slots__, so an idle game costs a few hundred
+bytes plus its move history.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+
+class Session:
+    __slots__ = ("white", "black", "hashes", "turn", "history", "player_side", "opponent", "last_seen")
+
+    def __init__(self, white, black, turn, history=None, player_side=None, opponent="q", hashes=None):
+        self.white = white
+        self.black = black
+        self.hashes = hashes  # Zobrist hashes of the position, kept up to date move by move (see zobrist.py)
+        self.turn = turn
+        self.history = history if history is not None else []
+        self.player_side = player_side  # the human's side in play mode, None for training games
+        self.opponent = opponent
+        self.last_seen = 0.0
+
+
+class SessionStore:
+    def __init__(self, max_entries=10000, ttl=1800.0, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.clock = clock
+        self.sessions = OrderedDict()
+        self.lock = threading.Lock()
+        self.evictions = {"ttl": 0, "capacity": 0}
+        self.released = 0
+
+    def __len__(self):
+        return len(self.sessions)
+
+    def get(self, game_id):
+        """The live session for game_id, or None. Marks it as recently used."""
+        now = self.clock()
+        with self.lock:
+            session = self.sessions.get(game_id)
+            if session is None:
+                return None
+            if now - session.last_seen > self.ttl:
+                del self.sessions[game_id]
+                self.evictions["ttl"] += 1
+                return None
+            session.last_seen = now
+            self.sessions.move_to_end(game_id)
+            return session
+
+    def put(self, game_id, session):
+        now = self.clock()
+        session.last_seen = now
+        with self.lock:
+            self._expire(now)
+            if game_id in self.sessions:
+                self.sessions.move_to_end(game_id)
+            else:
+                while len(self.sessions) >= self.max_entries:
+                    self.sessions.popitem(last=False)
+                    self.evictions["capacity"] += 1
+            self.sessions[game_id] = session
+
+    def release(self, game_id):
+        """Drop a finished game."""
+        with self.lock:
+            if self.sessions.pop(game_id, None) is not None:
+                self.released += 1
+
+    def _expire(self, now):
+        sessions = self.sessions
+        while sessions:
+            game_id, session = next(iter(sessions.items()))
+            if now - session.last_seen <= self.ttl:
+                break
+            del sessions[game_id]
+            self.evictions["ttl"] += 1
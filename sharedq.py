@@ -0,0 +1,289 @@
+"""
+Q-table shared by every app process on one machine (Q_STORE=shared).
+
+Several WSGI worker processes each loading q_table.json would learn
+separately and overwrite each other's saves. SharedStore instead maps one
+file, q_table.shared, into every worker (mmap MAP_SHARED), so an update by
+one worker is seen by all of them at once and the kernel writes the pages
+back to disk. A file mapping is used rather than a
+multiprocessing.shared_memory block because WSGI workers are usually not
+children of one Python parent that could hand the block around; any
+process that opens the file joins.
+
+Layout (native little-endian):
+
+  header    magic b"PWQS", version u32, width u16, height u16, reserved u32
+            counters int64[4]: capacity, entries, W states, B states
+  keys      int64[capacity]   0 = empty slot, else entry key + 1
+  values    int32[capacity]   Q values
+
+The entry key is (state code * 2 + player) * squares^2 + action code, with
+state and action codes as in qstore.py. Slots form an open-addressing hash
+table with linear probing.
+
+Concurrency, within and across processes, uses POSIX byte-range locks on
+the file (fcntl.lockf). Record locks belong to a process, not a thread, so
+each process also holds one thread lock while it holds or waits for a
+range; otherwise two threads could each wait on another process and the
+kernel would report a false deadlock:
+
+  - reads take no lock: an entry's value is written before its key, so a
+    reader that finds the key sees a valid value,
+  - inserting new entries holds the insert lock,
+  - each +1/-1 update is a read-modify-write under one of 64 stripe locks
+    picked by slot, so concurrent updates are never lost; updates from
+    different processes only wait for each other on the same stripe.
+
+The first process to open a missing file imports the JSON or binary
+snapshot, together with any journal left by a single-process run (see
+journal.py). It then writes a snapshot that includes the journal and
+retires the journal. close() writes the table back to that snapshot, so
+q_table.json stays readable by the trainers. While q_table.shared exists
+it is the authoritative table: stop every worker and delete it to import
+q_table.json again.
+
+  python sharedq.py to-json q_table.shared q_table.json
+"""
+import argparse
+import fcntl
+import mmap
+import os
+import struct
+import sys
+import threading
+
+from bitboard import get_engine
+from qstore import CompactQTable, INITIAL_Q, PLAYERS
+from store import import_snapshot, write_table
+
+MAGIC = b"PWQS"
+VERSION = 1
+HEADER = struct.Struct("<4sIHHI")
+COUNTERS_OFFSET = 16
+CAPACITY, ENTRIES, W_STATES, B_STATES = range(4)
+DATA_OFFSET = 64
+# Byte offsets used only as lock ranges.
+INIT_LOCK, INSERT_LOCK, EXPORT_LOCK, STRIPE_LOCKS = 0, 1, 2, 8
+STRIPES = 64
+MAX_LOAD = 0.9
+
+if sys.byteorder != "little":
+    raise ImportError("sharedq stores native little-endian arrays")
+
+
+class FileLock:
+    """A byte of a file locked with fcntl.lockf, under the process's thread lock."""
+
+    def __init__(self, fd, offset, thread_lock):
+        self.fd = fd
+        self.offset = offset
+        self.thread_lock = thread_lock
+
+    def __enter__(self):
+        self.thread_lock.acquire()
+        fcntl.lockf(self.fd, fcntl.LOCK_EX, 1, self.offset)
+
+    def __exit__(self, *exc):
+        fcntl.lockf(self.fd, fcntl.LOCK_UN, 1, self.offset)
+        self.thread_lock.release()
+
+
+class SharedStore:
+    process_local = False
+    # Other processes read the mapped slots without locks, so the table
+    # cannot be rebuilt under them: there is no replace(), and the server
+    # refuses to reload.
+    replaceable = False
+    snapshot_complete = False  # close() writes it back; until then the mapped file is newer
+
+    def __init__(self, path, engine, snapshot_path, slots=1 << 20):
+        self.path = path
+        self.engine = engine
+        self.snapshot_path = snapshot_path
+        self.codec = CompactQTable(engine)
+        self.n2 = engine.num_squares ** 2
+        if 3 ** engine.num_squares * 2 * self.n2 >= 2 ** 63:
+            raise ValueError("shared Q-table supports boards of at most 33 squares")
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o666)
+        thread_lock = threading.Lock()
+        self.insert_lock = FileLock(self.fd, INSERT_LOCK, thread_lock)
+        self.export_lock = FileLock(self.fd, EXPORT_LOCK, thread_lock)
+        self.stripes = [FileLock(self.fd, STRIPE_LOCKS + i, thread_lock) for i in range(STRIPES)]
+        with FileLock(self.fd, INIT_LOCK, thread_lock):
+            if os.fstat(self.fd).st_size == 0:
+                self.create(slots)
+            else:
+                self.map()
+
+    # ------------------------------------------------------------------
+    # File
+    # ------------------------------------------------------------------
+    def map(self):
+        self.mm = mmap.mmap(self.fd, 0)
+        magic, version, width, height, _ = HEADER.unpack_from(self.mm, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{self.path} is not a version {VERSION} shared Q-table")
+        if (width, height) != (self.engine.width, self.engine.height):
+            raise ValueError(f"{self.path} holds a {width}x{height} table, "
+                             f"expected {self.engine.width}x{self.engine.height}")
+        view = memoryview(self.mm)
+        self.counters = view[COUNTERS_OFFSET:COUNTERS_OFFSET + 32].cast("q")
+        capacity = self.capacity = self.counters[CAPACITY]
+        self.mask = capacity - 1
+        self.shift = 64 - capacity.bit_length() + 1
+        self.keys = view[DATA_OFFSET:DATA_OFFSET + 8 * capacity].cast("q")
+        self.values = view[DATA_OFFSET + 8 * capacity:DATA_OFFSET + 12 * capacity].cast("i")
+
+    def create(self, slots):
+        """Import the snapshot and its journal into a new file. Runs under the init lock."""
+        table = import_snapshot(self.snapshot_path, self.engine)
+        entries = sum(len(state_q) for states in table.values() for _, state_q in states.items())
+        capacity = 1 << max(slots - 1, int(entries / MAX_LOAD * 2)).bit_length()
+        os.ftruncate(self.fd, DATA_OFFSET + 12 * capacity)
+        # Written through the fd: closing a temporary mapping would close its
+        # duplicate of the fd, and that drops every lockf lock this process holds.
+        os.pwrite(self.fd, HEADER.pack(MAGIC, VERSION, self.engine.width, self.engine.height, 0), 0)
+        os.pwrite(self.fd, struct.pack("<4q", capacity, 0, 0, 0), COUNTERS_OFFSET)
+        self.map()
+        for player in PLAYERS:
+            for state_key, state_q in table[player].items():
+                base = self.state_base(player, state_key)
+                # No other process can map the file until the init lock is released.
+                self.insert_unlocked([(base + self.action_code(action_str), value)
+                                      for action_str, value in state_q.items()], player)
+
+    def flush(self):
+        """Ask the kernel to write the mapped pages back now."""
+        self.mm.flush()
+
+    def close(self):
+        """Write the table back to the snapshot and unmap the file."""
+        if self.fd is None:
+            return
+        with self.export_lock:
+            write_table(self.snapshot_path, self.snapshot(), self.engine)
+        self.mm.flush()
+        self.keys.release()
+        self.values.release()
+        self.counters.release()
+        self.mm.close()
+        os.close(self.fd)
+        self.fd = None
+
+    # ------------------------------------------------------------------
+    # Keys and slots
+    # ------------------------------------------------------------------
+    def state_base(self, player, state_key):
+        white, black, _ = self.engine.position_from_key(state_key)
+        return (self.codec.state_code(white, black) * 2 + (player == "B")) * self.n2
+
+    def action_code(self, action_str):
+        src, dst = self.engine.parse_action(action_str)
+        return src * self.engine.num_squares + dst
+
+    def find(self, key):
+        """Return the slot holding key, or the empty slot where it would go, as (slot, found)."""
+        stored = key + 1
+        keys = self.keys
+        mask = self.mask
+        slot = (stored * 0x9E3779B97F4A7C15 & 0xFFFFFFFFFFFFFFFF) >> self.shift & mask
+        while True:
+            current = keys[slot]
+            if current == stored:
+                return slot, True
+            if current == 0:
+                return slot, False
+            slot = (slot + 1) & mask
+
+    def insert(self, entries, player):
+        """Add (key, value) entries that are missing; count the state if it is new."""
+        with self.insert_lock:
+            self.insert_unlocked(entries, player)
+
+    def insert_unlocked(self, entries, player):
+        counters = self.counters
+        new_state = True
+        for key, value in entries:
+            slot, found = self.find(key)
+            if found:
+                new_state = False
+                continue
+            if counters[ENTRIES] + 1 > self.capacity * MAX_LOAD:
+                raise RuntimeError(f"{self.path} is full; export it, delete it and "
+                                   f"restart with a larger Q_SHARED_SLOTS")
+            self.values[slot] = value
+            self.keys[slot] = key + 1  # published after its value
+            counters[ENTRIES] += 1
+        if new_state and entries:
+            counters[W_STATES if player == "W" else B_STATES] += 1
+
+    # ------------------------------------------------------------------
+    # Store interface (see store.py)
+    # ------------------------------------------------------------------
+    def state_values(self, player, state_key, actions):
+        base = self.state_base(player, state_key)
+        keys = [base + self.action_code(action_str) for action_str in actions]
+        slots = [self.find(key) for key in keys]
+        if not all(found for _, found in slots):
+            self.insert([(key, INITIAL_Q) for key in keys], player)
+            slots = [self.find(key) for key in keys]
+        values = self.values
+        return [(action_str, values[slot]) for action_str, (slot, _) in zip(actions, slots)]
+
+    def lookup_values(self, queries):
+        values = self.values
+        results = []
+        for player, state_key, actions in queries:
+            base = self.state_base(player, state_key)
+            slots = [self.find(base + self.action_code(action_str)) for action_str in actions]
+            results.append([values[slot] if found else None for slot, found in slots])
+        return results
+
+    def add(self, updates):
+        values = self.values
+        applied = []
+        for player, state_key, action_str, delta in updates:
+            slot, found = self.find(self.state_base(player, state_key) + self.action_code(action_str))
+            if not found:
+                continue
+            with self.stripes[slot % STRIPES]:
+                values[slot] += delta
+            applied.append((player, state_key, action_str, delta))
+        return applied
+
+    def state_count(self, player):
+        return self.counters[W_STATES if player == "W" else B_STATES]
+
+    def snapshot(self):
+        engine = self.engine
+        n = engine.num_squares
+        names = engine.action_names
+        table = {player: {} for player in PLAYERS}
+        state_keys = {}
+        values = self.values
+        for slot, stored in enumerate(self.keys):
+            if not stored:
+                continue
+            base, action = divmod(stored - 1, self.n2)
+            state_key = state_keys.get(base)
+            if state_key is None:
+                code, is_black = divmod(base, 2)
+                state_key = state_keys[base] = engine.state_key(*self.codec.decode(code), PLAYERS[is_black])
+            table[state_key[0]].setdefault(state_key, {})[names[action // n][action % n]] = values[slot]
+        return table
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export a shared Q-table file.")
+    parser.add_argument("command", choices=["to-json"])
+    parser.add_argument("source")
+    parser.add_argument("target")
+    args = parser.parse_args()
+    with open(args.source, "rb") as f:
+        _, _, width, height, _ = HEADER.unpack(f.read(HEADER.size))
+    # close() writes the table to the store's snapshot path.
+    SharedStore(args.source, get_engine(width, height), args.target).close()
+
+
+if __name__ == "__main__":
+    main()
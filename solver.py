@@ -0,0 +1,221 @@
+"""
+Exact solver for small Pawn Wars boards.
+
+Every game ends (pawns only move forward), so the positions reachable from
+the initial position form a DAG and can be solved exactly. solve() walks it
+depth-first from initial_position() using the engine's move rules and
+memoizes each position's value:
+
+  outcome   +1 if the player to move wins with best play, -1 if they lose
+  distance  plies until the game ends: the winner plays the fastest win,
+            the loser the slowest loss
+  best      the move achieving that (src * squares + dst)
+
+Positions are solved in mirror-canonical orientation (see symmetry.py), so
+3x3 needs 37 entries and 4x4 5,734. The result is kept per player
+in flat arrays with a dict from state code to row, so perfect play is an
+O(1) lookup:
+
+  solution = solve(engine)
+  move = solution.best_move(white, black, player)
+
+policy_error() compares a Q-table against the solution. Only positions the
+mover can win count, because every move loses from a lost position. The
+Q-table is never modified.
+
+  python solver.py            # solve 3x3 and 4x4 and score the shipped tables
+"""
+import json
+import os
+import sys
+from array import array
+from bisect import bisect
+from itertools import accumulate
+
+from bitboard import BitboardEngine
+from qstore import CompactQTable, INITIAL_Q, PLAYERS
+from symmetry import Mirror, fold
+
+# Largest board solve() accepts. 5x4 (92,258 positions) takes about 1.5 s;
+# 5x5 already needs about a million positions and 20 s, and 6x6 does not
+# finish in reasonable time or memory.
+MAX_SQUARES = 20
+
+
+class Solution:
+    def __init__(self, engine):
+        self.engine = engine
+        self.mirror = Mirror(engine)
+        self.codec = CompactQTable(engine)
+        self.index = {p: {} for p in PLAYERS}
+        self.outcomes = {p: array("b") for p in PLAYERS}
+        self.distances = {p: array("B") for p in PLAYERS}
+        self.best = {p: array("H") for p in PLAYERS}
+
+    def __len__(self):
+        return sum(len(self.index[p]) for p in PLAYERS)
+
+    def add(self, player, white, black, outcome, distance, best):
+        index = self.index[player]
+        index[self.codec.state_code(white, black)] = len(index)
+        self.outcomes[player].append(outcome)
+        self.distances[player].append(distance)
+        self.best[player].append(best)
+
+    def lookup(self, white, black, player):
+        """Return (outcome, distance, best (src, dst), flipped) for a position."""
+        white, black, flipped = self.mirror.canonical(white, black)
+        row = self.index[player][self.codec.state_code(white, black)]
+        n = self.engine.num_squares
+        best = self.best[player][row]
+        return self.outcomes[player][row], self.distances[player][row], (best // n, best % n), flipped
+
+    def outcome(self, white, black, player):
+        """(outcome, distance) for the player to move."""
+        outcome, distance, _, _ = self.lookup(white, black, player)
+        return outcome, distance
+
+    def best_move(self, white, black, player):
+        """Perfect-play move on the real board, or None if player has no moves."""
+        if not self.engine.moves(white, black, player):
+            return None
+        _, _, move, flipped = self.lookup(white, black, player)
+        return self.mirror.mirror_move(move) if flipped else move
+
+    def move_outcome(self, white, black, player, move):
+        """Outcome for player after playing move: +1 if it keeps a win, -1 if it loses."""
+        engine = self.engine
+        next_player = "B" if player == "W" else "W"
+        white, black = engine.apply_move(white, black, player, *move)
+        over, winner = engine.game_over(white, black, next_player)
+        if over:
+            return 1 if winner == player else -1
+        return -self.outcome(white, black, next_player)[0]
+
+    def positions(self):
+        """Yield (white, black, player) for every solved canonical position."""
+        for player in PLAYERS:
+            for code in self.index[player]:
+                white, black = self.codec.decode(code)
+                yield white, black, player
+
+
+def solve(engine):
+    """Solve every position reachable from the initial position; ValueError above MAX_SQUARES."""
+    if engine.num_squares > MAX_SQUARES:
+        raise ValueError(f"the exact solver supports boards of at most {MAX_SQUARES} squares, "
+                         f"not {engine.width}x{engine.height}")
+    solution = Solution(engine)
+    mirror = solution.mirror
+    n = engine.num_squares
+    memo = {}
+
+    def value(white, black, player):
+        white, black, _ = mirror.canonical(white, black)
+        key = (white, black, player)
+        if key in memo:
+            return memo[key]
+        next_player = "B" if player == "W" else "W"
+        best = None
+        for src, dst in engine.moves(white, black, player):
+            new_white, new_black = engine.apply_move(white, black, player, src, dst)
+            over, winner = engine.game_over(new_white, new_black, next_player)
+            if over:
+                result = (1 if winner == player else -1, 1)
+            else:
+                outcome, distance = value(new_white, new_black, next_player)
+                result = (-outcome, distance + 1)
+            # Prefer wins, then the quickest win or the slowest loss.
+            rank = (result[0], -result[1] * result[0])
+            if best is None or rank > best[0]:
+                best = (rank, result, src * n + dst)
+        if best is None:
+            # No legal moves: the player to move has lost.
+            memo[key] = (-1, 0)
+            solution.add(player, white, black, -1, 0, 0)
+        else:
+            memo[key] = best[1]
+            solution.add(player, white, black, best[1][0], best[1][1], best[2])
+        return memo[key]
+
+    white, black = engine.initial_position()
+    value(white, black, "W")
+    return solution
+
+
+def selection_probabilities(q_values):
+    """
+    Exact probability of each action under choose_action's sampling. When
+    the sum is positive, random.choices bisects the running sum of the
+    weights with a uniform r in [0, total). That running sum is not
+    monotone once some Q values are negative, so the chosen index is
+    evaluated on every interval between breakpoints.
+    """
+    count = len(q_values)
+    total = sum(q_values)
+    if total <= 0:
+        return [1 / count] * count
+    cumulative = list(accumulate(q_values))
+    points = sorted({0, total} | {c for c in cumulative if 0 < c < total})
+    probabilities = [0.0] * count
+    for lo, hi in zip(points, points[1:]):
+        index = bisect(cumulative, (lo + hi) / 2, 0, count - 1)
+        probabilities[index] += (hi - lo) / total
+    return probabilities
+
+
+def policy_error(solution, q_table, probabilities=None):
+    """
+    Score q_table against the solution over every winnable position.
+    Returns a dict with
+      positions    number of canonical positions the mover can win
+      greedy       fraction where the highest-Q move gives the win away
+      sampled      mean probability that choose_action's sampling gives it away
+                   (see selection_probabilities, or probabilities(q_values)
+                   if given)
+    Positions missing from q_table count as uniform, as choose_action would
+    initialize them.
+    """
+    engine = solution.engine
+    positions = greedy_errors = 0
+    sampled_error = 0.0
+    for white, black, player in solution.positions():
+        if solution.outcome(white, black, player)[0] <= 0:
+            continue
+        # Same action order as choose_action: stored actions first, then new moves.
+        state_q = dict(q_table[player].get(engine.state_key(white, black, player), {}))
+        for move in engine.moves(white, black, player):
+            state_q.setdefault(engine.action_str(*move), INITIAL_Q)
+        moves = [engine.parse_action(action_str) for action_str in state_q]
+        q_values = list(state_q.values())
+        losing = [solution.move_outcome(white, black, player, move) < 0 for move in moves]
+        positions += 1
+        greedy_errors += losing[q_values.index(max(q_values))]
+        sampled_error += sum(p for p, lost in zip((probabilities or selection_probabilities)(q_values), losing)
+                             if lost)
+    return {
+        "positions": positions,
+        "greedy": greedy_errors / positions if positions else 0.0,
+        "sampled": sampled_error / positions if positions else 0.0,
+    }
+
+
+def main():
+    root = os.path.dirname(os.path.abspath(__file__))
+    for size, path in ((3, os.path.join(root, "q_table.json")), (4, os.path.join(root, "4by4", "q_table.json"))):
+        engine = BitboardEngine(size, size)
+        solution = solve(engine)
+        white, black = engine.initial_position()
+        outcome, distance = solution.outcome(white, black, "W")
+        print(f"{size}x{size}: {len(solution)} positions, "
+              f"{'White' if outcome > 0 else 'Black'} wins in {distance} plies")
+        if os.path.exists(path):
+            with open(path) as f:
+                error = policy_error(solution, fold(json.load(f), engine))
+            print(f"  {os.path.relpath(path, root)}: greedy error {error['greedy']:.3f}, "
+                  f"sampled error {error['sampled']:.3f} over {error['positions']} winnable positions")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,248 @@
+"""
+SQLite-backed Q-table store (Q_STORE=sqlite).
+
+The table lives in q_table.sqlite, one row per (player, state, action):
+
+  CREATE TABLE q_values (
+      player TEXT NOT NULL,      -- "W" or "B"
+      state  TEXT NOT NULL,      -- canonical "W|a1:W,..." key, as in the JSON
+      action TEXT NOT NULL,      -- "a1a2"
+      q      INTEGER NOT NULL,
+      PRIMARY KEY (player, state, action)
+  ) WITHOUT ROWID
+
+so a state's actions are one index range, and the table can be queried
+directly:
+
+  sqlite3 q_table.sqlite "SELECT state, action, q FROM q_values
+                          WHERE player = 'W' ORDER BY q DESC LIMIT 10"
+
+The number of states per player, read on every /metrics scrape, is kept
+in a small state_counts table that state_values updates when it inserts a
+new state, so reading it is not a scan.
+
+Nothing is loaded at startup. choose_action reads only the state it needs,
+and adds the state with INSERT OR IGNORE when it is new. update_q_values
+applies a finished game as one transaction of
+UPDATE ... SET q = q + ? statements, so every game is durable as soon as it
+commits. The database runs in WAL mode: readers never block the writer or
+each other, and several app processes can share one database. Each thread
+uses its own connection. Writes take the write lock up front
+(BEGIN IMMEDIATE) and wait up to `timeout` seconds for it.
+
+The first process to open a new database imports the JSON or binary
+snapshot with its journal (see store.import_snapshot). From then on the
+database is the table. Export it for the trainers with:
+
+  python sqlstore.py to-json q_table.sqlite q_table.json
+"""
+import argparse
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from bitboard import get_engine
+from qstore import INITIAL_Q, PLAYERS
+from store import import_snapshot, write_table
+
+# States per SELECT in lookup_values (SQLite allows 999 parameters before 3.32).
+LOOKUP_CHUNK = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS q_values (
+    player TEXT NOT NULL,
+    state TEXT NOT NULL,
+    action TEXT NOT NULL,
+    q INTEGER NOT NULL,
+    PRIMARY KEY (player, state, action)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS meta (
+    name TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS state_counts (
+    player TEXT PRIMARY KEY,
+    states INTEGER NOT NULL
+);
+"""
+
+
+class SQLiteStore:
+    process_local = False  # other processes may write the database
+    replaceable = True
+    # The database is the table; the snapshot it was imported from is stale.
+    snapshot_complete = False
+
+    def __init__(self, path, engine, snapshot_path=None, fsync=False, timeout=30.0):
+        self.path = path
+        self.engine = engine
+        self.fsync = fsync
+        self.timeout = timeout
+        self.local = threading.local()
+        self.connections = []
+        self.connections_lock = threading.Lock()
+        conn = self.connection()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(SCHEMA)
+        with self.transaction(conn):
+            size = f"{engine.width}x{engine.height}"
+            row = conn.execute("SELECT value FROM meta WHERE name = 'size'").fetchone()
+            if row is None:
+                conn.execute("INSERT INTO meta VALUES ('size', ?)", (size,))
+                if snapshot_path is not None:
+                    self.import_table(conn, import_snapshot(snapshot_path, engine))
+            elif row[0] != size:
+                raise ValueError(f"{path} holds a {row[0]} table, expected {size}")
+            if conn.execute("SELECT count(*) FROM state_counts").fetchone()[0] < len(PLAYERS):
+                self.count_states(conn)  # a new database, or one from before state_counts
+
+    # ------------------------------------------------------------------
+    # Connections
+    # ------------------------------------------------------------------
+    def connection(self):
+        """This thread's connection (sqlite3 connections are not shared between threads)."""
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None,
+                                   check_same_thread=False)
+            conn.execute(f"PRAGMA synchronous={'FULL' if self.fsync else 'NORMAL'}")
+            self.local.conn = conn
+            with self.connections_lock:
+                self.connections.append(conn)
+        return conn
+
+    @contextmanager
+    def transaction(self, conn):
+        """A write transaction that holds the database's write lock from the start."""
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def import_table(self, conn, table):
+        conn.executemany("INSERT OR REPLACE INTO q_values VALUES (?, ?, ?, ?)",
+                         ((player, state_key, action_str, value)
+                          for player in PLAYERS
+                          for state_key, state_q in table[player].items()
+                          for action_str, value in state_q.items()))
+        self.count_states(conn)
+
+    def count_states(self, conn):
+        """
+        Recount the states per player (a full scan). state_values keeps the
+        counts up to date afterwards, so state_count() is one row read.
+        """
+        for player in PLAYERS:
+            conn.execute("INSERT OR REPLACE INTO state_counts VALUES (?, (SELECT count(*) FROM "
+                         "(SELECT DISTINCT state FROM q_values WHERE player = ?)))", (player, player))
+
+    # ------------------------------------------------------------------
+    # Store interface (see store.py)
+    # ------------------------------------------------------------------
+    def state_values(self, player, state_key, actions):
+        conn = self.connection()
+        rows = dict(conn.execute("SELECT action, q FROM q_values WHERE player = ? AND state = ?",
+                                 (player, state_key)))
+        missing = [action_str for action_str in actions if action_str not in rows]
+        if missing:
+            with self.transaction(conn):
+                # Checked under the write lock: another process may have added the state meanwhile.
+                new_state = conn.execute("SELECT 1 FROM q_values WHERE player = ? AND state = ? LIMIT 1",
+                                         (player, state_key)).fetchone() is None
+                conn.executemany("INSERT OR IGNORE INTO q_values VALUES (?, ?, ?, ?)",
+                                 [(player, state_key, action_str, INITIAL_Q) for action_str in missing])
+                if new_state:
+                    conn.execute("UPDATE state_counts SET states = states + 1 WHERE player = ?", (player,))
+            rows = dict(conn.execute("SELECT action, q FROM q_values WHERE player = ? AND state = ?",
+                                     (player, state_key)))
+        return [(action_str, rows[action_str]) for action_str in actions]
+
+    def lookup_values(self, queries):
+        """One SELECT per player and LOOKUP_CHUNK states, in one read transaction."""
+        conn = self.connection()
+        rows = {}
+        conn.execute("BEGIN")
+        try:
+            for player in PLAYERS:
+                state_keys = sorted({state_key for query_player, state_key, _ in queries if query_player == player})
+                for start in range(0, len(state_keys), LOOKUP_CHUNK):
+                    chunk = state_keys[start:start + LOOKUP_CHUNK]
+                    for state_key, action_str, value in conn.execute(
+                            f"SELECT state, action, q FROM q_values WHERE player = ? AND state IN "
+                            f"({','.join('?' * len(chunk))})", (player, *chunk)):
+                        rows[player, state_key, action_str] = value
+        finally:
+            conn.execute("COMMIT")
+        return [[rows.get((player, state_key, action_str)) for action_str in actions]
+                for player, state_key, actions in queries]
+
+    def add(self, updates):
+        conn = self.connection()
+        applied = []
+        with self.transaction(conn):
+            for update in updates:
+                player, state_key, action_str, delta = update
+                cursor = conn.execute("UPDATE q_values SET q = q + ? WHERE player = ? AND state = ? AND action = ?",
+                                      (delta, player, state_key, action_str))
+                if cursor.rowcount:
+                    applied.append(update)
+        return applied
+
+    def state_count(self, player):
+        return self.connection().execute("SELECT states FROM state_counts WHERE player = ?",
+                                         (player,)).fetchone()[0]
+
+    def snapshot(self):
+        table = {player: {} for player in PLAYERS}
+        for player, state_key, action_str, value in self.connection().execute(
+                "SELECT player, state, action, q FROM q_values ORDER BY player, state"):
+            table[player].setdefault(state_key, {})[action_str] = value
+        return table
+
+    def replace(self, table, replay_journal=False):
+        """
+        Swap in table in one transaction; readers keep the old rows until it
+        commits. There is no journal: updates are in the database itself, so
+        a reload of the snapshot (replay_journal) would replace them with the
+        stale rows they were imported from, and is refused.
+        """
+        if replay_journal:
+            raise ValueError("the SQLite database is newer than its snapshot file; "
+                             "export it with sqlstore.py to-json to reload it")
+        conn = self.connection()
+        with self.transaction(conn):
+            conn.execute("DELETE FROM q_values")
+            self.import_table(conn, table)
+
+    def flush(self):
+        """Copy committed WAL pages into the database file without blocking anyone."""
+        self.connection().execute("PRAGMA wal_checkpoint(PASSIVE)")
+
+    def close(self):
+        with self.connections_lock:
+            for conn in self.connections:
+                conn.close()
+            self.connections = []
+        self.local = threading.local()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export an SQLite Q-table.")
+    parser.add_argument("command", choices=["to-json"])
+    parser.add_argument("source")
+    parser.add_argument("target", help="a .json file, or .bin for the binary format")
+    args = parser.parse_args()
+    conn = sqlite3.connect(args.source)
+    size = conn.execute("SELECT value FROM meta WHERE name = 'size'").fetchone()[0]
+    conn.close()
+    engine = get_engine(*map(int, size.split("x")))
+    store = SQLiteStore(args.source, engine)
+    write_table(args.target, store.snapshot(), engine)
+    store.close()
+
+
+if __name__ == "__main__":
+    main()
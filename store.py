@@ -0,0 +1,221 @@
+"""
+Q-table stores for the Flask apps.
+
+GameServer keeps its Q-table behind a small store interface, so the table
+can live in process memory or be shared by several worker processes:
+
+  state_values(player, state_key, actions)
+        [(action_str, q), ...] for a canonical state, adding any of
+        `actions` the table does not have yet at INITIAL_Q
+  lookup_values(queries)
+        for each (player, state_key, actions) in queries, the Q value of
+        every action, or None where the table has no entry; read-only,
+        so unseen states are not added
+  add(updates)
+        apply (player, state_key, action_str, delta) updates to existing
+        entries; returns the updates that were applied
+  state_count(player)
+        number of states stored for player
+  snapshot()
+        {"W": {state_key: {action_str: q}}, "B": ...} copy of the table
+  flush()
+        periodic persistence work, run by the write-behind saver
+  replace(table, replay_journal=False)
+        make a loaded table the live one (hot reload); readers see either
+        the old or the new table, never a mix. With replay_journal, table
+        is a fresh load of the store's own snapshot file, and updates not
+        yet folded into that file are applied on top, as on a restart
+  close()
+
+and three attributes: `process_local`, True if every change to the table
+goes through this process, so it may cache what it reads (see
+sampling.py); `replaceable`, False for a store that has no replace()
+because it cannot swap its table in place (the server then refuses to
+reload); and `snapshot_complete`, True if the snapshot file with its
+journal holds every update. SQLiteStore's database is newer than the
+snapshot it was imported from, so reloading that file would drop what it
+learned since: its replace() raises ValueError with replay_journal, and
+the server refuses such a reload.
+
+DictStore (Q_STORE=json, the default) is the nested-dict table of a single
+process, persisted by the journal and compacted snapshots (journal.py,
+qbin.py). SharedStore (Q_STORE=shared, sharedq.py) is one table for every
+app process on the machine. SQLiteStore (Q_STORE=sqlite, sqlstore.py) keeps
+the table in an SQLite database and reads it one state at a time.
+"""
+import json
+import os
+
+import persistence
+import qbin
+from journal import QJournal
+from qlock import StripedLocks
+from qstore import INITIAL_Q
+from symmetry import fold
+
+
+def load_table(path, engine, binary=None):
+    """
+    A snapshot from disk: memory-mapped if binary (default: for .bin
+    paths), else JSON folded into mirror-canonical form (symmetry.fold);
+    empty if missing.
+    """
+    if binary is None:
+        binary = path.endswith(".bin")
+    if binary and os.path.exists(path):
+        return qbin.open_table(path, engine)
+    if os.path.exists(path):
+        with open(path, "r") as f:
+            return fold(json.load(f), engine)
+    return {"W": {}, "B": {}}
+
+
+def write_table(path, q_table, engine, binary=None):
+    """Write a snapshot atomically: the binary format if binary (default: for .bin paths), else JSON."""
+    if binary is None:
+        binary = path.endswith(".bin")
+    if binary:
+        qbin.write(path, q_table, engine)
+    else:
+        persistence.write_json(path, q_table)
+
+
+def read_table(snapshot_path, engine):
+    """
+    The table DictStore would load from snapshot_path, with its journal
+    replayed in memory, without writing or removing any file: a compaction
+    that was committed but not yet renamed is read from its pending file,
+    which QJournal.recover() would rename over the snapshot.
+    """
+    journal = QJournal(snapshot_path, engine)
+    pending = journal.read_checkpoint().get("pending")
+    if pending and os.path.exists(pending):
+        table = load_table(pending, engine, binary=snapshot_path.endswith(".bin"))
+    else:
+        table = load_table(snapshot_path, engine)
+    journal.replay(table)
+    return table
+
+
+def import_snapshot(snapshot_path, engine):
+    """
+    Load a snapshot with its journal applied, for a store taking over from
+    DictStore. If the journal had records, the snapshot is rewritten to
+    include them and the journal is retired, so they are never applied twice.
+    """
+    journal = QJournal(snapshot_path, engine)
+    journal.recover()
+    table = load_table(snapshot_path, engine)
+    if journal.replay(table):
+        write_table(snapshot_path, table, engine)
+        journal.retire()
+    return table
+
+
+class DictStore:
+    """
+    The Q-table as {"W": {state_key: {action_str: q}}, "B": ...} in memory.
+    Finished games go to the journal next to snapshot_path; flush() folds
+    the journal into a new snapshot once it passes compact_bytes.
+    """
+
+    process_local = True
+    replaceable = True
+    snapshot_complete = True
+
+    def __init__(self, engine, snapshot_path, compact_bytes, fsync=False):
+        self.engine = engine
+        self.compact_bytes = compact_bytes
+        # Writers lock the stripe of each state they touch; reads take no lock.
+        self.locks = StripedLocks()
+        # Finish any interrupted compaction, then replay the journal on top of
+        # the last snapshot.
+        self.journal = QJournal(snapshot_path, engine, fsync=fsync)
+        self.journal.recover()
+        self.q_table = load_table(snapshot_path, engine)
+        self.journal.replay(self.q_table)
+        self.journal.open()
+
+    def state_values(self, player, state_key, actions):
+        """
+        The lock is only taken to add something; a new state's dict is
+        complete before other threads can see it, and the items are copied
+        in one atomic list() call so actions and values match.
+        """
+        states = self.q_table[player]
+        state_q = states.get(state_key)
+        if state_q is None or not all(action_str in state_q for action_str in actions):
+            with self.locks.for_key(state_key):
+                states = self.q_table[player]  # the live table, in case replace() swapped it
+                state_q = states.get(state_key)
+                if state_q is None:
+                    state_q = states[state_key] = {action_str: INITIAL_Q for action_str in actions}
+                else:
+                    # In case new moves have become available that are not yet in the table.
+                    for action_str in actions:
+                        state_q.setdefault(action_str, INITIAL_Q)
+        return list(state_q.items())
+
+    def lookup_values(self, queries):
+        q_table = self.q_table  # one table throughout, even if replace() swaps it meanwhile
+        results = []
+        for player, state_key, actions in queries:
+            state_q = q_table[player].get(state_key)
+            if state_q is None:
+                results.append([None] * len(actions))
+            else:
+                results.append([state_q.get(action_str) for action_str in actions])
+        return results
+
+    def add(self, updates):
+        """
+        Holds the stripes of every state in updates around the in-memory
+        update and the journal append, so compaction sees each batch either
+        in its table copy or in a later segment.
+        """
+        applied = []
+        with self.locks.for_keys([state_key for _, state_key, _, _ in updates]):
+            q_table = self.q_table  # read under the stripes: replace() swaps it under all of them
+            for player, state_key, action_str, delta in updates:
+                state_q = q_table[player].get(state_key)
+                if state_q is not None and action_str in state_q:
+                    state_q[action_str] += delta
+                    applied.append((player, state_key, action_str, delta))
+            self.journal.append(applied)
+        return applied
+
+    def state_count(self, player):
+        return len(self.q_table[player])
+
+    def snapshot(self):
+        if isinstance(self.q_table, qbin.MappedQTable):
+            return self.q_table.frozen()
+        return persistence.snapshot_q_table(self.q_table)
+
+    def write(self, path, snapshot):
+        # path is a temporary name; the format follows the snapshot file.
+        write_table(path, snapshot, self.engine, binary=self.journal.snapshot_path.endswith(".bin"))
+
+    def flush(self):
+        if self.journal.size >= self.compact_bytes:
+            self.journal.compact(self.snapshot, self.write, exclusive=self.locks.exclusive)
+
+    def replace(self, table, replay_journal=False):
+        """
+        Swap in table with one reference assignment. The swap happens inside
+        a forced compaction, under every stripe: updates journalled before it
+        are dropped with the old table (or, with replay_journal, applied to
+        table first), later ones land in a new segment, and table is written
+        as the new snapshot. The replay reads at most compact_bytes of
+        journal while writers wait.
+        """
+        def swap():
+            if replay_journal:
+                # Every segment up to the one just closed is complete and still unfolded.
+                self.journal.replay(table)
+            self.q_table = table
+            return self.snapshot()
+        self.journal.compact(swap, self.write, exclusive=self.locks.exclusive, force=True)
+
+    def close(self):
+        self.journal.close()
@@ -0,0 +1,159 @@
+"""
+Left-right mirror symmetry of Pawn Wars positions.
+
+The rules do not change when the board is reflected across its middle file
+(a <-> c on 3x3, a <-> d and b <-> c on 4x4), so a position and its mirror
+image have the same value and mirrored moves. Mirror.canonical() maps every
+position to the smaller of itself and its mirror image, compared as
+(white, black) bitboard pairs. Only canonical states are stored in the
+Q-table, which halves the table and lets both orientations of a position
+learn from the same entries.
+
+choose_action looks up the canonical state and maps the chosen canonical
+action back to the real board. Game histories record the canonical
+(state_key, action_str), so update_q_values needs no mapping for them.
+
+JSON tables are folded into canonical form as they are loaded
+(store.load_table, fast_train.load_q_table), so a table trained before
+mirroring, like the shipped q_table.json files, can be used as it is.
+Mirrored entries are merged by adding up what each side learned: an action
+seen in both orientations ends at 20 + (q - 20) + (q' - 20). To rewrite a
+file in canonical form once, run
+  python symmetry.py fold q_table.json [--out folded.json] [--size 4]
+Updates still in the app's journal are replayed first. Run it while the
+app is stopped.
+"""
+import argparse
+import json
+import os
+
+from bitboard import BitboardEngine, infer_engine
+from persistence import atomic_write
+
+INITIAL_Q = 20
+
+
+class Mirror:
+    def __init__(self, engine):
+        self.engine = engine
+        width = engine.width
+        self.square_map = [(sq // width) * width + (width - 1 - sq % width)
+                           for sq in range(engine.num_squares)]
+        # Reversed bit order of every possible rank, so mirroring a bitboard
+        # costs one table lookup per rank.
+        self.rank_mask = (1 << width) - 1
+        self.rank_reversed = [int(format(bits, f"0{width}b")[::-1], 2) for bits in range(1 << width)]
+        # The same for blocks of up to 12 bits worth of whole ranks (the
+        # whole board on 3x3, two lookups on 4x4).
+        block_ranks = max(1, 12 // width)
+        self.block_bits = block_ranks * width
+        self.block_mask = (1 << self.block_bits) - 1
+        self.block_reversed = [0] * (1 << self.block_bits)
+        for bits in range(1 << self.block_bits):
+            mirrored = 0
+            for shift in range(0, self.block_bits, width):
+                mirrored |= self.rank_reversed[(bits >> shift) & self.rank_mask] << shift
+            self.block_reversed[bits] = mirrored
+        self.name_map = {engine.square_names[sq]: engine.square_names[mirrored]
+                         for sq, mirrored in enumerate(self.square_map)}
+        names = engine.action_names
+        n = engine.num_squares
+        self.action_map = {names[src][dst]: names[self.square_map[src]][self.square_map[dst]]
+                           for src in range(n) for dst in range(n)}
+
+    def mirror(self, bits):
+        """Reflect one bitboard across the middle file."""
+        step = self.block_bits
+        mask = self.block_mask
+        table = self.block_reversed
+        mirrored = 0
+        for shift in range(0, self.engine.num_squares, step):
+            mirrored |= table[(bits >> shift) & mask] << shift
+        return mirrored
+
+    def canonical(self, white, black):
+        """Return (white, black, flipped) for the canonical orientation of a position."""
+        mirrored_white = self.mirror(white)
+        if mirrored_white > white:
+            return white, black, False
+        mirrored_black = self.mirror(black)
+        if mirrored_white < white or mirrored_black < black:
+            return mirrored_white, mirrored_black, True
+        return white, black, False
+
+    def mirror_move(self, move):
+        square_map = self.square_map
+        return square_map[move[0]], square_map[move[1]]
+
+    def mirror_move_names(self, move):
+        """Mirror a ("a1", "a2") move as used by the Flask apps."""
+        name_map = self.name_map
+        return name_map[move[0]], name_map[move[1]]
+
+    def mirror_action(self, action_str):
+        return self.action_map[action_str]
+
+    def canonical_key(self, state_key):
+        """Return (canonical state_key, flipped) for a "W|a1:W,..." key."""
+        white, black, player = self.engine.position_from_key(state_key)
+        white, black, flipped = self.canonical(white, black)
+        if not flipped:
+            return state_key, False
+        return self.engine.state_key(white, black, player), True
+
+    def canonical_entry(self, state_key, action_str):
+        """Map a (state_key, action_str) pair from either orientation to the canonical one."""
+        canonical_key, flipped = self.canonical_key(state_key)
+        return canonical_key, self.mirror_action(action_str) if flipped else action_str
+
+
+def fold(q_table, engine):
+    """Return a copy of q_table with every state in canonical orientation."""
+    mirror = Mirror(engine)
+    folded = {}
+    for player, states in q_table.items():
+        folded_states = folded[player] = {}
+        for state_key, state_q in states.items():
+            canonical_key, flipped = mirror.canonical_key(state_key)
+            target = folded_states.setdefault(canonical_key, {})
+            for action_str, value in state_q.items():
+                if flipped:
+                    action_str = mirror.mirror_action(action_str)
+                target[action_str] = target.get(action_str, INITIAL_Q) + value - INITIAL_Q
+    return folded
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fold a JSON Q-table into mirror-canonical form.")
+    parser.add_argument("command", choices=["fold"])
+    parser.add_argument("source")
+    parser.add_argument("--out", default=None, help="output file (default: overwrite source)")
+    parser.add_argument("--size", type=int, default=None,
+                        help="board size (default: inferred from the state keys)")
+    args = parser.parse_args()
+    # Imported here because journal.py -> qstore.py imports this module.
+    from journal import QJournal
+
+    with open(args.source) as f:
+        q_table = json.load(f)
+    engine = BitboardEngine(args.size, args.size) if args.size else infer_engine(q_table)
+    # An app's journal may still hold updates under non-canonical keys;
+    # fold them in too, and retire them when folding in place.
+    journal = QJournal(args.source, engine)
+    journal.recover()
+    replayed = journal.replay(q_table)
+    folded = fold(q_table, engine)
+    target = args.out or args.source
+    with atomic_write(target) as f:
+        json.dump(folded, f)
+    if os.path.abspath(target) == os.path.abspath(args.source):
+        journal.retire()
+    if replayed:
+        print(f"folded {replayed} journal records")
+    before = sum(len(states) for states in q_table.values())
+    after = sum(len(states) for states in folded.values())
+    print(f"{before} states -> {after} canonical states")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Return-based Q updates for fast_train.py (--update td).
+
+update_q_values adds +1 to every move of the winner and -1 to every move of
+the loser, however far the move was from the end. Opening moves collect
+the sum of thousands of unrelated results (the 3x3 table has -3130), and
+sampling in proportion to such counts takes many games to tell good moves
+from bad ones.
+
+ReturnUpdate moves each Q value a fraction alpha towards the return that
+followed the move instead. The result is worth +WIN_RETURN to the winner
+and -WIN_RETURN to the loser. WIN_RETURN is INITIAL_Q (20), so an unseen
+move starts out valued as a win: an optimistic start that gets every move
+tried. A player's moves form its own episode (the opponent's replies are
+part of the environment), and the return of its move t is the lambda-return
+
+  G_t = gamma * ((1 - lam) * Q(s_t+1, a_t+1) + lam * G_t+1)
+
+where (s_t+1, a_t+1) is the same player's next move and G of its last move
+is +-WIN_RETURN. lam = 1 is Monte-Carlo (G_t = gamma**k * +-WIN_RETURN, k
+moves before the end) and lam = 0 one-step TD (Sarsa). The updates are made
+when the game ends, from the Q values as they were during the game. This
+is offline TD(lambda): the same updates as accumulating eligibility traces
+over the game and applying them at the end.
+
+Q values are expected discounted outcomes in [-20, 20], so a move whose
+expected outcome is negative should not be played while a better one
+exists. fast_train samples with the apps' weights, max(q, 0)
+(sampling.probabilities), which never does.
+
+The binary and shared stores hold integers, so saved tables hold
+round(TD_SCALE * q): an expected outcome of 0.25 is saved as 250. The
+sampling weights only change by the common factor, but a move the apps
+add later starts at INITIAL_Q, which in this scale is a small positive
+value rather than a win. A table saved by fast_train's +1/-1 rule holds
+visit counts, not outcomes, so fast_train only continues a table saved
+by this update (--td-resume) and otherwise starts from an empty one.
+"""
+from qstore import INITIAL_Q, PLAYERS
+
+WIN_RETURN = INITIAL_Q
+# Saved Q values are TD_SCALE times the expected outcome.
+TD_SCALE = 1000
+
+
+class ReturnUpdate:
+    def __init__(self, q_table, alpha=0.3, gamma=0.9, lam=0.8):
+        if not 0 < alpha <= 1 or not 0 <= gamma <= 1 or not 0 <= lam <= 1:
+            raise ValueError("alpha must be in (0, 1], gamma and lam in [0, 1]")
+        self.q_table = q_table
+        self.alpha = alpha
+        self.gamma = gamma
+        self.lam = lam
+
+    def __call__(self, game_history, winner):
+        """Update the Q value of every recorded (player, state_key, action_str) towards its return."""
+        alpha, gamma, lam = self.alpha, self.gamma, self.lam
+        for player in PLAYERS:
+            states = self.q_table[player]
+            moves = [(states[state_key], action_str) for p, state_key, action_str in game_history
+                     if p == player and action_str in states.get(state_key, ())]
+            old = [state_q[action_str] for state_q, action_str in moves]
+            ret = WIN_RETURN if player == winner else -WIN_RETURN
+            for t in range(len(moves) - 1, -1, -1):
+                if t < len(moves) - 1:
+                    ret = gamma * ((1 - lam) * old[t + 1] + lam * ret)
+                state_q, action_str = moves[t]
+                state_q[action_str] = old[t] + alpha * (ret - old[t])
+
+
+def scaled(q_table):
+    """A copy of q_table with the integer Q values saved for it (round(TD_SCALE * q))."""
+    return {player: {state_key: {action_str: round(q * TD_SCALE) for action_str, q in state_q.items()}
+                     for state_key, state_q in q_table[player].items()}
+            for player in PLAYERS}
+
+
+def unscaled(q_table):
+    """
+    The expected outcomes of a table saved by scaled(). ValueError if a
+    value is outside +-WIN_RETURN, which no saved outcome is.
+    """
+    limit = WIN_RETURN * TD_SCALE
+    for player in PLAYERS:
+        for state_key, state_q in q_table[player].items():
+            for action_str, q in state_q.items():
+                if not -limit <= q <= limit:
+                    raise ValueError(f"{player} {state_key} {action_str} = {q} is outside +-{limit}: "
+                                     f"not a table saved by --update td")
+    return {player: {state_key: {action_str: q / TD_SCALE for action_str, q in state_q.items()}
+                     for state_key, state_q in q_table[player].items()}
+            for player in PLAYERS}
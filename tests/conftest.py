@@ -0,0 +1,20 @@
+import os
+import shutil
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# The modules live in the repository root, as for the benchmarks.
+sys.path.insert(0, ROOT)
+
+
+@pytest.fixture
+def game_server(tmp_path, monkeypatch):
+    """A 3x3 GameServer on a copy of the shipped table, in its own working directory."""
+    from server import GameServer
+    shutil.copy(os.path.join(ROOT, "q_table.json"), tmp_path / "q_table.json")
+    monkeypatch.chdir(tmp_path)
+    server = GameServer(3, 3)
+    yield server
+    server.close()
@@ -0,0 +1,47 @@
+import json
+import os
+
+import pytest
+
+import arena
+import qbin
+from bitboard import get_engine
+from conftest import ROOT
+
+
+def test_table_size(tmp_path):
+    assert arena.table_size(os.path.join(ROOT, "q_table.json")) == (3, 3)
+    with open(os.path.join(ROOT, "4by4", "q_table.json")) as f:
+        q_table = json.load(f)
+    path = str(tmp_path / "q_table.bin")
+    qbin.write(path, q_table, get_engine(4, 4))
+    assert arena.table_size(path) == (4, 4)
+    empty = tmp_path / "empty.json"
+    empty.write_text('{"W": {}, "B": {}}')
+    assert arena.table_size(str(empty)) is None
+    bad = tmp_path / "bad.json"
+    bad.write_text('{"W": {"not a state": {}}, "B": {}}')
+    with pytest.raises(ValueError):
+        arena.table_size(str(bad))
+
+
+def test_wilson_interval():
+    low, high = arena.wilson_interval(50, 100)
+    assert (low, high) == pytest.approx((0.4038, 0.5962), abs=1e-4)
+    assert arena.wilson_interval(0, 0) == (0.0, 1.0)
+    low, high = arena.wilson_interval(20, 20)
+    assert 0.8 < low < high == 1.0
+
+
+def test_perfect_play_wins_for_black_on_3x3():
+    totals, _ = arena.run(["perfect", "perfect"], 3, 3, games=10, workers=1, chunk=4)
+    total = totals[0, 1]
+    assert total["white"] == [0, 5] and total["black"] == [5, 5]
+    assert total["plies"] == 60
+
+
+def test_results_do_not_depend_on_workers():
+    names = [os.path.join(ROOT, "q_table.json"), "random"]
+    one, _ = arena.run(names, 3, 3, games=200, workers=1, chunk=50, seed=7)
+    two, _ = arena.run(names, 3, 3, games=200, workers=2, chunk=50, seed=7)
+    assert one == two
@@ -0,0 +1,119 @@
+import asyncio
+import json
+import signal
+
+import pytest
+
+import asgi_server
+import server
+from asgi_server import AsgiApp, handle_connection
+
+
+def exchange(app, request, close_write=False):
+    """Send one raw request to the built-in HTTP server; returns (status, body bytes)."""
+    async def run():
+        server = await asyncio.start_server(lambda r, w: handle_connection(app, r, w), "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(request)
+        if close_write:
+            writer.write_eof()
+        data = await asyncio.wait_for(reader.read(), 10)
+        writer.close()
+        server.close()
+        await server.wait_closed()
+        return data
+
+    data = asyncio.run(run())
+    if not data:
+        return None, None
+    head, _, body = data.partition(b"\r\n\r\n")
+    return int(head.split(b" ")[1]), body
+
+
+@pytest.fixture
+def app(game_server):
+    app = AsgiApp(game_server, "templates", "static")
+    yield app
+    app.executor.shutdown()
+
+
+
+@pytest.mark.parametrize("headers, status", [
+    (b"Content-Length: abc\r\n", 400),
+    (b"Content-Length: -5\r\n", 400),
+    (b"Content-Length: 5\r\nContent-Length: 6\r\n", 400),
+    (b"Content-Length: 99999999\r\n", 413),
+    (b"Transfer-Encoding: chunked\r\n", 411),
+])
+def test_invalid_request_bodies_are_refused(app, headers, status):
+    code, body = exchange(app, b"POST /start HTTP/1.1\r\n" + headers + b"\r\n")
+    assert code == status
+    assert "error" in json.loads(body)
+
+
+def test_valid_request(app):
+    code, body = exchange(app, b"POST /start HTTP/1.1\r\nContent-Length: 2\r\nConnection: close\r\n\r\n{}")
+    assert code == 200
+    assert json.loads(body)["player"] == "white"
+
+
+def test_short_body_closes_the_connection(app):
+    request = b"POST /start HTTP/1.1\r\nContent-Length: 20\r\n\r\n{}"
+    assert exchange(app, request, close_write=True) == (None, None)
+
+
+def test_body_limit_applies_to_any_asgi_server(app, monkeypatch):
+    monkeypatch.setattr(asgi_server, "MAX_BODY_BYTES", 10)
+    sent = []
+
+    async def run():
+        messages = [{"type": "http.request", "body": b"{" + b" " * 10, "more_body": True},
+                    {"type": "http.request", "body": b"}", "more_body": False}]
+
+        async def receive():
+            return messages.pop(0)
+
+        async def send(message):
+            sent.append(message)
+
+        await app({"type": "http", "method": "POST", "path": "/start", "headers": []}, receive, send)
+
+    asyncio.run(run())
+    assert sent[0]["status"] == 413
+
+def test_simulate_is_an_admin_post(app, monkeypatch):
+    code, _ = exchange(app, b"GET /simulate?games=1 HTTP/1.1\r\nConnection: close\r\n\r\n")
+    assert code == 405
+    monkeypatch.setattr(server, "ADMIN_TOKEN", "secret")
+    body = b'{"games": 1}'
+    request = b"POST /simulate HTTP/1.1\r\nContent-Length: %d\r\nConnection: close\r\n\r\n%s" % (len(body), body)
+    code, _ = exchange(app, request)
+    assert code == 401
+    monkeypatch.setattr(server, "ADMIN_TOKEN", "")
+    code, body = exchange(app, request)
+    assert code == 200
+    assert b'"message":"Done"' in body
+
+
+def test_lifespan_keeps_an_existing_reload_handler(app, monkeypatch):
+    monkeypatch.setattr(asgi_server, "Q_RELOAD_SIGNAL", "SIGUSR2")
+    handler = lambda signum, frame: None  # noqa: E731
+    previous = signal.signal(signal.SIGUSR2, handler)
+    sent = []
+
+    async def run():
+        messages = asyncio.Queue()
+        await messages.put({"type": "lifespan.startup"})
+        await messages.put({"type": "lifespan.shutdown"})
+
+        async def send(message):
+            sent.append(message["type"])
+        await app({"type": "lifespan"}, messages.get, send)
+
+    try:
+        asyncio.run(run())
+        assert signal.getsignal(signal.SIGUSR2) is handler
+    finally:
+        signal.signal(signal.SIGUSR2, previous)
+    assert sent == ["lifespan.startup.complete", "lifespan.shutdown.complete"]
@@ -0,0 +1,76 @@
+import pytest
+
+from bitboard import FILES, BitboardEngine, get_engine, infer_engine
+
+
+def dict_moves(board, player, width, height):
+    """The original get_possible_moves from app.py, generalised to width x height."""
+    moves = []
+    files = list(FILES[:width])
+    step = 1 if player == "W" else -1
+    opponent = "B" if player == "W" else "W"
+    for pos, p in board.items():
+        if p != player:
+            continue
+        file, rank = pos[0], int(pos[1:])
+        forward = rank + step
+        if 1 <= forward <= height:
+            new_pos = file + str(forward)
+            if new_pos not in board:
+                moves.append((pos, new_pos))
+        file_index = files.index(file)
+        for diff in [-1, 1]:
+            new_file_index = file_index + diff
+            if 0 <= new_file_index < len(files):
+                diag_pos = files[new_file_index] + str(rank + step)
+                if diag_pos in board and board[diag_pos] == opponent:
+                    moves.append((pos, diag_pos))
+    return moves
+
+
+def dict_game_over(board, next_player, width, height):
+    """The original check_game_over from app.py."""
+    for pos, p in board.items():
+        rank = int(pos[1:])
+        if p == "W" and rank == height:
+            return True, "W"
+        if p == "B" and rank == 1:
+            return True, "B"
+    if not dict_moves(board, next_player, width, height):
+        return True, "B" if next_player == "W" else "W"
+    return False, None
+
+
+@pytest.mark.parametrize("width, height", [(3, 3), (4, 4), (4, 3), (3, 5)])
+def test_parity_with_dict_engine(width, height):
+    """Walk every reachable position and compare moves, terminals and keys."""
+    engine = BitboardEngine(width, height)
+    start = engine.initial_position() + ("W",)
+    seen = {start}
+    stack = [start]
+    while stack:
+        white, black, player = stack.pop()
+        board = engine.to_board(white, black)
+        assert engine.from_board(board) == (white, black)
+        expected = sorted(dict_moves(board, player, width, height))
+        assert sorted(engine.move_names(engine.moves(white, black, player))) == expected
+        assert engine.has_moves(white, black, player) == bool(expected)
+        key = player + "|" + ",".join(f"{pos}:{piece}" for pos, piece in sorted(board.items()))
+        assert engine.state_key(white, black, player) == key
+        assert engine.position_from_key(key) == (white, black, player)
+        next_player = "B" if player == "W" else "W"
+        for src, dst in engine.moves(white, black, player):
+            nw, nb = engine.apply_move(white, black, player, src, dst)
+            over = engine.game_over(nw, nb, next_player)
+            assert over == dict_game_over(engine.to_board(nw, nb), next_player, width, height)
+            if not over[0] and (nw, nb, next_player) not in seen:
+                seen.add((nw, nb, next_player))
+                stack.append((nw, nb, next_player))
+    assert len(seen) > 10
+
+
+def test_infer_engine():
+    engine = get_engine(4, 3)
+    white, black = engine.initial_position()
+    q_table = {"W": {engine.state_key(white, black, "W"): {}}, "B": {}}
+    assert (infer_engine(q_table).width, infer_engine(q_table).height) == (4, 3)
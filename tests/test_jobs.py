@@ -0,0 +1,38 @@
+import time
+
+
+def wait(game_server, job_id, timeout=60):
+    deadline = time.monotonic() + timeout
+    while True:
+        job, status = game_server.training_job(job_id)
+        if job["status"] != "running" or time.monotonic() > deadline:
+            return job
+        time.sleep(0.05)
+
+
+def test_job_merges_its_games(game_server):
+    before = game_server.store.snapshot()
+    job, status = game_server.start_training_job({"games": 200, "seed": 1})
+    assert status == 202
+    job = wait(game_server, job["jobID"])
+    assert job["status"] == "finished"
+    assert job["games_played"] == 200 and job["merged_updates"]
+    assert game_server.store.snapshot() != before
+
+
+def test_one_job_at_a_time_and_cancel(game_server):
+    job, status = game_server.start_training_job({"games": 1000000})
+    assert status == 202
+    assert game_server.start_training_job({"games": 10})[1] == 409
+    before = game_server.store.snapshot()
+    game_server.training_job(job["jobID"], cancel=True)
+    job = wait(game_server, job["jobID"])
+    assert job["status"] == "cancelled"
+    assert job["merged_updates"] is None
+    assert game_server.store.snapshot() == before
+
+
+def test_invalid_requests(game_server):
+    assert game_server.start_training_job({"games": "many"})[1] == 400
+    assert game_server.start_training_job({"games": 0})[1] == 400
+    assert game_server.training_job("no-such-job")[1] == 404
@@ -0,0 +1,74 @@
+import random
+
+import fast_train
+from bitboard import get_engine
+from journal import QJournal
+from store import DictStore, read_table, write_table
+
+ENGINE = get_engine(3, 3)
+
+
+def plain(q_table):
+    return {player: {key: dict(actions) for key, actions in q_table[player].items()} for player in "WB"}
+
+
+def play(store, games):
+    """Play games self-play games against store's table and journal their updates."""
+    for _ in range(games):
+        fast_train.q_table = store.snapshot()
+        winner, history = fast_train.play_game()
+        for player, state_key, action_str in history:
+            store.state_values(player, state_key, [action_str])
+        store.add([(player, state_key, action_str, 1 if player == winner else -1)
+                   for player, state_key, action_str in history])
+
+
+def make_store(tmp_path, name="q_table.json"):
+    random.seed(0)
+    path = str(tmp_path / name)
+    fast_train.q_table = {"W": {}, "B": {}}
+    for _ in range(20):
+        fast_train.simulate_game()
+    write_table(path, fast_train.q_table, ENGINE)
+    return path, DictStore(ENGINE, path, 1 << 30)
+
+
+def test_replay_restores_journalled_games(tmp_path):
+    path, store = make_store(tmp_path)
+    play(store, 30)
+    expected = plain(store.snapshot())
+    store.close()
+    assert plain(DictStore(ENGINE, path, 1 << 30).snapshot()) == expected
+
+
+def test_replay_ignores_torn_batch(tmp_path):
+    path, store = make_store(tmp_path)
+    play(store, 10)
+    expected = plain(store.snapshot())
+    store.close()
+    journal = QJournal(path, ENGINE)
+    with open(journal.segment_path(journal.segments()[-1]), "ab") as f:
+        f.write(b"PWQJ\x05\x00\x00\x00abc")
+    assert plain(read_table(path, ENGINE)) == expected
+
+
+def test_read_table_finishes_committed_compaction_without_writing(tmp_path):
+    for name in ("q_table.json", "q_table.bin"):
+        path, store = make_store(tmp_path, name)
+        play(store, 20)
+        # Stop a compaction after its commit, before the rename.
+        journal = store.journal
+        snapshot = store.snapshot()
+        folded = journal.seq
+        journal.file.close()
+        journal.seq += 1
+        journal.file = open(journal.segment_path(journal.seq), "ab")
+        pending = journal.pending_path(folded)
+        store.write(pending, snapshot)
+        journal.write_checkpoint(folded, pending)
+        play(store, 10)
+        journal.file.flush()
+        expected = plain(store.snapshot())
+        files = sorted(p.name for p in tmp_path.iterdir())
+        assert plain(read_table(path, ENGINE)) == expected
+        assert sorted(p.name for p in tmp_path.iterdir()) == files
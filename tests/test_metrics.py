@@ -0,0 +1,49 @@
+import metrics
+
+
+class Timed:
+    def __init__(self):
+        self.metrics = metrics.Metrics()
+
+    @metrics.timed("every_call")
+    def every_call(self):
+        return 1
+
+    @metrics.timed("sampled", every=8)
+    def sampled(self):
+        return 2
+
+
+def series(lines, name):
+    return {line.split()[0]: float(line.split()[1]) for line in lines if line.startswith(name)}
+
+
+def test_histogram_weight():
+    histogram = metrics.Histogram("t", "test", "route", buckets=(0.001, 0.01))
+    histogram.observe("a", 0.0005)
+    histogram.observe("a", 0.005, weight=4)
+    values = series(histogram.collect(), "t_")
+    assert values['t_bucket{route="a",le="0.001"}'] == 1
+    assert values['t_bucket{route="a",le="0.01"}'] == 5
+    assert values['t_count{route="a"}'] == 5
+    assert abs(values['t_sum{route="a"}'] - 0.0205) < 1e-9
+
+
+def test_timed_samples_one_call_in_every():
+    timed = Timed()
+    assert [timed.every_call() for _ in range(5)] == [1] * 5
+    assert [timed.sampled() for _ in range(20)] == [2] * 20
+    values = series(timed.metrics.functions.collect(), "pawn_wars_function_duration_seconds_count")
+    assert values['pawn_wars_function_duration_seconds_count{function="every_call"}'] == 5
+    # Calls 0, 8 and 16 are timed, each standing for 8 calls.
+    assert values['pawn_wars_function_duration_seconds_count{function="sampled"}'] == 24
+
+
+def test_check_game_over_is_reported(game_server):
+    for _ in range(20):
+        response = game_server.start_game({})
+        while response.get("message") != "Game Over":
+            response = game_server.continue_game({"gameID": response["gameID"]})
+    page = game_server.metrics.render(game_server)
+    assert 'pawn_wars_function_duration_seconds_count{function="check_game_over"}' in page
+    assert 'pawn_wars_function_duration_seconds_count{function="choose_action"}' in page
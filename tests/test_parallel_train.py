@@ -0,0 +1,34 @@
+from collections import Counter
+
+import pytest
+
+import fast_train
+import parallel_train
+
+
+@pytest.fixture
+def trainer():
+    fast_train.q_table = {"W": {}, "B": {}}
+    yield fast_train
+    fast_train.configure(3, 3)
+    fast_train.q_table = {"W": {}, "B": {}}
+
+
+def test_merge_deltas():
+    q_table = {"W": {"W|a1:W": {"a1a2": 5}}, "B": {}}
+    parallel_train.merge_deltas(q_table, Counter({("W", "W|a1:W", "a1a2"): -2,
+                                                  ("B", "B|a3:B", "a3a2"): 3}))
+    assert q_table == {"W": {"W|a1:W": {"a1a2": 3}}, "B": {"B|a3:B": {"a3a2": parallel_train.INITIAL_Q + 3}}}
+
+
+@pytest.mark.parametrize("start_method", ["fork", "spawn"])
+def test_workers_play_the_configured_board(trainer, start_method):
+    trainer.configure(4, 3)
+    wins, total_moves = parallel_train.train(trainer, 200, 2, 50, start_method=start_method)
+    assert wins["W"] + wins["B"] == 200
+    keys = [key for states in trainer.q_table.values() for key in states]
+    assert keys
+    # 4x3 keys use the d file and never a fourth rank.
+    assert any(",d" in key or "|d" in key for key in keys)
+    assert not any("4:" in key for key in keys)
+
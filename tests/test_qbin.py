@@ -0,0 +1,69 @@
+import json
+import os
+
+import pytest
+
+import qbin
+from bitboard import get_engine
+from conftest import ROOT
+
+
+def plain(q_table):
+    return {player: dict(q_table[player].items()) for player in ("W", "B")}
+
+
+@pytest.fixture
+def table_4x4(tmp_path):
+    with open(os.path.join(ROOT, "4by4", "q_table.json")) as f:
+        q_table = json.load(f)
+    path = str(tmp_path / "q_table.bin")
+    qbin.write(path, q_table, get_engine(4, 4))
+    return path, q_table
+
+
+def test_round_trip(table_4x4):
+    path, q_table = table_4x4
+    mapped = qbin.open_table(path)
+    assert plain(mapped) == q_table
+    assert {player: len(mapped[player]) for player in q_table} == {p: len(s) for p, s in q_table.items()}
+    assert qbin.table_size(path) == (4, 4)
+
+
+def test_len_follows_added_and_deleted_states(table_4x4):
+    path, q_table = table_4x4
+    states = qbin.open_table(path)["W"]
+    count = len(states)
+    mapped_key = next(iter(q_table["W"]))
+    new_key = "W|a1:W"
+    states[new_key] = {"a1a2": 20}
+    states[mapped_key]["a1a2"] = 1  # touching a mapped state adds nothing
+    assert len(states) == count + 1
+    del states[mapped_key]
+    assert len(states) == count
+    assert mapped_key not in states
+    states[mapped_key] = {"a1a2": 3}
+    del states[new_key]
+    assert len(states) == count
+    assert sorted(states) == sorted(q_table["W"])
+
+
+def test_frozen_copy_is_isolated(table_4x4):
+    path, q_table = table_4x4
+    mapped = qbin.open_table(path)
+    key, actions = next(iter(q_table["W"].items()))
+    action = next(iter(actions))
+    mapped["W"][key][action] += 5
+    frozen = mapped.frozen()
+    mapped["W"][key][action] += 5
+    assert frozen["W"][key][action] == actions[action] + 5
+    assert mapped["W"][key][action] == actions[action] + 10
+
+
+def test_wrong_board_or_file(table_4x4, tmp_path):
+    path, _ = table_4x4
+    with pytest.raises(ValueError):
+        qbin.open_table(path, get_engine(3, 3))
+    other = tmp_path / "q_table.json"
+    other.write_text("{}")
+    with pytest.raises(ValueError):
+        qbin.table_size(str(other))
@@ -0,0 +1,63 @@
+import json
+import os
+import random
+
+import pytest
+
+import fast_train
+import qstore
+from bitboard import get_engine
+from conftest import ROOT
+
+
+@pytest.mark.parametrize("path, size", [("q_table.json", 3), ("4by4/q_table.json", 4)])
+def test_json_round_trip(path, size):
+    with open(os.path.join(ROOT, path)) as f:
+        q_table = json.load(f)
+    table = qstore.CompactQTable.from_json(q_table, get_engine(size, size))
+    assert table.to_json() == q_table
+    assert len(table) == len(q_table["W"]) + len(q_table["B"])
+
+
+def test_state_codes_round_trip():
+    engine = get_engine(4, 4)
+    table = qstore.CompactQTable(engine)
+    rng = random.Random(0)
+    for _ in range(1000):
+        squares = rng.sample(range(engine.num_squares), 8)
+        white = sum(1 << s for s in squares[:4])
+        black = sum(1 << s for s in squares[4:])
+        assert table.decode(table.state_code(white, black)) == (white, black)
+
+
+@pytest.mark.parametrize("rank_min", [qstore.RANK_MIN, 4])
+def test_same_games_as_the_dict_trainer(monkeypatch, rank_min):
+    """Seeded self-play picks the same moves as fast_train, so the tables match, however often it ranks."""
+    monkeypatch.setattr(qstore, "RANK_MIN", rank_min)
+    engine = get_engine(4, 4)
+    fast_train.configure(4, 4)
+    try:
+        fast_train.q_table = {"W": {}, "B": {}}
+        random.seed(5)
+        expected = [fast_train.simulate_game() for _ in range(300)]
+        table = qstore.CompactQTable(engine)
+        random.seed(5)
+        assert [qstore.simulate_game(table) for _ in range(300)] == expected
+        assert table.to_json() == fast_train.q_table
+    finally:
+        fast_train.configure(3, 3)
+        fast_train.q_table = {"W": {}, "B": {}}
+
+
+def test_illegal_stored_action_raises():
+    engine = get_engine(3, 3)
+    table = qstore.CompactQTable(engine)
+    qstore.simulate_game(table)
+    white, black = engine.initial_position()
+    state_id = table.state_id("W", table.state_code(white, black))
+    start = table.starts["W"][state_id]
+    # a1 -> a1, with a value that makes it the only likely choice.
+    table.actions["W"][start] = 0
+    table.values["W"][start] = 10 ** 9
+    with pytest.raises(ValueError):
+        qstore.choose_action(table, "W", (white, black), [])
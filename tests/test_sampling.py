@@ -0,0 +1,61 @@
+import random
+from collections import Counter
+
+import pytest
+
+from sampling import AliasSampler, SamplerCache, probabilities
+
+
+def test_probabilities_clip_negative_values():
+    assert probabilities([30, -3130, 10]) == [0.75, 0.0, 0.25]
+    assert probabilities([0, -5]) == [0.5, 0.5]
+
+
+def test_alias_sampler_matches_probabilities():
+    values = [50, 20, -7, 10, 0, 120]
+    sampler = AliasSampler(["m%d" % i for i in range(6)], values, [None] * 6)
+    rng = random.Random(0)
+    draws = 200000
+    counts = Counter(sampler.sample(rng.random) for _ in range(draws))
+    for index, p in enumerate(probabilities(values)):
+        assert counts[index] / draws == pytest.approx(p, abs=0.005)
+
+
+def test_update_applies_deltas_without_loading():
+    cache = SamplerCache()
+    sampler = cache.get(1, lambda: (["a1a2", "b1b2"], [20, 20], [None, None]))
+    sampler.mirrored = ["c1c2", "b1b2"]
+    cache.update({1: {"a1a2": 5, "b1b2": -21}, 2: {"a1a2": 1}})
+    updated = cache.get(1, lambda: pytest.fail("loaded again"))
+    assert updated.values == [25, -1] and updated.probabilities == [1.0, 0.0]
+    assert updated.mirrored == ["c1c2", "b1b2"]
+    assert sampler.values == [20, 20]  # readers holding the old sampler are unaffected
+    assert (cache.hits, cache.misses) == (1, 1)
+    # An action the sampler does not know drops it.
+    cache.update({1: {"c1c2": 1}})
+    assert len(cache) == 0
+
+
+def test_values_read_before_an_update_are_not_cached():
+    cache = SamplerCache()
+
+    def load():
+        cache.update({1: {"a1a2": 1}})  # the store changed while this was read
+        return ["a1a2"], [20], [None]
+    cache.get(1, load)
+    assert len(cache) == 0
+
+
+def test_cached_samplers_follow_the_store(game_server):
+    for _ in range(200):
+        response = game_server.start_game({})
+        while response.get("message") != "Game Over":
+            response = game_server.continue_game({"gameID": response["gameID"]})
+    samplers = game_server.samplers
+    assert samplers.hit_ratio() > 0.9
+    for key, sampler in samplers.samplers.items():
+        player = game_server.state_keys.position(key)[2]
+        state_key = game_server.state_keys.readable(key)
+        (stored,) = game_server.store.lookup_values([(player, state_key, sampler.actions)])
+        assert sampler.values == stored
+    assert "pawn_wars_sampler_cache_hit_ratio" in game_server.metrics.render(game_server)
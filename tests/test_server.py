@@ -0,0 +1,130 @@
+import json
+import os
+import shutil
+import signal
+
+import pytest
+
+import server
+from conftest import ROOT
+from store import DictStore
+
+
+def plain(q_table):
+    return {player: {key: dict(actions) for key, actions in q_table[player].items()} for player in "WB"}
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    """A Flask test client for a 3x3 app on a copy of the shipped table."""
+    shutil.copy(os.path.join(ROOT, "q_table.json"), tmp_path / "q_table.json")
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(server, "Q_RELOAD_SIGNAL", "")  # leave pytest's signal handlers alone
+    monkeypatch.setattr(server, "ADMIN_TOKEN", "")
+    app = server.create_app(3, 3)
+    yield app.test_client()
+    app.pawn_wars.close()
+
+
+def test_simulate_is_an_admin_post(client):
+    assert client.get("/simulate?games=1").status_code == 405
+    response = client.post("/simulate", json={"games": 1}, environ_base={"REMOTE_ADDR": "10.0.0.1"})
+    assert response.status_code == 403
+
+
+def test_simulate_streams_games(client):
+    response = client.post("/simulate", json={"games": 3, "moves": False})
+    assert response.status_code == 200
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert [line["game"] for line in lines[:-1]] == [0, 1, 2]
+    assert lines[-1]["message"] == "Done" and lines[-1]["games"] == 3
+
+
+def test_admin_only_from_loopback_without_token(game_server, monkeypatch):
+    monkeypatch.setattr(server, "ADMIN_TOKEN", "")
+    assert game_server.authorize_admin(None, "127.0.0.1") is None
+    assert game_server.authorize_admin(None, "::1") is None
+    assert game_server.authorize_admin(None, "10.0.0.1")[1] == 403
+    assert game_server.authorize_admin(None, None)[1] == 403
+
+
+def test_admin_token(game_server, monkeypatch):
+    monkeypatch.setattr(server, "ADMIN_TOKEN", "secret")
+    assert game_server.authorize_admin("Bearer secret", "10.0.0.1") is None
+    assert game_server.authorize_admin("Bearer wrong", "127.0.0.1")[1] == 401
+    assert game_server.authorize_admin(None, "127.0.0.1")[1] == 401
+
+
+@pytest.mark.parametrize("path", ["/jobs/train", "/jobs/some-job/cancel", "/admin/reload"])
+def test_admin_routes_refuse_remote_clients(client, path):
+    response = client.post(path, json={}, environ_base={"REMOTE_ADDR": "10.0.0.1"})
+    assert response.status_code == 403
+
+
+def test_reload_keeps_journalled_games(game_server):
+    for _ in range(100):
+        response = game_server.start_game({})
+        while response.get("message") != "Game Over":
+            response = game_server.continue_game({"gameID": response["gameID"]})
+    live = plain(game_server.store.snapshot())
+    assert game_server.reload_q_table()["status"] == "reloaded"
+    assert plain(game_server.store.snapshot()) == live
+    game_server.close()
+    store = DictStore(game_server.engine, "q_table.json", 1 << 30)
+    assert plain(store.snapshot()) == live
+    store.close()
+
+
+@pytest.mark.parametrize("installed", [signal.SIG_DFL, signal.SIG_IGN, lambda signum, frame: None])
+def test_reload_signal_keeps_existing_handlers(tmp_path, monkeypatch, installed):
+    shutil.copy(os.path.join(ROOT, "q_table.json"), tmp_path / "q_table.json")
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(server, "Q_RELOAD_SIGNAL", "SIGUSR2")
+    previous = signal.signal(signal.SIGUSR2, installed)
+    try:
+        app = server.create_app(3, 3)
+        app.pawn_wars.close()
+        if installed is signal.SIG_DFL:
+            assert signal.getsignal(signal.SIGUSR2) is not signal.SIG_DFL
+        else:
+            assert signal.getsignal(signal.SIGUSR2) is installed
+    finally:
+        signal.signal(signal.SIGUSR2, previous)
+
+
+@pytest.mark.parametrize("state", [
+    "W|a1:W,a1:B",                                       # a square twice
+    "W|a1:W,b1:W,c1:W,a2:W",                             # four White pawns on 3 files
+    {"board": {"a1": "B", "b1": "B", "c1": "B", "a3": "B"}, "player": "W"},
+    "W|d1:W",                                            # off the board
+    "X|a1:W",
+])
+def test_policy_rejects_invalid_positions(game_server, state):
+    response, status = game_server.policy({"states": ["W|a1:W,b1:W,c1:W,a3:B,b3:B,c3:B", state]})
+    assert status == 400
+    assert response["error"].startswith("states[1]")
+
+
+def test_policy_reads_without_adding(game_server):
+    before = game_server.store.state_count("B")
+    response, status = game_server.policy({"states": ["B|a1:W,b2:W,c1:W,a3:B,b3:B,c3:B"]})
+    assert status == 200
+    assert response["results"][0]["moves"]
+    assert game_server.store.state_count("B") == before
+
+
+def test_policy_matches_both_orientations(game_server):
+    mirror = game_server.mirror
+    engine = game_server.engine
+    # A stored state that is not its own mirror image, in both orientations.
+    for state in game_server.store.snapshot()["W"]:
+        white, black, player = engine.position_from_key(state)
+        mirrored = engine.state_key(mirror.mirror(white), mirror.mirror(black), player)
+        if mirrored != state:
+            break
+    response, status = game_server.policy({"states": [state, mirrored]})
+    assert status == 200
+    first, second = response["results"]
+    assert first["seen"] and second["seen"]
+    assert sorted(zip(map(mirror.mirror_action, first["moves"]), first["qvalues"])) == \
+        sorted(zip(second["moves"], second["qvalues"]))
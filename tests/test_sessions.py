@@ -0,0 +1,51 @@
+from sessions import Session, SessionStore
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def session():
+    return Session(0, 0, "W")
+
+
+def test_capacity_evicts_least_recently_used():
+    store = SessionStore(max_entries=3, ttl=100, clock=Clock())
+    for game_id in "abc":
+        store.put(game_id, session())
+    assert store.get("a") is not None  # a is now the most recent
+    store.put("d", session())
+    assert store.get("b") is None
+    assert [store.get(game_id) is not None for game_id in "acd"] == [True, True, True]
+    assert store.evictions == {"ttl": 0, "capacity": 1}
+    # Putting an existing game again does not evict anything.
+    store.put("a", session())
+    assert len(store) == 3 and store.evictions["capacity"] == 1
+
+
+def test_idle_games_expire():
+    clock = Clock()
+    store = SessionStore(max_entries=10, ttl=10, clock=clock)
+    store.put("a", session())
+    store.put("b", session())
+    clock.now = 8
+    assert store.get("b") is not None
+    clock.now = 11
+    assert store.get("a") is None  # idle for 11 s
+    assert store.evictions["ttl"] == 1
+    clock.now = 25
+    store.put("c", session())  # expires b on the way in
+    assert len(store) == 1
+    assert store.evictions == {"ttl": 2, "capacity": 0}
+
+
+def test_release_counts_finished_games():
+    store = SessionStore(clock=Clock())
+    store.put("a", session())
+    store.release("a")
+    store.release("a")
+    assert len(store) == 0 and store.released == 1
@@ -0,0 +1,62 @@
+import multiprocessing
+import shutil
+
+import pytest
+
+from bitboard import get_engine
+from conftest import ROOT
+from sharedq import SharedStore
+from store import load_table
+
+ENGINE = get_engine(3, 3)
+START = "W|a1:W,a3:B,b1:W,b3:B,c1:W,c3:B"
+
+
+@pytest.fixture
+def paths(tmp_path):
+    snapshot = str(tmp_path / "q_table.json")
+    shutil.copy(f"{ROOT}/q_table.json", snapshot)
+    return str(tmp_path / "q_table.shared"), snapshot
+
+
+def add_ones(path, snapshot, count):
+    store = SharedStore(path, ENGINE, snapshot, slots=1 << 12)
+    for _ in range(count):
+        store.add([("W", START, "a1a2", 1)])
+
+
+def test_imports_the_snapshot(paths):
+    path, snapshot = paths
+    store = SharedStore(path, ENGINE, snapshot, slots=1 << 12)
+    table = load_table(snapshot, ENGINE)
+    assert store.snapshot() == table
+    assert store.state_count("W") == len(table["W"])
+    assert store.lookup_values([("W", "W|a1:W,c3:B", ["a1a2"])]) == [[None]]
+    assert store.state_values("W", "W|a1:W,c3:B", ["a1a2"]) == [("a1a2", 20)]
+    assert store.state_count("W") == len(table["W"]) + 1
+    store.close()
+    assert load_table(snapshot, ENGINE)["W"]["W|a1:W,c3:B"] == {"a1a2": 20}
+
+
+def test_updates_from_other_processes_are_not_lost(paths):
+    path, snapshot = paths
+    store = SharedStore(path, ENGINE, snapshot, slots=1 << 12)
+    (before,), = store.lookup_values([("W", START, ["a1a2"])])
+    context = multiprocessing.get_context("fork")
+    workers = [context.Process(target=add_ones, args=(path, snapshot, 500)) for _ in range(2)]
+    for worker in workers:
+        worker.start()
+    for _ in range(500):
+        store.add([("W", START, "a1a2", 1)])
+    for worker in workers:
+        worker.join()
+        assert worker.exitcode == 0
+    assert store.lookup_values([("W", START, ["a1a2"])]) == [[before + 1500]]
+    store.close()
+
+
+def test_rejects_another_board_size(paths):
+    path, snapshot = paths
+    SharedStore(path, ENGINE, snapshot, slots=1 << 12).close()
+    with pytest.raises(ValueError):
+        SharedStore(path, get_engine(4, 4), snapshot)
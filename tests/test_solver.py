@@ -0,0 +1,47 @@
+import pytest
+
+import solver
+from bitboard import get_engine
+
+
+@pytest.mark.parametrize("size, outcome, positions", [
+    (3, (-1, 6), 37),      # Black wins in 6 plies
+    (4, (1, 11), 5734),    # White wins in 11 plies
+])
+def test_initial_position_outcome(size, outcome, positions):
+    engine = get_engine(size, size)
+    solution = solver.solve(engine)
+    white, black = engine.initial_position()
+    assert solution.outcome(white, black, "W") == outcome
+    assert len(list(solution.positions())) == positions
+
+
+def test_best_move_keeps_the_win():
+    engine = get_engine(4, 4)
+    solution = solver.solve(engine)
+    for white, black, player in solution.positions():
+        if solution.outcome(white, black, player)[0] > 0:
+            move = solution.best_move(white, black, player)
+            assert solution.move_outcome(white, black, player, move) == 1
+
+
+def test_board_size_limit():
+    with pytest.raises(ValueError):
+        solver.solve(get_engine(5, 5))
+
+
+def test_policy_error():
+    engine = get_engine(3, 3)
+    solution = solver.solve(engine)
+    empty = solver.policy_error(solution, {"W": {}, "B": {}})
+    assert empty["positions"] == 29
+    assert empty["greedy"] > 0
+    # A table that puts all its weight on the best move never gives a win away.
+    q_table = {"W": {}, "B": {}}
+    for white, black, player in solution.positions():
+        if solution.outcome(white, black, player)[0] > 0:
+            move = solution.best_move(white, black, player)
+            state_q = {engine.action_str(*m): 0 for m in engine.moves(white, black, player)}
+            state_q[engine.action_str(*move)] = 100
+            q_table[player][engine.state_key(white, black, player)] = state_q
+    assert solver.policy_error(solution, q_table) == {"positions": 29, "greedy": 0.0, "sampled": 0.0}
@@ -0,0 +1,67 @@
+import os
+import shutil
+
+import pytest
+
+import server as server_module
+from bitboard import get_engine
+from conftest import ROOT
+from sqlstore import SQLiteStore
+from store import load_table
+
+ENGINE = get_engine(3, 3)
+
+
+def plain(q_table):
+    return {player: {key: dict(actions) for key, actions in q_table[player].items()} for player in "WB"}
+
+
+def play(server, games):
+    for _ in range(games):
+        response = server.start_game({})
+        while response.get("message") != "Game Over":
+            response = server.continue_game({"gameID": response["gameID"]})
+
+
+@pytest.fixture
+def sqlite_server(tmp_path, monkeypatch):
+    shutil.copy(os.path.join(ROOT, "q_table.json"), tmp_path / "q_table.json")
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(server_module, "Q_STORE", "sqlite")
+    server = server_module.GameServer(3, 3)
+    yield server
+    server.close()
+
+
+def test_imports_the_snapshot(tmp_path):
+    snapshot = str(tmp_path / "q_table.json")
+    shutil.copy(os.path.join(ROOT, "q_table.json"), snapshot)
+    store = SQLiteStore(str(tmp_path / "q_table.sqlite"), ENGINE, snapshot)
+    table = load_table(snapshot, ENGINE)
+    assert plain(store.snapshot()) == table
+    assert store.state_count("W") == len(table["W"])
+    assert store.lookup_values([("W", "W|a1:W,c3:B", ["a1a2"])]) == [[None]]
+    assert store.state_values("W", "W|a1:W,c3:B", ["a1a2"]) == [("a1a2", 20)]
+    assert store.state_count("W") == len(table["W"]) + 1
+    with pytest.raises(ValueError):
+        store.replace(table, replay_journal=True)
+    store.close()
+
+
+def test_reloading_the_snapshot_keeps_learned_values(sqlite_server):
+    play(sqlite_server, 50)
+    learned = plain(sqlite_server.store.snapshot())
+    assert learned != load_table("q_table.json", ENGINE)
+    status = sqlite_server.reload_q_table()
+    assert status["status"] == "failed" and "q_table.sqlite" in status["error"]
+    assert sqlite_server.admin_reload({})[1] == 409
+    assert not sqlite_server.start_reload()
+    assert plain(sqlite_server.store.snapshot()) == learned
+
+
+def test_reloading_another_file_replaces_the_table(sqlite_server):
+    play(sqlite_server, 20)
+    shutil.copy("q_table.json", "q_table.candidate.json")
+    status = sqlite_server.reload_q_table("q_table.candidate.json")
+    assert status["status"] == "reloaded"
+    assert plain(sqlite_server.store.snapshot()) == load_table("q_table.json", ENGINE)
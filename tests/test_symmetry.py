@@ -0,0 +1,39 @@
+import json
+import os
+
+import pytest
+
+from bitboard import get_engine
+from conftest import ROOT
+from store import load_table
+from symmetry import INITIAL_Q, Mirror, fold
+
+
+def learned(q_table):
+    """Total of what the table learned, q - INITIAL_Q over every entry."""
+    return sum(q - INITIAL_Q for states in q_table.values() for actions in states.values() for q in actions.values())
+
+
+@pytest.mark.parametrize("path, size, states", [("q_table.json", 3, 37), ("4by4/q_table.json", 4, 4825)])
+def test_shipped_tables_fold_on_load(path, size, states):
+    engine = get_engine(size, size)
+    mirror = Mirror(engine)
+    with open(os.path.join(ROOT, path)) as f:
+        raw = json.load(f)
+    q_table = load_table(os.path.join(ROOT, path), engine)
+    assert len(q_table["W"]) + len(q_table["B"]) == states
+    for states in q_table.values():
+        for state_key in states:
+            assert mirror.canonical_key(state_key) == (state_key, False)
+    assert learned(q_table) == pytest.approx(learned(raw))
+    assert fold(q_table, engine) == q_table
+
+
+def test_fold_merges_mirrored_entries():
+    engine = get_engine(3, 3)
+    mirror = Mirror(engine)
+    key = "W|a3:B,b1:W,b3:B,c1:W,c3:B"
+    canonical_key = "W|a1:W,a3:B,b1:W,b3:B,c3:B"
+    assert mirror.canonical_key(key) == (canonical_key, True)
+    folded = fold({"W": {key: {"c1c2": 25}, canonical_key: {"a1a2": 18, "b1b2": 21}}, "B": {}}, engine)
+    assert folded == {"W": {canonical_key: {"a1a2": 23, "b1b2": 21}}, "B": {}}
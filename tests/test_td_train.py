@@ -0,0 +1,56 @@
+import pytest
+
+import td_train
+
+S1, S2, S3 = "W|a1:W,c3:B", "W|a2:W,c3:B", "B|a2:W,c3:B"
+
+
+def table():
+    return {"W": {S1: {"a1a2": 20}, S2: {"a2a3": 10}}, "B": {S3: {"c3c2": 20}}}
+
+
+def history():
+    return [("W", S1, "a1a2"), ("B", S3, "c3c2"), ("W", S2, "a2a3")]
+
+
+def test_monte_carlo_returns():
+    q_table = table()
+    td_train.ReturnUpdate(q_table, alpha=0.5, gamma=0.9, lam=1)(history(), "W")
+    assert q_table["W"][S2]["a2a3"] == pytest.approx(10 + 0.5 * (20 - 10))
+    assert q_table["W"][S1]["a1a2"] == pytest.approx(20 + 0.5 * (0.9 * 20 - 20))
+    assert q_table["B"][S3]["c3c2"] == pytest.approx(20 + 0.5 * (-20 - 20))
+
+
+def test_one_step_returns_use_the_old_values():
+    q_table = table()
+    td_train.ReturnUpdate(q_table, alpha=0.5, gamma=0.9, lam=0)(history(), "B")
+    # S1 backs up from S2's value before this game's update.
+    assert q_table["W"][S1]["a1a2"] == pytest.approx(20 + 0.5 * (0.9 * 10 - 20))
+    assert q_table["W"][S2]["a2a3"] == pytest.approx(10 + 0.5 * (-20 - 10))
+
+
+def test_moves_missing_from_the_table_are_skipped():
+    q_table = table()
+    del q_table["W"][S2]
+    td_train.ReturnUpdate(q_table, alpha=1, gamma=0.5, lam=1)(history(), "W")
+    assert q_table["W"][S1]["a1a2"] == 20  # now the last move: the full return
+
+
+@pytest.mark.parametrize("alpha, gamma, lam", [(0, 0.9, 0.8), (1.5, 0.9, 0.8), (0.3, -0.1, 0.8), (0.3, 0.9, 2)])
+def test_invalid_parameters(alpha, gamma, lam):
+    with pytest.raises(ValueError):
+        td_train.ReturnUpdate(table(), alpha, gamma, lam)
+
+
+def test_scaled_round_trip():
+    q_table = {"W": {S1: {"a1a2": 0.25, "b1b2": -19.9996}}, "B": {}}
+    saved = td_train.scaled(q_table)
+    assert saved == {"W": {S1: {"a1a2": 250, "b1b2": -20000}}, "B": {}}
+    assert td_train.unscaled(saved) == {"W": {S1: {"a1a2": 0.25, "b1b2": -20.0}}, "B": {}}
+
+
+def test_unscaled_refuses_count_tables():
+    with pytest.raises(ValueError):
+        td_train.unscaled({"W": {S1: {"a1a2": -3130 * td_train.TD_SCALE}}, "B": {}})
+    with pytest.raises(ValueError):
+        td_train.unscaled({"W": {}, "B": {S3: {"c3c2": 20001}}})
@@ -0,0 +1,57 @@
+import json
+import os
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+import vector_train
+from bitboard import get_engine
+from conftest import ROOT
+from symmetry import Mirror
+
+START = "W|a1:W,a3:B,b1:W,b3:B,c1:W,c3:B"
+
+
+def test_load_export_round_trip():
+    engine = get_engine(3, 3)
+    with open(os.path.join(ROOT, "q_table.json")) as f:
+        q_table = json.load(f)
+    trainer = vector_train.LockstepTrainer(engine, batch_size=8, seed=0)
+    trainer.load(q_table)
+    exported = trainer.export({"W": {}, "B": {}})
+    for player in ("W", "B"):
+        for state_key, actions in q_table[player].items():
+            assert exported[player][state_key] == actions
+
+
+@pytest.mark.parametrize("size", [3, 4])
+def test_training_keeps_canonical_legal_entries(size):
+    engine = get_engine(size, size)
+    mirror = Mirror(engine)
+    q_table = {"W": {}, "B": {}}
+    wins, total_moves = vector_train.train(engine, q_table, 500, batch_size=64, seed=1)
+    assert wins["W"] + wins["B"] == 500
+    assert total_moves >= 500
+    for player in ("W", "B"):
+        for state_key, actions in q_table[player].items():
+            white, black, _ = engine.position_from_key(state_key)
+            assert mirror.canonical(white, black)[:2] == (white, black)
+            legal = {engine.action_str(*move) for move in engine.moves(white, black, player)}
+            assert set(actions) == legal
+
+
+def test_same_seed_same_table():
+    engine = get_engine(3, 3)
+    tables = [{"W": {}, "B": {}}, {"W": {}, "B": {}}]
+    for q_table in tables:
+        vector_train.train(engine, q_table, 300, batch_size=32, seed=7)
+    assert tables[0] == tables[1]
+
+
+def test_moves_without_positive_q_are_not_sampled():
+    engine = get_engine(3, 3)
+    q_table = {"W": {START: {"a1a2": 1000, "b1b2": -3, "c1c2": 0}}, "B": {}}
+    vector_train.train(engine, q_table, 200, batch_size=16, seed=2)
+    assert q_table["W"][START]["b1b2"] == -3
+    assert q_table["W"][START]["c1c2"] == 0
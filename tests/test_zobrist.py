@@ -0,0 +1,61 @@
+import random
+
+from bitboard import get_engine
+from symmetry import Mirror
+from zobrist import StateKeys, Zobrist
+
+
+def test_incremental_hashes_match_from_scratch():
+    for size in (3, 4, 5):
+        engine = get_engine(size, size)
+        zobrist = Zobrist(engine, Mirror(engine))
+        mirror = Mirror(engine)
+        rng = random.Random(size)
+        for _ in range(50):
+            white, black = engine.initial_position()
+            hashes = zobrist.position(white, black)
+            player = "W"
+            while not engine.game_over(white, black, player)[0]:
+                src, dst = rng.choice(engine.moves(white, black, player))
+                captured = bool((black if player == "W" else white) >> dst & 1)
+                src_name, dst_name = engine.square_names[src], engine.square_names[dst]
+                hashes = zobrist.move(hashes, player, src_name, dst_name, captured)
+                white, black = engine.apply_move(white, black, player, src, dst)
+                player = "B" if player == "W" else "W"
+                assert hashes == zobrist.position(white, black)
+                assert hashes[1] == zobrist.position(mirror.mirror(white), mirror.mirror(black))[0]
+
+
+def test_state_keys_forget_the_least_recently_used():
+    engine = get_engine(3, 3)
+    keys = StateKeys(engine, max_entries=2)
+    assert keys.resolve(1, 0b1, 0b1000000, "W") == 1
+    assert keys.resolve(2, 0b10, 0b1000000, "W") == 2
+    assert keys.resolve(1, 0b1, 0b1000000, "W") == 1  # 1 is now the most recent
+    assert keys.resolve(3, 0b100, 0b1000000, "W") == 3
+    assert len(keys) == 2
+    assert keys.readable(2) is None and keys.position(2) is None
+    assert keys.readable(1) == engine.state_key(0b1, 0b1000000, "W")
+    assert keys.position(3) == (0b100, 0b1000000, "W")
+
+
+def test_state_keys_fall_back_on_collisions():
+    engine = get_engine(3, 3)
+    keys = StateKeys(engine)
+    keys.resolve(7, 0b1, 0b1000000, "W")
+    key = keys.resolve(7, 0b10, 0b1000000, "W")
+    assert key == engine.state_key(0b10, 0b1000000, "W")
+    assert keys.readable(key) == key
+    assert keys.collisions == 1
+
+
+def test_forgotten_history_entries_are_skipped(game_server):
+    history = []
+    board = game_server.initial_board()
+    game_server.choose_action("W", board, history)
+    (player, key, action_str), = history
+    state_key = game_server.state_keys.readable(key)
+    game_server.state_keys.entries.clear()
+    before = game_server.store.snapshot()[player][state_key][action_str]
+    game_server.update_q_values(history, "W")
+    assert game_server.store.snapshot()[player][state_key][action_str] == before
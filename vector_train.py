@@ -0,0 +1,322 @@
+"""
+NumPy lockstep self-play trainer.
+
+Instead of playing one game at a time, LockstepTrainer advances a whole batch
+of games together as arrays: bitboards, legal-move masks, sampled actions and
+per-game histories. When a game ends its +1/-1 updates are scatter-added into
+a dense Q matrix and the slot is immediately refilled with a fresh game, so
+every step works on a full batch.
+
+Rules and the update rule are the same as simulate_game/update_q_values in
+fast_train.py:
+  - new state-actions start at 20,
+  - actions are sampled with weights proportional to max(Q, 0) (uniform if
+    no Q is positive), as sampling.probabilities,
+  - every move of the winner gets +1 and every move of the loser -1.
+
+Positions are kept in mirror-canonical orientation (see symmetry.py):
+after every move the board is replaced by the smaller of itself and its
+left-right mirror image. The rules are symmetric, so this plays the same
+games as mapping each move back to a fixed orientation, and the table only
+ever holds canonical states, as with choose_action.
+
+Actions are numbered as slots: slot = 3 * src + kind where kind 0 is the
+forward push, 1 the capture towards the lower file and 2 the capture towards
+the higher file. State codes pack (white, black, player) into one int64, so
+boards up to 30 squares are supported.
+"""
+import numpy as np
+
+from symmetry import Mirror
+
+INITIAL_Q = 20
+PLAYERS = ("W", "B")
+
+
+class LockstepTrainer:
+    def __init__(self, engine, batch_size=1024, seed=None):
+        if 2 * engine.num_squares + 1 > 62:
+            raise ValueError("lockstep trainer supports boards of at most 30 squares")
+        self.engine = engine
+        self.batch_size = batch_size
+        self.rng = np.random.default_rng(seed)
+        n = engine.num_squares
+        self.num_squares = n
+        self.num_slots = 3 * n
+        self.max_moves = n * engine.height + 1
+
+        # Per-side slot tables: source square, destination square (-1 when the
+        # slot is off the board) and whether the slot is a capture.
+        self.slot_src = np.repeat(np.arange(n), 3)
+        self.slot_dst = np.full((2, self.num_slots), -1, dtype=np.int64)
+        self.slot_capture = np.tile(np.array([False, True, True]), n)
+        for side, player in enumerate(PLAYERS):
+            for sq in range(n):
+                push = engine.push_masks[player][sq]
+                if push:
+                    self.slot_dst[side, 3 * sq] = push.bit_length() - 1
+                for dst in range(n):
+                    if engine.capture_masks[player][sq] >> dst & 1:
+                        kind = 1 if dst % engine.width < sq % engine.width else 2
+                        self.slot_dst[side, 3 * sq + kind] = dst
+        self.slot_src_bit = np.left_shift(1, self.slot_src)
+        self.slot_dst_bit = np.where(self.slot_dst >= 0, np.left_shift(1, np.maximum(self.slot_dst, 0)), 0)
+        self.goal = np.array([engine.goal_masks["W"], engine.goal_masks["B"]], dtype=np.int64)
+        white, black = engine.initial_position()
+        self.initial = np.array([white, black], dtype=np.int64)
+        mirror = Mirror(engine)
+        self.rank_mask = mirror.rank_mask
+        self.rank_reversed = np.array(mirror.rank_reversed, dtype=np.int64)
+
+        # Sorted state codes -> rows of the dense Q matrix.
+        self.codes = np.empty(0, dtype=np.int64)
+        self.code_rows = np.empty(0, dtype=np.int64)
+        self.q = np.zeros((1024, self.num_slots), dtype=np.int64)
+        self.num_states = 0
+
+    # ------------------------------------------------------------------
+    # State index
+    # ------------------------------------------------------------------
+    def state_codes(self, white, black, side):
+        n = self.num_squares
+        return white | (black << n) | (side << (2 * n))
+
+    def lookup_rows(self, codes, legal):
+        """Return Q rows for codes, creating rows (at INITIAL_Q on legal slots) for new states."""
+        pos = np.searchsorted(self.codes, codes)
+        if len(self.codes):
+            found = self.codes[np.minimum(pos, len(self.codes) - 1)] == codes
+        else:
+            found = np.zeros(len(codes), dtype=bool)
+        if not found.all():
+            missing = ~found
+            new_codes, first = np.unique(codes[missing], return_index=True)
+            new_rows = self.add_rows(len(new_codes))
+            self.q[new_rows] = np.where(legal[missing][first], INITIAL_Q, 0)
+            insert_at = np.searchsorted(self.codes, new_codes)
+            self.codes = np.insert(self.codes, insert_at, new_codes)
+            self.code_rows = np.insert(self.code_rows, insert_at, new_rows)
+            pos = np.searchsorted(self.codes, codes)
+        return self.code_rows[pos]
+
+    def add_rows(self, count):
+        start = self.num_states
+        self.num_states += count
+        if self.num_states > len(self.q):
+            capacity = len(self.q)
+            while capacity < self.num_states:
+                capacity *= 2
+            grown = np.zeros((capacity, self.num_slots), dtype=np.int64)
+            grown[:start] = self.q[:start]
+            self.q = grown
+        return np.arange(start, self.num_states)
+
+    # ------------------------------------------------------------------
+    # Batched game mechanics
+    # ------------------------------------------------------------------
+    def mirror(self, bits):
+        width = self.engine.width
+        mirrored = np.zeros_like(bits)
+        for shift in range(0, self.num_squares, width):
+            mirrored |= self.rank_reversed[(bits >> shift) & self.rank_mask] << shift
+        return mirrored
+
+    def canonical(self, white, black):
+        """Vectorized Mirror.canonical: the smaller of each position and its mirror image."""
+        mirrored_white, mirrored_black = self.mirror(white), self.mirror(black)
+        flip = (mirrored_white < white) | ((mirrored_white == white) & (mirrored_black < black))
+        return np.where(flip, mirrored_white, white), np.where(flip, mirrored_black, black)
+
+    def legal_masks(self, white, black, side):
+        """Return a (games, slots) bool mask of legal moves for the side to move."""
+        own = np.where(side == 0, white, black)[:, None]
+        opponent = np.where(side == 0, black, white)[:, None]
+        empty = ~(white | black)[:, None]
+        targets = np.where(self.slot_capture, opponent, empty)
+        dst_bits = np.where((side == 0)[:, None], self.slot_dst_bit[0], self.slot_dst_bit[1])
+        return ((own & self.slot_src_bit) != 0) & ((targets & dst_bits) != 0)
+
+    def sample_slots(self, rows, legal):
+        """
+        Sample one slot per game with the same weighting as choose_action.
+
+        The weights are max(Q, 0), uniform over the legal actions if none is
+        positive. random.choices bisects their running sum (with hi = number
+        of actions - 1), and the same bisection is replayed here column-wise
+        over the legal actions in move-generation order.
+        """
+        # Left-align the legal slots of each game, keeping slot order.
+        counts = legal.sum(axis=1)
+        game_nz, slot_nz = np.nonzero(legal)
+        rank = np.cumsum(legal, axis=1)[game_nz, slot_nz] - 1
+        actions = np.zeros((len(rows), int(counts.max())), dtype=np.int64)
+        actions[game_nz, rank] = slot_nz
+        present = np.arange(actions.shape[1]) < counts[:, None]
+
+        weights = np.where(present, np.maximum(self.q[rows[:, None], actions], 0), 0)
+        total = weights.sum(axis=1)
+        weights = np.where((total > 0)[:, None], weights, present)
+        total = weights.sum(axis=1)
+        cumulative = np.cumsum(weights, axis=1)
+        threshold = self.rng.random(len(rows)) * total
+        lo = np.zeros(len(rows), dtype=np.int64)
+        hi = counts - 1
+        games = np.arange(len(rows))
+        while True:
+            searching = lo < hi
+            if not searching.any():
+                break
+            mid = (lo + hi) // 2
+            go_left = threshold < cumulative[games, mid]
+            hi = np.where(searching & go_left, mid, hi)
+            lo = np.where(searching & ~go_left, mid + 1, lo)
+        return actions[games, lo]
+
+    def train(self, num_games, progress=None):
+        """
+        Play num_games self-play games. Returns (wins, total_moves) where wins
+        is {"W": ..., "B": ...}, like the fast_train main loop.
+        """
+        batch = min(self.batch_size, num_games)
+        white = np.full(batch, self.initial[0], dtype=np.int64)
+        black = np.full(batch, self.initial[1], dtype=np.int64)
+        side = np.zeros(batch, dtype=np.int64)
+        hist_rows = np.zeros((batch, self.max_moves), dtype=np.int64)
+        hist_slots = np.zeros((batch, self.max_moves), dtype=np.int64)
+        hist_len = np.zeros(batch, dtype=np.int64)
+        active = np.ones(batch, dtype=bool)
+        started = batch
+        finished = 0
+        wins = np.zeros(2, dtype=np.int64)
+        total_moves = 0
+        games = np.arange(batch)
+
+        while finished < num_games:
+            idx = games[active]
+            legal = self.legal_masks(white[idx], black[idx], side[idx])
+            stuck = ~legal.any(axis=1)
+            # Side to move has no legal moves: it loses.
+            winner = np.full(len(idx), -1, dtype=np.int64)
+            winner[stuck] = 1 - side[idx][stuck]
+
+            moving = ~stuck
+            move_idx = idx[moving]
+            if len(move_idx):
+                move_side = side[move_idx]
+                rows = self.lookup_rows(self.state_codes(white[move_idx], black[move_idx], move_side),
+                                        legal[moving])
+                slots = self.sample_slots(rows, legal[moving])
+                step = hist_len[move_idx]
+                hist_rows[move_idx, step] = rows
+                hist_slots[move_idx, step] = slots
+                hist_len[move_idx] = step + 1
+
+                src_bit = np.left_shift(1, self.slot_src[slots])
+                dst_bit = np.left_shift(1, self.slot_dst[move_side, slots])
+                is_white = move_side == 0
+                w, b = white[move_idx], black[move_idx]
+                white[move_idx], black[move_idx] = self.canonical(
+                    np.where(is_white, (w ^ src_bit) | dst_bit, w & ~dst_bit),
+                    np.where(is_white, b & ~dst_bit, (b ^ src_bit) | dst_bit))
+                # A pawn on its goal rank wins immediately.
+                reached = (white[move_idx] & self.goal[0]) != 0
+                winner_moving = np.where(reached, 0, -1)
+                reached_black = (black[move_idx] & self.goal[1]) != 0
+                winner_moving = np.where((winner_moving < 0) & reached_black, 1, winner_moving)
+                winner[moving] = winner_moving
+                side[move_idx] = 1 - move_side
+
+            done = winner >= 0
+            if done.any():
+                done_idx = idx[done]
+                done_winner = winner[done]
+                total_moves += int(hist_len[done_idx].sum())
+                self.apply_updates(hist_rows[done_idx], hist_slots[done_idx],
+                                   hist_len[done_idx], done_winner)
+                wins += np.bincount(done_winner, minlength=2)
+                finished += len(done_idx)
+                if progress is not None:
+                    progress(len(done_idx))
+                # Refill finished slots with new games, or retire them.
+                refill = min(len(done_idx), num_games - started)
+                restart, retire = done_idx[:refill], done_idx[refill:]
+                white[restart] = self.initial[0]
+                black[restart] = self.initial[1]
+                side[restart] = 0
+                hist_len[restart] = 0
+                active[retire] = False
+                started += refill
+
+        return {"W": int(wins[0]), "B": int(wins[1])}, total_moves
+
+    def apply_updates(self, rows, slots, lengths, winners):
+        """Scatter-add +1 for the winner's moves and -1 for the loser's."""
+        ply = np.arange(rows.shape[1])
+        recorded = ply[None, :] < lengths[:, None]
+        # White moves on even plies, Black on odd ones.
+        mover = ply % 2
+        delta = np.where(mover[None, :] == winners[:, None], 1, -1)
+        flat = rows[recorded] * self.num_slots + slots[recorded]
+        np.add.at(self.q.reshape(-1), flat, delta[recorded])
+
+    # ------------------------------------------------------------------
+    # Conversion to and from the JSON q_table format
+    # ------------------------------------------------------------------
+    def slot_for(self, side, src, dst):
+        if dst % self.engine.width == src % self.engine.width:
+            kind = 0
+        else:
+            kind = 1 if dst % self.engine.width < src % self.engine.width else 2
+        return 3 * src + kind
+
+    def load(self, q_table):
+        """Import the learned values of a {"W": {...}, "B": {...}} table."""
+        engine = self.engine
+        codes, values = [], []
+        for side, player in enumerate(PLAYERS):
+            for state_key, actions in q_table.get(player, {}).items():
+                white, black, _ = engine.position_from_key(state_key)
+                legal = {engine.action_str(src, dst): (src, dst)
+                         for src, dst in engine.moves(white, black, player)}
+                # Legal actions missing from the table start at INITIAL_Q,
+                # as choose_action would add them.
+                row = np.zeros(self.num_slots, dtype=np.int64)
+                for src, dst in legal.values():
+                    row[self.slot_for(side, src, dst)] = INITIAL_Q
+                for action_str, value in actions.items():
+                    if action_str in legal:
+                        row[self.slot_for(side, *legal[action_str])] = value
+                codes.append(int(self.state_codes(white, black, side)))
+                values.append(row)
+        if not codes:
+            return
+        codes = np.array(codes, dtype=np.int64)
+        order = np.argsort(codes)
+        rows = self.add_rows(len(codes))
+        self.q[rows] = np.array(values)[order]
+        self.codes = codes[order]
+        self.code_rows = rows
+
+    def export(self, q_table):
+        """Merge the learned values back into a {"W": {...}, "B": {...}} table."""
+        engine = self.engine
+        n = self.num_squares
+        mask = (1 << n) - 1
+        for code, row in zip(self.codes.tolist(), self.code_rows.tolist()):
+            white, black, side = code & mask, (code >> n) & mask, code >> (2 * n)
+            player = PLAYERS[side]
+            state_key = engine.state_key(white, black, player)
+            state_q = q_table.setdefault(player, {}).setdefault(state_key, {})
+            values = self.q[row]
+            for src, dst in engine.moves(white, black, player):
+                state_q[engine.action_str(src, dst)] = int(values[self.slot_for(side, src, dst)])
+        return q_table
+
+
+def train(engine, q_table, num_games, batch_size=1024, seed=None, progress=None):
+    """Run LockstepTrainer on q_table in place; returns (wins, total_moves)."""
+    trainer = LockstepTrainer(engine, batch_size=batch_size, seed=seed)
+    trainer.load(q_table)
+    wins, total_moves = trainer.train(num_games, progress=progress)
+    trainer.export(q_table)
+    return wins, total_moves
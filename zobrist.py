@@ -0,0 +1,136 @@
+"""
+Incremental 64-bit Zobrist hashing of Pawn Wars positions for the apps.
+
+choose_action used to build the readable "W|a1:W,a3:B,..." key of every
+state it looked up: a loop over the squares and a string join per move.
+The apps now identify a state by a 64-bit Zobrist hash instead. Each
+(colour, square) has a random 64-bit key, and a position's hash is the XOR
+of the keys of its pawns, so a move updates it with two or three XORs:
+
+  h ^= key[player][src] ^ key[player][dst]      (the pawn moves)
+  h ^= key[opponent][dst]                       (if it captured)
+
+Q-table states are mirror-canonical (see symmetry.py), so each game keeps a
+pair of hashes: one of the position and one of its mirror image (the same
+XORs with every square mirrored). The state hash is the hash of whichever
+orientation is canonical, XORed with a key for the player to move.
+
+StateKeys maps state hashes back to positions, and builds the readable key
+only when it is needed: when a state is first read from the store, or when
+a finished game's updates are applied. Every lookup checks that the hash
+still stands for the same canonical position. If two positions ever share a
+hash, the second one is keyed by its readable string instead, so a
+collision costs speed but never mixes two states' Q values.
+
+The map keeps the max_entries most recently looked-up states (the apps
+pass STATE_KEYS_SIZE, default 100000, about 40 MB on 6x6) and forgets the
+least recently used one beyond that; without a cap it would hold every
+state the app ever played, which on 6x6 keeps growing. A game's states
+were looked up when it played them, so only a game left idle while
+max_entries other states were played can hold a forgotten hash.
+readable() returns None for it and update_q_values skips that entry.
+Were the hash then registered by a different position, the 1 in 2^64
+event the check guards against, the entry would be applied to that
+position.
+"""
+import random
+import threading
+from collections import OrderedDict
+
+from qstore import PLAYERS
+
+ZOBRIST_SEED = 0x5A0B
+
+
+class Zobrist:
+    def __init__(self, engine, mirror, seed=ZOBRIST_SEED):
+        rng = random.Random(seed)
+        n = engine.num_squares
+        keys = {player: [rng.getrandbits(64) for _ in range(n)] for player in PLAYERS}
+        self.side = {player: rng.getrandbits(64) for player in PLAYERS}
+        # (key of the square, key of its mirror image) per colour and square.
+        self.pairs = {player: [(keys[player][sq], keys[player][mirror.square_map[sq]]) for sq in range(n)]
+                      for player in PLAYERS}
+        self.square_index = engine.square_index
+
+    def position(self, white, black):
+        """(hash, mirrored hash) of a position, from scratch."""
+        h = hm = 0
+        for player, bits in (("W", white), ("B", black)):
+            pairs = self.pairs[player]
+            while bits:
+                low = bits & -bits
+                key, mirrored = pairs[low.bit_length() - 1]
+                h ^= key
+                hm ^= mirrored
+                bits ^= low
+        return h, hm
+
+    def move(self, hashes, player, src, dst, captured):
+        """The hashes after player moves src -> dst (square names), capturing if captured."""
+        index = self.square_index
+        pairs = self.pairs[player]
+        src_key, src_mirrored = pairs[index[src]]
+        dst_key, dst_mirrored = pairs[index[dst]]
+        h = hashes[0] ^ src_key ^ dst_key
+        hm = hashes[1] ^ src_mirrored ^ dst_mirrored
+        if captured:
+            captured_key, captured_mirrored = self.pairs["B" if player == "W" else "W"][index[dst]]
+            h ^= captured_key
+            hm ^= captured_mirrored
+        return h, hm
+
+    def state_hash(self, hashes, flipped, player):
+        """Hash of the state with player to move, in canonical orientation."""
+        return hashes[flipped] ^ self.side[player]
+
+
+class StateKeys:
+    """Collision-checked LRU map from state hashes to canonical positions and readable keys."""
+
+    def __init__(self, engine, max_entries=100000):
+        self.engine = engine
+        self.max_entries = max_entries
+        # state hash -> [(white, black, player), readable key or None], least recently used first
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.collisions = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def position(self, key):
+        """The canonical (white, black, player) of a hash key, or None if it was forgotten."""
+        entry = self.entries.get(key)
+        return entry[0] if entry is not None else None
+
+    def resolve(self, state_hash, white, black, player):
+        """
+        The key for a canonical state: state_hash if it stands for this
+        position (registering it on first sight), else the readable key.
+        """
+        position = (white, black, player)
+        entries = self.entries
+        with self.lock:
+            entry = entries.get(state_hash)
+            if entry is None:
+                if len(entries) >= self.max_entries:
+                    entries.popitem(last=False)
+                entries[state_hash] = [position, None]
+                return state_hash
+            if entry[0] == position:
+                entries.move_to_end(state_hash)
+                return state_hash
+            self.collisions += 1
+        return self.engine.state_key(white, black, player)
+
+    def readable(self, key):
+        """The "W|a1:W,..." key for a key returned by resolve(), or None if it was forgotten."""
+        if isinstance(key, str):
+            return key
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        if entry[1] is None:
+            entry[1] = self.engine.state_key(*entry[0])
+        return entry[1]